@@ -0,0 +1,421 @@
+"""
+已完成任务归档
+
+完成时间早于 TASK_MANAGER_ARCHIVE_AFTER_DAYS 天的任务连同其依赖关系移入 archived_tasks、
+archived_dependencies 表，tasks / dependencies 表、计数表、就绪状态表和依赖索引只保留活跃数据。
+
+- 完成时间 tasks.completed_at 由触发器维护：状态变为 completed 时记录，离开 completed 时清空；
+  早于该列的已完成任务按 created_at 计算
+- 归档按批进行（TASK_MANAGER_ARCHIVE_BATCH_SIZE），每批一个短事务，批与批之间暂停，不长时间占用写锁
+- 默认的列表和详情只返回活跃任务，?include_archived=true 时包含归档任务（带 archived 标记）
+- 恢复时任务保留原ID（tasks 表为 AUTOINCREMENT，ID 不会被复用），另一端仍存在的依赖关系一并恢复，
+  另一端也已归档的依赖留在归档表中，随那个任务恢复；恢复的任务重新计算完成时间
+- 归档与恢复写入变更日志（op 为 archived / restored），增量同步的客户端据此移除或加回任务
+
+也可以单独运行（数据库路径取自 TASK_MANAGER_DB_PATH）：
+    python archive.py --older-than-days 180
+"""
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import String, delete, func, insert, or_, select, text, type_coerce
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, aliased
+
+import models
+import project_stats
+import task_readiness
+import change_log
+import graph_index
+from database import SessionLocal, after_commit
+from graph_index import GraphOverlay, dependency_graph
+from graph_layout import layout_cache
+from pagination import db_datetime
+from response_cache import response_cache
+from write_queue import run_write
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get("TASK_MANAGER_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("TASK_MANAGER_ARCHIVE_BATCH_SIZE", "500"))
+# 批与批之间的暂停（毫秒），让其他写请求取得写锁
+ARCHIVE_BATCH_PAUSE = float(os.environ.get("TASK_MANAGER_ARCHIVE_BATCH_PAUSE_MS", "50")) / 1000
+# 定期自动归档的间隔（小时），0 表示只手动触发
+ARCHIVE_INTERVAL = float(os.environ.get("TASK_MANAGER_ARCHIVE_INTERVAL_HOURS", "0")) * 3600
+
+COMPLETED_STATUS = "completed"
+
+# 定期归档最近一次被领取的周期序号（app_state 键）
+SCHEDULE_SLOT_KEY = "archive.scheduled_slot"
+
+TRIGGER_STATEMENTS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_completed_at_ai AFTER INSERT ON tasks
+    WHEN new.status = '{COMPLETED_STATUS}' AND new.completed_at IS NULL BEGIN
+        UPDATE tasks SET completed_at = CURRENT_TIMESTAMP WHERE id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_completed_at_au AFTER UPDATE OF status ON tasks
+    WHEN new.status IS NOT old.status BEGIN
+        UPDATE tasks
+        SET completed_at = CASE WHEN new.status = '{COMPLETED_STATUS}' THEN CURRENT_TIMESTAMP END
+        WHERE id = new.id;
+    END
+    """,
+)
+
+
+class ArchiveError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def ensure_triggers(engine: Engine) -> None:
+    """创建维护 completed_at 的触发器（幂等）"""
+    with engine.begin() as conn:
+        for statement in TRIGGER_STATEMENTS:
+            conn.execute(text(statement))
+
+
+# ==================== 归档 ====================
+
+def cutoff_for(older_than_days: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=older_than_days)
+
+
+def eligible_task_ids(db: Session, cutoff: datetime, limit: int) -> List[int]:
+    """完成时间早于 cutoff 的已完成任务（按ID顺序取前 limit 个）"""
+    # 与 created_at 一样按存储的文本比较（见 pagination.CREATED_AT_TEXT）
+    completed_time = type_coerce(func.coalesce(models.Task.completed_at, models.Task.created_at), String)
+    return db.execute(
+        select(models.Task.id)
+        .where(models.Task.status == COMPLETED_STATUS, completed_time < db_datetime(cutoff))
+        .order_by(models.Task.id)
+        .limit(limit)
+    ).scalars().all()
+
+
+def edges_with_projects(db: Session, dependency_model, condition) -> list:
+    """满足 condition 的依赖边，附带两端任务所在的项目ID（两端都须为活跃任务）"""
+    dependent = aliased(models.Task)
+    prerequisite = aliased(models.Task)
+    return db.query(
+        dependency_model.id,
+        dependency_model.task_id,
+        dependency_model.depends_on_id,
+        dependent.project_id.label("task_project_id"),
+        prerequisite.project_id.label("prerequisite_project_id"),
+    ).join(
+        dependent, dependent.id == dependency_model.task_id
+    ).join(
+        prerequisite, prerequisite.id == dependency_model.depends_on_id
+    ).filter(condition).all()
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> Dict[str, int]:
+    """归档一批任务及其依赖关系并提交，返回本批的任务数和依赖数（为 0 表示已无可归档任务）"""
+    task_ids = eligible_task_ids(db, cutoff, batch_size)
+    if not task_ids:
+        return {"tasks": 0, "dependencies": 0}
+
+    tasks = db.query(models.Task.id, models.Task.project_id, models.Task.status).filter(
+        models.Task.id.in_(task_ids)
+    ).all()
+    touches_batch = or_(
+        models.Dependency.task_id.in_(task_ids),
+        models.Dependency.depends_on_id.in_(task_ids),
+    )
+    edges = edges_with_projects(db, models.Dependency, touches_batch)
+    archived = set(task_ids)
+    # 依赖这些任务的活跃任务：前置任务已完成，计数不变，仍按当前数据重算一次
+    dependents = {edge.task_id for edge in edges if edge.task_id not in archived}
+
+    columns = [column.key for column in models.TASK_COLUMNS] + ["completed_at"]
+    db.execute(insert(models.ArchivedTask).from_select(
+        columns, select(*(getattr(models.Task, column) for column in columns)).where(models.Task.id.in_(task_ids))
+    ))
+    db.execute(insert(models.ArchivedDependency).from_select(
+        ["task_id", "depends_on_id"],
+        select(models.Dependency.task_id, models.Dependency.depends_on_id).where(touches_batch)
+    ))
+    db.execute(delete(models.Dependency).where(touches_batch))
+    db.execute(delete(models.Task).where(models.Task.id.in_(task_ids)))
+
+    for (project_id, status), count in Counter((task.project_id, task.status) for task in tasks).items():
+        project_stats.adjust(db, project_id, status, -count)
+    task_readiness.refresh(db, task_ids=archived | dependents)
+
+    entries = [
+        {"entity": "task", "op": "archived", "entity_id": task.id, "project_ids": [task.project_id]}
+        for task in tasks
+    ]
+    entries.extend(
+        {
+            "entity": "dependency", "op": "archived", "entity_id": edge.id,
+            "project_ids": [edge.task_project_id, edge.prerequisite_project_id],
+            "task_id": edge.task_id, "depends_on_id": edge.depends_on_id,
+        }
+        for edge in edges
+    )
+    change_log.record_many(db, entries)
+
+    projects = {task.project_id for task in tasks}
+    for edge in edges:
+        projects.update((edge.task_project_id, edge.prerequisite_project_id))
+        graph_index.stage(db, "remove_edge", edge.task_id, edge.depends_on_id)
+    after_commit(db, response_cache.invalidate, *projects)
+    after_commit(db, layout_cache.invalidate, *projects)
+    db.commit()
+    return {"tasks": len(tasks), "dependencies": len(edges)}
+
+
+class ArchiveJob:
+    """后台归档：同一时刻只运行一个，status() 返回最近一次运行的进度"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._state = {"running": False}
+
+    def start(self, older_than_days: Optional[float] = None, batch_size: Optional[int] = None) -> bool:
+        """在后台线程中开始归档；已在运行时返回 False"""
+        with self._lock:
+            if self._state["running"]:
+                return False
+            self._begin(older_than_days, batch_size)
+            self._thread = threading.Thread(target=self._run, name="archive-job", daemon=True)
+            self._thread.start()
+        return True
+
+    def run(self, older_than_days: Optional[float] = None, batch_size: Optional[int] = None) -> dict:
+        """在当前线程中执行一次归档（命令行使用）"""
+        with self._lock:
+            if self._state["running"]:
+                raise ArchiveError("归档任务正在运行", status_code=409)
+            self._begin(older_than_days, batch_size)
+        self._run()
+        return self.status()
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self._state)
+
+    def _begin(self, older_than_days: Optional[float], batch_size: Optional[int]) -> None:
+        older_than_days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        self._state = {
+            "running": True,
+            "older_than_days": older_than_days,
+            "cutoff": cutoff_for(older_than_days).isoformat(timespec="seconds"),
+            "batch_size": batch_size or ARCHIVE_BATCH_SIZE,
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "finished_at": None,
+            "batches": 0,
+            "archived_tasks": 0,
+            "archived_dependencies": 0,
+            "error": None,
+        }
+
+    def _run(self) -> None:
+        cutoff = datetime.fromisoformat(self._state["cutoff"])
+        batch_size = self._state["batch_size"]
+        try:
+            while True:
+                counts = run_write(archive_batch, cutoff, batch_size)
+                if not counts["tasks"]:
+                    break
+                with self._lock:
+                    self._state["batches"] += 1
+                    self._state["archived_tasks"] += counts["tasks"]
+                    self._state["archived_dependencies"] += counts["dependencies"]
+                time.sleep(ARCHIVE_BATCH_PAUSE)
+        except Exception as e:
+            with self._lock:
+                self._state["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self._state["running"] = False
+                self._state["finished_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# 进程级共享实例
+job = ArchiveJob()
+
+
+def claim_scheduled_run(db: Session, slot: int) -> bool:
+    """
+    领取第 slot 个周期的定期归档并提交，已被领取时返回 False
+    多个工作进程各自运行调度线程，同一周期只有一个进程执行归档；单条 UPSERT 语句原子完成
+    """
+    stmt = sqlite_insert(models.AppState).values(key=SCHEDULE_SLOT_KEY, value=slot)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"value": stmt.excluded.value},
+        where=models.AppState.value < stmt.excluded.value,
+    )
+    claimed = db.execute(stmt).rowcount == 1
+    db.commit()
+    return claimed
+
+
+def start_scheduler(interval: float = ARCHIVE_INTERVAL) -> Optional[threading.Thread]:
+    """每隔 interval 秒触发一次后台归档；interval 为 0 时不启动"""
+    if interval <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                claimed = run_write(claim_scheduled_run, int(time.time() // interval))
+            except Exception:
+                continue
+            if claimed:
+                job.start()
+
+    thread = threading.Thread(target=loop, name="archive-scheduler", daemon=True)
+    thread.start()
+    return thread
+
+
+# ==================== 恢复 ====================
+
+def restore_task(db: Session, task_id: int) -> int:
+    """
+    把归档任务恢复为活跃任务（不提交），返回修订号
+    另一端为活跃任务的依赖关系一并恢复，另一端已被删除的依赖丢弃
+    """
+    archived = db.get(models.ArchivedTask, task_id)
+    if archived is None:
+        raise ArchiveError("归档任务不存在", status_code=404)
+    if db.get(models.Task, task_id) is not None:
+        raise ArchiveError("任务ID已被占用")
+
+    rows = db.query(models.ArchivedDependency).filter(or_(
+        models.ArchivedDependency.task_id == task_id,
+        models.ArchivedDependency.depends_on_id == task_id,
+    )).all()
+    other_ids = {row.depends_on_id if row.task_id == task_id else row.task_id for row in rows}
+    live = {
+        other_id for (other_id,) in
+        db.query(models.Task.id).filter(models.Task.id.in_(other_ids))
+    }
+    still_archived = {
+        other_id for (other_id,) in
+        db.query(models.ArchivedTask.id).filter(models.ArchivedTask.id.in_(other_ids))
+    }
+    restored_edges = []
+    finished_rows = []
+    for row in rows:
+        other_id = row.depends_on_id if row.task_id == task_id else row.task_id
+        if other_id in live:
+            restored_edges.append((row.task_id, row.depends_on_id))
+            finished_rows.append(row)
+        elif other_id not in still_archived:
+            finished_rows.append(row)
+
+    # 归档期间活跃任务之间新增的依赖可能与恢复的边构成环；取得写锁后在最新的索引上检测
+    graph_index.sync_for_write(db)
+    overlay = GraphOverlay(base=graph_index.group_overlay(db))
+    for edge in restored_edges:
+        overlay.add_edge(*edge)
+    if dependency_graph.find_cycle([dependent_id for dependent_id, _ in restored_edges], overlay) is not None:
+        raise ArchiveError("无法恢复：恢复的依赖关系会产生循环依赖")
+
+    project_id = archived.project_id
+    # 完成时间重新记录（由触发器写入），恢复的任务不会马上被再次归档
+    db.add(models.Task(
+        id=archived.id,
+        title=archived.title,
+        description=archived.description,
+        status=archived.status,
+        project_id=project_id,
+        created_at=archived.created_at,
+    ))
+    for row in finished_rows:
+        db.delete(row)
+    db.delete(archived)
+    db.flush()
+    project_stats.task_created(db, project_id, archived.status)
+
+    dependencies = [models.Dependency(task_id=dependent_id, depends_on_id=prerequisite_id)
+                    for dependent_id, prerequisite_id in restored_edges]
+    db.add_all(dependencies)
+    db.flush()
+    task_readiness.refresh(db, task_ids=[task_id], prerequisite_ids=[task_id])
+
+    projects = {project_id}
+    for edge in edges_with_projects(db, models.Dependency, models.Dependency.id.in_([
+        dependency.id for dependency in dependencies
+    ])):
+        projects.update((edge.task_project_id, edge.prerequisite_project_id))
+        change_log.record(
+            db, "dependency", "restored", edge.id,
+            [edge.task_project_id, edge.prerequisite_project_id],
+            task_id=edge.task_id, depends_on_id=edge.depends_on_id
+        )
+        graph_index.stage(db, "add_edge", edge.task_id, edge.depends_on_id)
+    revision = change_log.record(db, "task", "restored", task_id, [project_id])
+    after_commit(db, response_cache.invalidate, *projects)
+    after_commit(db, layout_cache.invalidate, *projects)
+    return revision
+
+
+# ==================== 查询 ====================
+
+def archived_task_detail(db: Session, task_id: int) -> Optional[dict]:
+    """归档任务及其归档的依赖关系；不存在时返回 None"""
+    row = db.query(*models.ARCHIVED_TASK_COLUMNS, models.ArchivedTask.archived_at).filter(
+        models.ArchivedTask.id == task_id
+    ).first()
+    if row is None:
+        return None
+    dependencies = db.execute(
+        select(models.ArchivedDependency.depends_on_id)
+        .where(models.ArchivedDependency.task_id == task_id)
+        .order_by(models.ArchivedDependency.id)
+    ).scalars().all()
+    dependents = db.execute(
+        select(models.ArchivedDependency.task_id)
+        .where(models.ArchivedDependency.depends_on_id == task_id)
+        .order_by(models.ArchivedDependency.id)
+    ).scalars().all()
+    return {
+        **row._asdict(),
+        "dependencies": dependencies,
+        "dependents": dependents,
+        "archived": True,
+    }
+
+
+def archived_count(db: Session, project_id: int) -> int:
+    return db.query(func.count(models.ArchivedTask.id)).filter(
+        models.ArchivedTask.project_id == project_id
+    ).scalar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="归档已完成的旧任务")
+    parser.add_argument(
+        "--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS,
+        help=f"归档完成时间早于多少天的任务（默认 {ARCHIVE_AFTER_DAYS:g}）"
+    )
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="每批归档的任务数")
+    args = parser.parse_args()
+
+    from database import DB_PATH, engine
+    import migrations
+
+    print(f"数据库文件：{DB_PATH}")
+    models.Base.metadata.create_all(bind=engine)
+    migrations.upgrade_schema(engine)
+    result = job.run(args.older_than_days, args.batch_size)
+    if result["error"]:
+        print(f"✗ 归档失败：{result['error']}")
+    print(f"✓ 归档 {result['archived_tasks']} 个任务、{result['archived_dependencies']} 条依赖关系（{result['batches']} 批）")
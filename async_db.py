@@ -0,0 +1,73 @@
+"""
+异步数据库访问（TASK_MANAGER_DB_MODE=async）
+
+使用 SQLAlchemy asyncio 扩展 + aiosqlite：接口注册为 async def，
+数据库调用在 aiosqlite 的连接线程中执行，请求不再占用 Starlette 线程池。
+
+接口逻辑只写一份（同步 Session 写法）。异步模式下 db_handler 把接口包装为协程，
+通过 AsyncSession.run_sync 在异步会话上执行原函数，懒加载、会话事件等行为与同步模式一致。
+同步模式下 db_handler 原样返回接口函数。
+"""
+import functools
+import inspect
+
+from fastapi import Depends
+
+from metrics import PROFILING_ENABLED, profiled
+
+from database import (
+    DB_MODE,
+    POOL_MAX_OVERFLOW,
+    POOL_SIZE,
+    SQLALCHEMY_DATABASE_URL,
+    apply_sqlite_pragmas,
+    get_db,
+)
+
+if DB_MODE == "async":
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1),
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+    )
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=True)
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def db_handler(func):
+    """
+    按 DB_MODE 注册接口：
+    - sync：原样返回，FastAPI 在线程池中执行（开启性能剖析时包装为可在线程内剖析）
+    - async：返回协程包装，参数 db 改为注入 AsyncSession，并在其上 run_sync 原函数
+    """
+    if DB_MODE != "async":
+        return profiled(func) if PROFILING_ENABLED else func
+
+    signature = inspect.signature(func)
+    parameters = [
+        param.replace(default=Depends(get_async_db))
+        if param.name == "db" else param
+        for param in signature.parameters.values()
+    ]
+
+    @functools.wraps(func)
+    async def wrapper(**kwargs):
+        async_db = kwargs.pop("db")
+        return await async_db.run_sync(lambda db: func(db=db, **kwargs))
+
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper
+
+
+__all__ = ["db_handler", "get_async_db", "get_db", "async_engine", "AsyncSessionLocal"]
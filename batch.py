@@ -0,0 +1,408 @@
+"""
+批量操作
+
+POST /api/batch 接收一组创建、更新、删除任务和增删依赖的操作，在一个事务内执行：
+
+1. 校验阶段：按顺序在内存中演算每个操作，得到净变更
+   （新建任务、字段更新、删除任务、增删的边），再在依赖索引叠加本批修改后的图上
+   做一次环检测（只从新增边出发，每个节点至多访问一次）
+2. 写入阶段：批量 INSERT / UPDATE / DELETE 写入净变更，一次提交
+
+同一批内新建的任务可用 ref（客户端临时ID）标记，后续操作以字符串 ref 引用它。
+任一操作失败时整批回滚。
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+import project_stats
+import task_readiness
+import change_log
+import graph_index
+from graph_index import GraphOverlay, dependency_graph, group_overlay
+
+TaskRef = Union[int, str]
+
+DEFAULT_PROJECT_ID = 1
+
+
+class BatchError(Exception):
+    """批量操作中第 index 个操作失败"""
+
+    def __init__(self, index: int, op: str, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.index = index
+        self.op = op
+        self.message = message
+        self.status_code = status_code
+
+    def __str__(self):
+        return f"操作 #{self.index}（{self.op}）失败：{self.message}"
+
+
+class BatchPlan:
+    """校验阶段的演算状态；新建任务使用负数占位ID"""
+
+    def __init__(self, db: Session, operations: List[schemas.BatchOperation]):
+        self.db = db
+        self.operations = operations
+        # 演算前取得写锁并重放其他连接已提交的依赖修改：到本批提交前索引都与数据库一致，
+        # 并发的批量操作或添加依赖不会各自通过环检测而共同成环
+        graph_index.sync_for_write(db)
+
+        # 已有任务：id -> {"project_id", "status"}
+        self.existing: Dict[int, dict] = {}
+        self.projects: Set[int] = set()
+        self._preload()
+
+        self.new_tasks: Dict[int, dict] = {}      # 占位ID -> 字段
+        self._next_node = -1
+        self.refs: Dict[str, int] = {}            # ref -> 占位ID
+        self.updates: Dict[int, dict] = {}        # 已有任务ID -> 更新字段
+        self.deleted: Set[int] = set()            # 删除的已有任务
+        # 增删的边（含占位ID）；组提交时叠加在同组已执行操作的修改之上
+        self.overlay = GraphOverlay(base=group_overlay(db))
+        self.edge_ops: Dict[Tuple[int, int], int] = {}  # 新增的边 -> 操作序号
+        self.results: List[dict] = []
+
+    def _preload(self) -> None:
+        """一次查询载入本批引用到的已有任务和项目"""
+        task_ids = set()
+        project_ids = set()
+        for op in self.operations:
+            for value in (op.task_id, op.depends_on_id):
+                if isinstance(value, int):
+                    task_ids.add(value)
+            if op.op == "create_task":
+                project_ids.add(op.project_id if op.project_id is not None else DEFAULT_PROJECT_ID)
+
+        if task_ids:
+            rows = self.db.query(
+                models.Task.id, models.Task.project_id, models.Task.status
+            ).filter(models.Task.id.in_(task_ids))
+            self.existing = {
+                task_id: {"project_id": project_id, "status": status}
+                for task_id, project_id, status in rows
+            }
+        if project_ids:
+            self.projects = {
+                project_id for (project_id,) in
+                self.db.query(models.Project.id).filter(models.Project.id.in_(project_ids))
+            }
+
+    # ==================== 演算 ====================
+
+    def run(self) -> None:
+        for index, op in enumerate(self.operations):
+            handler = getattr(self, f"_{op.op}")
+            try:
+                result = handler(op)
+            except BatchError:
+                raise
+            except LookupError as e:
+                raise BatchError(index, op.op, str(e.args[0]), status_code=404)
+            except ValueError as e:
+                raise BatchError(index, op.op, str(e))
+            self.results.append({"index": index, "op": op.op, **result})
+            if op.op == "add_dependency":
+                self.edge_ops[(result["task_id"], result["depends_on_id"])] = index
+        self._check_cycles()
+
+    def _check_cycles(self) -> None:
+        """整批演算完成后统一检查循环依赖"""
+        start_ids = [task_id for task_id, targets in self.overlay.added.items() if targets]
+        cycle = dependency_graph.find_cycle(start_ids, self.overlay)
+        if cycle is None:
+            return
+        # 归咎于环上最后添加的那条边
+        index = max(
+            self.edge_ops[edge] for edge in cycle
+            if edge in self.edge_ops
+        )
+        raise BatchError(index, "add_dependency", "无法添加依赖：会产生循环依赖")
+
+    def _resolve(self, value: Optional[TaskRef], label: str = "任务") -> int:
+        if value is None:
+            raise ValueError(f"缺少{label}ID")
+        if isinstance(value, str):
+            node = self.refs.get(value)
+            if node is None or node not in self.new_tasks:
+                raise LookupError(f"{label}引用 {value!r} 不存在")
+            return node
+        if value not in self.existing or value in self.deleted:
+            raise LookupError(f"{label} {value} 不存在")
+        return value
+
+    def _edge_exists(self, task_id: int, depends_on_id: int) -> bool:
+        if depends_on_id in self.overlay.added.get(task_id, ()):
+            return True
+        if (task_id, depends_on_id) in self.overlay.removed:
+            return False
+        if task_id < 0 or depends_on_id < 0:
+            return False
+        return dependency_graph.has_edge(task_id, depends_on_id, self.overlay.base)
+
+    def _create_task(self, op: schemas.BatchOperation) -> dict:
+        project_id = op.project_id if op.project_id is not None else DEFAULT_PROJECT_ID
+        if project_id not in self.projects:
+            raise LookupError("指定的项目不存在")
+        if not op.title:
+            raise ValueError("任务标题不能为空")
+        if op.ref is not None and op.ref in self.refs:
+            raise ValueError(f"引用 {op.ref!r} 重复")
+
+        node = self._next_node
+        self._next_node -= 1
+        self.new_tasks[node] = {
+            "title": op.title,
+            "description": op.description,
+            "status": op.status or "pending",
+            "project_id": project_id,
+        }
+        if op.ref is not None:
+            self.refs[op.ref] = node
+        return {"task_id": node, "ref": op.ref}
+
+    def _update_task(self, op: schemas.BatchOperation) -> dict:
+        node = self._resolve(op.task_id)
+        fields = {
+            field: getattr(op, field)
+            for field in ("title", "description", "status")
+            if field in op.model_fields_set
+        }
+        if node < 0:
+            self.new_tasks[node].update(fields)
+        else:
+            self.updates.setdefault(node, {}).update(fields)
+        return {"task_id": node}
+
+    def _delete_task(self, op: schemas.BatchOperation) -> dict:
+        node = self._resolve(op.task_id)
+        # 本批新增的相关边随任务一起撤销
+        self.overlay.added.pop(node, None)
+        for targets in self.overlay.added.values():
+            targets.discard(node)
+        # 已有边由写入阶段随任务一起删除
+        self.overlay.removed = {
+            edge for edge in self.overlay.removed if node not in edge
+        }
+        if node < 0:
+            del self.new_tasks[node]
+        else:
+            self.deleted.add(node)
+            self.overlay.removed_nodes.add(node)
+            self.updates.pop(node, None)
+        return {"task_id": node}
+
+    def _add_dependency(self, op: schemas.BatchOperation) -> dict:
+        task_id = self._resolve(op.task_id)
+        depends_on_id = self._resolve(op.depends_on_id, "依赖的任务")
+        if task_id == depends_on_id:
+            raise ValueError("任务不能依赖自己")
+        if self._edge_exists(task_id, depends_on_id):
+            raise ValueError("依赖关系已存在")
+
+        if (task_id, depends_on_id) in self.overlay.removed:
+            self.overlay.removed.discard((task_id, depends_on_id))
+        else:
+            self.overlay.added[task_id].add(depends_on_id)
+        return {"task_id": task_id, "depends_on_id": depends_on_id}
+
+    def _remove_dependency(self, op: schemas.BatchOperation) -> dict:
+        task_id = self._resolve(op.task_id)
+        depends_on_id = self._resolve(op.depends_on_id, "被依赖的任务")
+        if not self._edge_exists(task_id, depends_on_id):
+            raise LookupError("依赖关系不存在")
+
+        if depends_on_id in self.overlay.added.get(task_id, ()):
+            self.overlay.added[task_id].discard(depends_on_id)
+        else:
+            self.overlay.removed.add((task_id, depends_on_id))
+        return {"task_id": task_id, "depends_on_id": depends_on_id}
+
+
+def apply_batch(db: Session, operations: List[schemas.BatchOperation]) -> dict:
+    """
+    校验并执行批量操作（调用方负责提交）
+
+    返回:
+    - results: 每个操作的结果（任务ID已替换为真实ID）
+    - refs: ref -> 真实任务ID
+    - revision: 写入后的修订号
+    - touched: 写入阶段涉及的数据，供提交后更新内存索引和缓存
+    """
+    plan = BatchPlan(db, operations)
+    plan.run()
+
+    changes: List[dict] = []
+    stat_deltas: Dict[Tuple[int, str], int] = defaultdict(int)
+    affected_projects: Set[int] = set()
+    # 需要重算就绪状态的任务，以及其直接后续任务需要重算的任务
+    readiness_ids: Set[int] = set()
+    readiness_prerequisites: Set[int] = set()
+
+    # 1. 批量插入新任务
+    id_map: Dict[int, int] = {}
+    if plan.new_tasks:
+        nodes = list(plan.new_tasks)
+        new_ids = db.execute(
+            insert(models.Task).returning(models.Task.id, sort_by_parameter_order=True),
+            [plan.new_tasks[node] for node in nodes]
+        ).scalars().all()
+        id_map = dict(zip(nodes, new_ids))
+        readiness_ids.update(new_ids)
+        for node, task_id in id_map.items():
+            fields = plan.new_tasks[node]
+            stat_deltas[(fields["project_id"], project_stats.status_key(fields["status"]))] += 1
+            affected_projects.add(fields["project_id"])
+            changes.append({
+                "entity": "task", "op": "created", "entity_id": task_id,
+                "project_ids": [fields["project_id"]],
+            })
+
+    def real(node: int) -> int:
+        return id_map.get(node, node)
+
+    def project_of(task_id: int) -> int:
+        if task_id in plan.existing:
+            return plan.existing[task_id]["project_id"]
+        return plan.new_tasks[task_id]["project_id"]
+
+    # 2. 批量更新已有任务
+    update_rows = [{"id": task_id, **fields} for task_id, fields in plan.updates.items() if fields]
+    if update_rows:
+        db.execute(update(models.Task), update_rows)
+        for task_id, fields in plan.updates.items():
+            if not fields:
+                continue
+            info = plan.existing[task_id]
+            if "status" in fields:
+                readiness_ids.add(task_id)
+                readiness_prerequisites.add(task_id)
+                stat_deltas[(info["project_id"], project_stats.status_key(info["status"]))] -= 1
+                stat_deltas[(info["project_id"], project_stats.status_key(fields["status"]))] += 1
+            changes.append({
+                "entity": "task", "op": "updated", "entity_id": task_id,
+                "project_ids": [info["project_id"]],
+            })
+
+    # 3. 删除任务及其全部依赖边
+    if plan.deleted:
+        deleted_ids = list(plan.deleted)
+        # 重算时已删除任务的状态行会被清除
+        readiness_ids.update(deleted_ids)
+        edge_filter = or_(
+            models.Dependency.task_id.in_(deleted_ids),
+            models.Dependency.depends_on_id.in_(deleted_ids)
+        )
+        edges = db.query(
+            models.Dependency.id, models.Dependency.task_id, models.Dependency.depends_on_id
+        ).filter(edge_filter).all()
+        neighbor_ids = {t for edge in edges for t in edge[1:]} - set(plan.existing)
+        if neighbor_ids:
+            for task_id, project_id, status in db.query(
+                models.Task.id, models.Task.project_id, models.Task.status
+            ).filter(models.Task.id.in_(neighbor_ids)):
+                plan.existing[task_id] = {"project_id": project_id, "status": status}
+        for dep_id, task_id, depends_on_id in edges:
+            readiness_ids.add(task_id)
+            projects = [project_of(task_id), project_of(depends_on_id)]
+            affected_projects.update(projects)
+            changes.append({
+                "entity": "dependency", "op": "deleted", "entity_id": dep_id,
+                "project_ids": projects, "task_id": task_id, "depends_on_id": depends_on_id,
+            })
+
+        db.execute(delete(models.Dependency).where(edge_filter))
+        db.execute(delete(models.Task).where(models.Task.id.in_(deleted_ids)))
+        for task_id in deleted_ids:
+            info = plan.existing[task_id]
+            stat_deltas[(info["project_id"], project_stats.status_key(info["status"]))] -= 1
+            affected_projects.add(info["project_id"])
+            changes.append({
+                "entity": "task", "op": "deleted", "entity_id": task_id,
+                "project_ids": [info["project_id"]],
+            })
+
+    # 4. 删除依赖边
+    removed_edges = sorted(plan.overlay.removed)
+    if removed_edges:
+        task_ids = {task_id for task_id, _ in removed_edges}
+        dep_ids = {
+            (task_id, depends_on_id): dep_id
+            for dep_id, task_id, depends_on_id in db.query(
+                models.Dependency.id, models.Dependency.task_id, models.Dependency.depends_on_id
+            ).filter(models.Dependency.task_id.in_(task_ids))
+        }
+        db.execute(
+            delete(models.Dependency).where(
+                models.Dependency.id.in_([dep_ids[edge] for edge in removed_edges])
+            )
+        )
+        for task_id, depends_on_id in removed_edges:
+            readiness_ids.add(task_id)
+            projects = [project_of(task_id), project_of(depends_on_id)]
+            affected_projects.update(projects)
+            changes.append({
+                "entity": "dependency", "op": "deleted", "entity_id": dep_ids[(task_id, depends_on_id)],
+                "project_ids": projects, "task_id": task_id, "depends_on_id": depends_on_id,
+            })
+
+    # 5. 批量插入依赖边
+    added_edges = sorted(
+        (real(task_id), real(depends_on_id))
+        for task_id, targets in plan.overlay.added.items()
+        for depends_on_id in targets
+    )
+    if added_edges:
+        dep_ids = db.execute(
+            insert(models.Dependency).returning(models.Dependency.id, sort_by_parameter_order=True),
+            [{"task_id": task_id, "depends_on_id": depends_on_id} for task_id, depends_on_id in added_edges]
+        ).scalars().all()
+        reverse_map = {task_id: node for node, task_id in id_map.items()}
+        for dep_id, (task_id, depends_on_id) in zip(dep_ids, added_edges):
+            readiness_ids.add(task_id)
+            projects = [
+                project_of(reverse_map.get(task_id, task_id)),
+                project_of(reverse_map.get(depends_on_id, depends_on_id)),
+            ]
+            affected_projects.update(projects)
+            changes.append({
+                "entity": "dependency", "op": "created", "entity_id": dep_id,
+                "project_ids": projects, "task_id": task_id, "depends_on_id": depends_on_id,
+            })
+
+    # 6. 项目计数、就绪状态与变更日志
+    for (project_id, status), delta in stat_deltas.items():
+        project_stats.adjust(db, project_id, status, delta)
+    task_readiness.refresh(db, readiness_ids, readiness_prerequisites)
+    revision = change_log.record_many(db, changes)
+    if revision is None:
+        revision = change_log.current_revision(db)
+
+    results = []
+    for result in plan.results:
+        result = dict(result)
+        for key in ("task_id", "depends_on_id"):
+            if key in result:
+                result[key] = real(result[key]) if result[key] in id_map or result[key] > 0 else None
+        results.append(result)
+
+    return {
+        "results": results,
+        "refs": {ref: id_map[node] for ref, node in plan.refs.items() if node in id_map},
+        "revision": revision,
+        "touched": {
+            "deleted_tasks": list(plan.deleted),
+            "removed_edges": removed_edges,
+            "added_edges": added_edges,
+            "projects": affected_projects,
+            "changed_projects": {
+                project_id for change in changes for project_id in change["project_ids"]
+            },
+        },
+    }
@@ -0,0 +1,9 @@
+"""
+性能基准测试
+
+- benchmarks.generate：按参数生成合成数据库（项目数、任务数、依赖图形状）
+- benchmarks.run：在进程内压测 main.py 的全部路由，结果写入 JSON
+- benchmarks.compare：对比两次运行的结果，标出变慢的场景
+
+在项目根目录下以模块方式运行，例如 python -m benchmarks.run --output results.json
+"""
@@ -0,0 +1,90 @@
+"""
+对比两次基准运行的结果
+
+逐场景比较吞吐量和 p50 / p99 延迟，变化超过阈值（默认 10%）的标为变慢或变快；
+存在变慢的场景时以退出码 1 结束，可用于 CI 中的回归检查。
+
+用法：
+    python -m benchmarks.compare baseline.json current.json --threshold 15
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional, Tuple
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """返回 (表格行, 变慢的场景)"""
+    lines = [f"{'场景':<44} {'吞吐量':>10} {'p50':>10} {'p99':>10}"]
+    regressions = []
+    old_scenarios = baseline.get("scenarios", {})
+    new_scenarios = current.get("scenarios", {})
+    for name in sorted(old_scenarios.keys() | new_scenarios.keys()):
+        old, new = old_scenarios.get(name), new_scenarios.get(name)
+        if old is None or new is None:
+            lines.append(f"{name:<44} {'（仅在' + ('新' if old is None else '旧') + '结果中）':>32}")
+            continue
+        throughput = change(old["throughput_rps"], new["throughput_rps"])
+        p50 = change(old["latency_ms"].get("p50"), new["latency_ms"].get("p50"))
+        p99 = change(old["latency_ms"].get("p99"), new["latency_ms"].get("p99"))
+        cells = [
+            f"{value:>+9.1f}%" if value is not None else f"{'-':>10}"
+            for value in (throughput, p50, p99)
+        ]
+        slower = (
+            (throughput is not None and throughput < -threshold)
+            or (p50 is not None and p50 > threshold)
+        )
+        faster = (
+            (throughput is not None and throughput > threshold)
+            or (p50 is not None and p50 < -threshold)
+        )
+        mark = "  变慢" if slower else ("  变快" if faster else "")
+        if new.get("errors", 0) > old.get("errors", 0):
+            mark += f"  错误 {old.get('errors', 0)} -> {new['errors']}"
+            slower = True
+        if slower:
+            regressions.append(name)
+        lines.append(f"{name:<44} {' '.join(cells)}{mark}")
+    return lines, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比两次基准运行的结果")
+    parser.add_argument("baseline", help="基准结果文件")
+    parser.add_argument("current", help="当前结果文件")
+    parser.add_argument("--threshold", type=float, default=10.0, help="视为变化的百分比阈值（默认 10）")
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    for label, result in (("基准", baseline), ("当前", current)):
+        meta = result.get("meta", {})
+        git = meta.get("git", {})
+        print(
+            f"{label}：{(git.get('commit') or '未知')[:12]}{'（有未提交修改）' if git.get('dirty') else ''}"
+            f"  {meta.get('timestamp', '')}  db_mode={meta.get('db_mode', '')}"
+        )
+    if baseline.get("meta", {}).get("dataset", {}).get("tasks") != current.get("meta", {}).get("dataset", {}).get("tasks"):
+        print("注意：两次运行的数据集规模不同")
+    print()
+
+    lines, regressions = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n变慢的场景（阈值 {args.threshold:g}%）：{', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+合成基准数据生成
+
+按项目数、每个项目的任务数和依赖图形状，直接批量写入一个新的 SQLite 数据库（不经过接口）。
+同一组参数和随机种子总是生成相同的数据。依赖边总是由编号大的任务指向编号小的任务，生成的图一定无环。
+
+依赖图形状：
+- chain：每个任务依赖前一个任务（最深的依赖链）
+- fan：每组一个根任务、fan_width 个任务同时依赖它、一个汇总任务依赖这一组（宽扇出 / 扇入），组与组之间独立
+- diamond：菱形串联，源任务 -> diamond_width 个中间任务 -> 汇任务，汇任务作为下一个菱形的源
+- random：每个任务从它之前的 window 个任务中随机选 degree 个前置任务（随机 DAG，window=0 表示不限）
+- mixed：各项目依次轮流使用以上四种形状
+
+project_task_counts、task_readiness 等派生表不在这里写入，应用启动时会根据任务和依赖重建。
+表按当前模型创建，schema_migrations 中全部迁移记为已完成。
+
+用法：
+    python -m benchmarks.generate --output bench.db --projects 20 --tasks 2500 --shape mixed
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, insert
+
+SHAPES = ("chain", "fan", "diamond", "random")
+STATUSES = ("pending", "in_progress", "completed")
+# 默认状态分布（依次对应 STATUSES）
+STATUS_WEIGHTS = (0.5, 0.2, 0.3)
+
+# 每条 INSERT 语句写入的行数
+INSERT_CHUNK_SIZE = 10000
+
+# 生成任务的 created_at 从该时间起每个任务递增一秒
+BASE_TIME = datetime(2024, 1, 1)
+
+WORDS = (
+    "设计", "实现", "评审", "测试", "部署", "文档", "接口", "数据库", "前端", "后端",
+    "性能", "缓存", "迁移", "监控", "告警", "重构", "修复", "调研", "发布", "回归",
+)
+
+
+# ==================== 依赖图形状 ====================
+# 均返回项目内的局部编号对 (依赖方, 前置任务)，且依赖方编号大于前置任务编号
+
+def chain_edges(count: int, rng: random.Random, **options) -> List[Tuple[int, int]]:
+    return [(index, index - 1) for index in range(1, count)]
+
+
+def fan_edges(count: int, rng: random.Random, fan_width: int = 100, **options) -> List[Tuple[int, int]]:
+    edges = []
+    group_size = fan_width + 2
+    for root in range(0, count, group_size):
+        sink = min(root + group_size, count) - 1
+        members = range(root + 1, sink)
+        edges.extend((member, root) for member in members)
+        if sink > root:
+            edges.extend((sink, member) for member in members)
+            if not members:
+                edges.append((sink, root))
+    return edges
+
+
+def diamond_edges(count: int, rng: random.Random, diamond_width: int = 3, **options) -> List[Tuple[int, int]]:
+    edges = []
+    step = diamond_width + 1
+    for source in range(0, count, step):
+        sink = min(source + step, count - 1)
+        members = range(source + 1, sink)
+        edges.extend((member, source) for member in members)
+        if sink > source:
+            edges.extend((sink, member) for member in members)
+            if not members:
+                edges.append((sink, source))
+    return edges
+
+
+def random_edges(
+    count: int,
+    rng: random.Random,
+    degree: int = 2,
+    window: int = 100,
+    **options
+) -> List[Tuple[int, int]]:
+    edges = []
+    for index in range(1, count):
+        low = max(0, index - window) if window > 0 else 0
+        candidates = range(low, index)
+        for prerequisite in rng.sample(candidates, min(degree, len(candidates))):
+            edges.append((index, prerequisite))
+    return edges
+
+
+EDGE_BUILDERS = {
+    "chain": chain_edges,
+    "fan": fan_edges,
+    "diamond": diamond_edges,
+    "random": random_edges,
+}
+
+
+def project_shape(shape: str, index: int) -> str:
+    return SHAPES[index % len(SHAPES)] if shape == "mixed" else shape
+
+
+# ==================== 生成 ====================
+
+def _insert_chunks(conn, table, rows: List[dict]) -> None:
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        conn.execute(insert(table), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def _description(rng: random.Random) -> Optional[str]:
+    # 约四分之一的任务没有描述
+    if rng.random() < 0.25:
+        return None
+    return "，".join(rng.choice(WORDS) for _ in range(rng.randint(3, 24)))
+
+
+def generate(
+    path: str,
+    projects: int = 20,
+    tasks_per_project: int = 2500,
+    shape: str = "mixed",
+    seed: int = 42,
+    status_weights: Tuple[float, ...] = STATUS_WEIGHTS,
+    overwrite: bool = False,
+    **shape_options
+) -> dict:
+    """
+    生成数据库文件 path，返回生成参数和行数统计
+    shape_options 传给依赖图形状：fan_width、diamond_width、degree、window
+    """
+    if shape != "mixed" and shape not in EDGE_BUILDERS:
+        raise ValueError(f"未知的依赖图形状：{shape}（可选：{', '.join(SHAPES)}, mixed）")
+    if os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(f"数据库文件已存在：{path}")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    # database 模块在导入时读取 TASK_MANAGER_DB_PATH 等环境变量，
+    # 延迟到这里导入，调用方（benchmarks.run）可以先设置好环境变量
+    import migrations
+    import models
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    engine = create_engine(f"sqlite:///{os.path.abspath(path)}")
+    models.Base.metadata.create_all(bind=engine)
+
+    project_rows = []
+    task_rows = []
+    dependency_rows = []
+    shapes: Dict[int, str] = {}
+    task_id = 0
+    for project_index in range(projects):
+        project_id = project_index + 1
+        project_shape_name = project_shape(shape, project_index)
+        shapes[project_id] = project_shape_name
+        project_rows.append({
+            "id": project_id,
+            "name": f"基准项目 {project_id}（{project_shape_name}）",
+            "description": f"{tasks_per_project} 个任务，{project_shape_name} 依赖图",
+            "color": "#%06x" % rng.randrange(0x1000000),
+            "created_at": BASE_TIME,
+        })
+
+        first_id = task_id + 1
+        for index in range(tasks_per_project):
+            task_id += 1
+            task_rows.append({
+                "id": task_id,
+                "title": f"{rng.choice(WORDS)}{rng.choice(WORDS)} #{index + 1}",
+                "description": _description(rng),
+                "status": rng.choices(STATUSES, weights=status_weights)[0],
+                "project_id": project_id,
+                "created_at": BASE_TIME + timedelta(seconds=task_id),
+            })
+
+        edges = EDGE_BUILDERS[project_shape_name](tasks_per_project, rng, **shape_options)
+        dependency_rows.extend(
+            {"task_id": first_id + dependent, "depends_on_id": first_id + prerequisite}
+            for dependent, prerequisite in edges
+        )
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        _insert_chunks(conn, models.Project.__table__, project_rows)
+        _insert_chunks(conn, models.Task.__table__, task_rows)
+        _insert_chunks(conn, models.Dependency.__table__, dependency_rows)
+        migrations.stamp(conn)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+
+    return {
+        "path": os.path.abspath(path),
+        "projects": projects,
+        "tasks_per_project": tasks_per_project,
+        "shape": shape,
+        "project_shapes": shapes,
+        "shape_options": shape_options,
+        "seed": seed,
+        "status_weights": list(status_weights),
+        "tasks": len(task_rows),
+        "dependencies": len(dependency_rows),
+        "size_bytes": os.path.getsize(path),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """生成参数（benchmarks.run 复用）"""
+    parser.add_argument("--projects", type=int, default=20, help="项目数（默认 20）")
+    parser.add_argument("--tasks", type=int, default=2500, help="每个项目的任务数（默认 2500）")
+    parser.add_argument("--shape", choices=SHAPES + ("mixed",), default="mixed", help="依赖图形状（默认 mixed）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（默认 42）")
+    parser.add_argument("--fan-width", type=int, default=100, help="fan：每组依赖同一根任务的任务数（默认 100）")
+    parser.add_argument("--diamond-width", type=int, default=3, help="diamond：每个菱形的中间任务数（默认 3）")
+    parser.add_argument("--degree", type=int, default=2, help="random：每个任务的前置任务数（默认 2）")
+    parser.add_argument("--window", type=int, default=100, help="random：前置任务的选取范围，0 表示不限（默认 100）")
+    parser.add_argument(
+        "--status-weights", default=",".join(str(weight) for weight in STATUS_WEIGHTS),
+        help="pending,in_progress,completed 的比例（默认 0.5,0.2,0.3）"
+    )
+
+
+def generate_from_args(path: str, args: argparse.Namespace, overwrite: bool = False) -> dict:
+    return generate(
+        path,
+        projects=args.projects,
+        tasks_per_project=args.tasks,
+        shape=args.shape,
+        seed=args.seed,
+        status_weights=tuple(float(weight) for weight in args.status_weights.split(",")),
+        overwrite=overwrite,
+        fan_width=args.fan_width,
+        diamond_width=args.diamond_width,
+        degree=args.degree,
+        window=args.window,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="生成合成基准数据库")
+    parser.add_argument("--output", required=True, help="输出的数据库文件")
+    parser.add_argument("--force", action="store_true", help="覆盖已存在的文件")
+    add_arguments(parser)
+    args = parser.parse_args()
+    summary = generate_from_args(args.output, args, overwrite=args.force)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
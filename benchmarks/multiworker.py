@@ -0,0 +1,287 @@
+"""
+多进程缓存一致性测试
+
+启动 N 个独立的应用进程（各占一个端口，等同于 N 个工作进程）共享同一份数据库，
+进程均开启跨进程缓存同步（TASK_MANAGER_CACHE_SYNC=1）。在一个进程写入、在其他进程读取，检查：
+
+- 写后读：写请求返回后立即到另一个进程读取（读取前已预热该进程的缓存），必须读到这次写入
+  （任务快照的响应缓存 /api/tasks/with-dependencies、依赖图布局缓存 /api/projects/{id}/layout）
+- 跨进程循环依赖：一个进程添加 A 依赖 B 之后，另一个进程添加 B 依赖 A 必须被拒绝
+- SSE 推送延迟：其他进程的 /api/events 订阅者收到写入事件的延迟，
+  最大值不得超过 --max-delay-ms（默认为同步间隔的 3 倍加 100 ms）
+
+各进程同时启动，同时也检验启动初始化的互斥。任一检查失败时以退出码 1 结束：
+    python -m benchmarks.multiworker --workers 3 --iterations 100
+    python -m benchmarks.multiworker --db bench.db --interval-ms 50 --output multiworker.json
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks import generate
+from benchmarks.run import latency_summary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_workers(count: int, db_path: str, interval_ms: float, log_dir: str) -> List[dict]:
+    env = {
+        **os.environ,
+        "TASK_MANAGER_DB_PATH": db_path,
+        "TASK_MANAGER_CACHE_SYNC": "1",
+        "TASK_MANAGER_CACHE_SYNC_INTERVAL_MS": str(interval_ms),
+    }
+    env.pop("TASK_MANAGER_INITIALIZED", None)
+    workers = []
+    for index in range(count):
+        port = free_port()
+        log = open(os.path.join(log_dir, f"worker-{index}.log"), "w")
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        workers.append({"index": index, "port": port, "process": process, "log": log,
+                        "url": f"http://127.0.0.1:{port}"})
+    return workers
+
+
+def wait_ready(client, workers: List[dict], timeout: float = 120) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        while True:
+            if worker["process"].poll() is not None:
+                raise RuntimeError(f"工作进程 {worker['index']} 启动失败，见 {worker['log'].name}")
+            try:
+                if client.get(worker["url"] + "/").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"工作进程 {worker['index']} 启动超时")
+            time.sleep(0.1)
+
+
+def stop_workers(workers: List[dict]) -> None:
+    for worker in workers:
+        worker["process"].terminate()
+    for worker in workers:
+        try:
+            worker["process"].wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            worker["process"].kill()
+        worker["log"].close()
+
+
+# ==================== 检查 ====================
+
+def snapshot_ids(client, url: str, project_id: int) -> set:
+    response = client.get(url + "/api/tasks/with-dependencies", params={
+        "project_id": project_id, "format": "compact", "fields": "id"
+    })
+    response.raise_for_status()
+    return set(response.json()["columns"]["id"])
+
+
+def layout_ids(client, url: str, project_id: int) -> set:
+    response = client.get(url + f"/api/projects/{project_id}/layout")
+    response.raise_for_status()
+    return {int(task_id) for task_id in response.json()["positions"]}
+
+
+def read_after_write(client, workers: List[dict], projects: List[int], iterations: int) -> dict:
+    """每次在一个进程创建任务（隔一次再加一条依赖），立即在下一个进程读取快照和布局"""
+    stale_snapshots = 0
+    stale_layouts = 0
+    for i in range(iterations):
+        writer = workers[i % len(workers)]
+        reader = workers[(i + 1) % len(workers)]
+        project_id = projects[i % len(projects)]
+        # 预热读取进程的缓存，之后的写入必须使其失效
+        before = snapshot_ids(client, reader["url"], project_id)
+        layout_ids(client, reader["url"], project_id)
+
+        response = client.post(writer["url"] + "/api/tasks", json={"title": f"multiworker-{i}", "project_id": project_id})
+        response.raise_for_status()
+        task_id = response.json()["id"]
+        if i % 2 and before:
+            client.post(
+                writer["url"] + f"/api/tasks/{task_id}/dependencies", json={"depends_on_id": max(before)}
+            ).raise_for_status()
+
+        if task_id not in snapshot_ids(client, reader["url"], project_id):
+            stale_snapshots += 1
+        if task_id not in layout_ids(client, reader["url"], project_id):
+            stale_layouts += 1
+    return {"iterations": iterations, "stale_snapshots": stale_snapshots, "stale_layouts": stale_layouts}
+
+
+def cross_worker_cycles(client, workers: List[dict], project_id: int, rounds: int) -> dict:
+    """在一个进程添加 A 依赖 B，再到另一个进程添加 B 依赖 A，应返回 400"""
+    accepted = 0
+    for i in range(rounds):
+        first = workers[i % len(workers)]
+        second = workers[(i + 1) % len(workers)]
+        ids = []
+        for name in ("a", "b"):
+            response = client.post(first["url"] + "/api/tasks", json={"title": f"cycle-{i}-{name}", "project_id": project_id})
+            response.raise_for_status()
+            ids.append(response.json()["id"])
+        a, b = ids
+        # 先在 second 上写一次依赖，确保其依赖索引已加载（未加载时首次使用会从数据库读取，检查不出问题）
+        client.post(second["url"] + f"/api/tasks/{a}/dependencies", json={"depends_on_id": b})
+        client.delete(second["url"] + f"/api/tasks/{a}/dependencies/{b}")
+        client.post(first["url"] + f"/api/tasks/{a}/dependencies", json={"depends_on_id": b}).raise_for_status()
+        response = client.post(second["url"] + f"/api/tasks/{b}/dependencies", json={"depends_on_id": a})
+        if response.status_code != 400:
+            accepted += 1
+    return {"rounds": rounds, "cycles_accepted": accepted}
+
+
+class EventListener(threading.Thread):
+    """读取一个进程的 /api/events，记录每个修订号第一次出现的时间"""
+
+    def __init__(self, url: str):
+        super().__init__(daemon=True)
+        self.url = url
+        self.received: List[tuple] = []
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        import httpx
+
+        try:
+            with httpx.Client(timeout=None) as client:
+                with client.stream("GET", self.url + "/api/events") as response:
+                    for line in response.iter_lines():
+                        self.ready.set()
+                        if not line.startswith("data: "):
+                            continue
+                        message = json.loads(line[len("data: "):])
+                        if "revision" in message:
+                            with self._lock:
+                                self.received.append((time.perf_counter(), message["revision"]))
+        except httpx.TransportError:
+            # 测试结束时工作进程被终止
+            pass
+
+    def first_at_least(self, revision: int):
+        with self._lock:
+            for received_at, received in self.received:
+                if received >= revision:
+                    return received_at
+        return None
+
+
+def event_delays(client, workers: List[dict], project_id: int, writes: int, max_delay: float) -> dict:
+    """在第一个进程写入，测量其他进程的 SSE 订阅者收到事件的延迟"""
+    listeners = [EventListener(worker["url"]) for worker in workers[1:]]
+    for listener in listeners:
+        listener.start()
+    for listener in listeners:
+        listener.ready.wait(10)
+
+    writer = workers[0]
+    sent = []
+    for i in range(writes):
+        response = client.post(writer["url"] + "/api/tasks", json={"title": f"event-{i}", "project_id": project_id})
+        response.raise_for_status()
+        sent.append((time.perf_counter(), int(response.headers["X-Revision"])))
+        time.sleep(0.02)
+    time.sleep(max_delay + 0.5)
+
+    delays = []
+    missing = 0
+    for sent_at, revision in sent:
+        for listener in listeners:
+            received_at = listener.first_at_least(revision)
+            if received_at is None:
+                missing += 1
+            else:
+                delays.append(max(0.0, received_at - sent_at))
+    return {"writes": writes, "subscribers": len(listeners), "missing": missing, "delay_ms": latency_summary(delays)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="多进程缓存一致性测试")
+    parser.add_argument("--workers", type=int, default=3, help="应用进程数（默认 3）")
+    parser.add_argument("--db", help="使用已有数据库（复制一份，原文件不修改）；默认生成新数据")
+    parser.add_argument("--iterations", type=int, default=100, help="写后读检查次数（默认 100）")
+    parser.add_argument("--cycle-rounds", type=int, default=20, help="跨进程循环依赖检查次数（默认 20）")
+    parser.add_argument("--event-writes", type=int, default=50, help="SSE 延迟测量的写入次数（默认 50）")
+    parser.add_argument("--interval-ms", type=float, default=100, help="TASK_MANAGER_CACHE_SYNC_INTERVAL_MS（默认 100）")
+    parser.add_argument("--max-delay-ms", type=float, help="SSE 延迟上限（默认 3 × 同步间隔 + 100）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    generate.add_arguments(parser)
+    parser.set_defaults(projects=4, tasks=500)
+    args = parser.parse_args()
+
+    import httpx
+
+    max_delay = (args.max_delay_ms if args.max_delay_ms is not None else args.interval_ms * 3 + 100) / 1000
+    workdir = tempfile.mkdtemp(prefix="task-manager-multiworker-")
+    db_path = os.path.join(workdir, "multiworker.db")
+    if args.db:
+        shutil.copyfile(args.db, db_path)
+    else:
+        generate.generate_from_args(db_path, args)
+
+    workers = start_workers(args.workers, db_path, args.interval_ms, workdir)
+    try:
+        with httpx.Client(timeout=60) as client:
+            wait_ready(client, workers)
+            projects = [project["id"] for project in client.get(workers[0]["url"] + "/api/projects").json()]
+            print(f"{args.workers} 个进程就绪，数据库 {db_path}", flush=True)
+
+            results: Dict[str, dict] = {
+                "read_after_write": read_after_write(client, workers, projects, args.iterations),
+                "cross_worker_cycles": cross_worker_cycles(client, workers, projects[0], args.cycle_rounds),
+                "events": event_delays(client, workers, projects[0], args.event_writes, max_delay),
+                "sync": [client.get(worker["url"] + "/api/cache/stats").json()["sync"] for worker in workers],
+            }
+    finally:
+        stop_workers(workers)
+
+    events = results["events"]
+    failures = []
+    if results["read_after_write"]["stale_snapshots"] or results["read_after_write"]["stale_layouts"]:
+        failures.append("写后读到过期数据")
+    if results["cross_worker_cycles"]["cycles_accepted"]:
+        failures.append("跨进程的循环依赖未被拒绝")
+    if events["missing"]:
+        failures.append(f"{events['missing']} 个事件未送达")
+    if events["delay_ms"] and events["delay_ms"]["max"] > max_delay * 1000:
+        failures.append(f"SSE 延迟 {events['delay_ms']['max']} ms 超过上限 {max_delay * 1000:.0f} ms")
+    results.update({"workers": args.workers, "interval_ms": args.interval_ms,
+                    "max_delay_ms": max_delay * 1000, "failures": failures})
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if failures:
+        print("失败：" + "；".join(failures), file=sys.stderr)
+        return 1
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1106 @@
+"""
+接口基准测试
+
+在进程内（httpx.ASGITransport，不经过网络）依次压测 main.py 的每个路由，
+报告吞吐量和延迟分位数（p50 / p90 / p95 / p99），结果写入 JSON 文件，
+便于在不同提交之间对比（python -m benchmarks.compare）。
+
+数据：默认按 benchmarks.generate 的参数在临时目录生成一份新数据库；
+--db 指定已有数据库时先复制一份再压测，原文件不会被修改。写接口场景会修改副本中的数据。
+
+除逐路由场景外还包括：
+- 不同长度的依赖链上添加依赖的循环检测（接受与拒绝，--cycle-chain-lengths 100,1000,10000）
+- 不同并发度下的读写混合负载和纯写负载（--concurrency 1,8,32）
+- SSE 推送扇出：N 个 /api/events 连接收到同一次写入事件的延迟
+- 组件基准：内存索引上的循环检测、行序列化吞吐量、紧凑格式与 JSON 的体积和解析耗时
+- 项目导出与导入：流式导出最大的项目（NDJSON / CSV），再把导出文件导入为新项目
+- 后台作业：在最大项目的副本上批量移动任务、合并项目、级联删除，以及作业期间其他写请求的延迟
+- 归档（最后运行）：归档全部已完成任务的吞吐，含归档任务的查询和恢复
+
+应用在生成数据之后才导入，TASK_MANAGER_* 环境变量照常生效。对比同步 / 异步模式时分别运行：
+    python -m benchmarks.run --output sync.json
+    python -m benchmarks.run --db-mode async --output async.json
+    python -m benchmarks.compare sync.json async.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from benchmarks import generate
+
+# 请求工厂返回 (method, url, httpx 请求参数)
+RequestFactory = Callable[[int], Tuple[str, str, Dict[str, Any]]]
+
+
+# ==================== 统计 ====================
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """最近秩法分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(round(q / 100 * len(sorted_values) + 0.5))))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict[str, float]:
+    """秒 -> 毫秒分位数"""
+    values = sorted(latencies)
+    if not values:
+        return {}
+    return {
+        "min": round(values[0] * 1000, 3),
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p90": round(percentile(values, 90) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+def timed(func: Callable[[], Any], repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+# ==================== 场景 ====================
+
+class Scenario:
+    """
+    一个压测场景：同一路由重复请求 iterations 次
+    before(i) 在计时前调用（如清空缓存以测冷路径），after(i, response) 在计时后调用（如记录新建的ID）
+    items 为每个请求处理的条目数（批量导入的操作数），用于计算每秒条目数
+    """
+
+    def __init__(
+        self,
+        name: str,
+        route: str,
+        make_request: RequestFactory,
+        iterations: int,
+        expected_status: int = 200,
+        warmup: int = 0,
+        items: int = 1,
+        before: Optional[Callable[[int], None]] = None,
+        after: Optional[Callable[[int, Any], None]] = None,
+    ):
+        self.name = name
+        self.route = route
+        self.make_request = make_request
+        self.iterations = max(1, iterations)
+        self.expected_status = expected_status
+        self.warmup = warmup
+        self.items = items
+        self.before = before
+        self.after = after
+
+
+async def measure(client, scenario: Scenario, concurrency: int = 1) -> dict:
+    """按给定并发度执行场景，返回吞吐量、延迟分位数和错误数"""
+    for index in range(scenario.warmup):
+        method, url, kwargs = scenario.make_request(index)
+        await client.request(method, url, **kwargs)
+
+    latencies: List[float] = []
+    errors: Dict[int, int] = {}
+    response_bytes = 0
+    indexes = iter(range(scenario.iterations))
+
+    async def worker():
+        nonlocal response_bytes
+        # 各 worker 共用同一个迭代器，按到达顺序领取请求序号
+        for index in indexes:
+            if scenario.before is not None:
+                scenario.before(index)
+            method, url, kwargs = scenario.make_request(index)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            response_bytes += len(response.content)
+            if response.status_code != scenario.expected_status:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+            if scenario.after is not None:
+                scenario.after(index, response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+
+    result = {
+        "route": scenario.route,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": sum(errors.values()),
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "mean_response_bytes": round(response_bytes / len(latencies)) if latencies else 0,
+    }
+    if errors:
+        result["error_statuses"] = {str(code): count for code, count in sorted(errors.items())}
+    if scenario.items > 1:
+        result["items_per_request"] = scenario.items
+        result["items_per_s"] = round(len(latencies) * scenario.items / duration, 1) if duration else 0.0
+    return result
+
+
+# ==================== 基准 ====================
+
+class Benchmark:
+    def __init__(self, app_module, client, args: argparse.Namespace):
+        self.main = app_module
+        self.client = client
+        self.args = args
+        self.results: Dict[str, dict] = {}
+        self.covered_routes = set()
+        self.run_tag = str(int(time.time() * 1000))
+
+    def iterations(self, scale: float = 1.0) -> int:
+        return max(1, int(self.args.iterations * scale))
+
+    async def run_scenario(self, scenario: Scenario, concurrency: int = 1, key: Optional[str] = None) -> dict:
+        result = await measure(self.client, scenario, concurrency)
+        self.results[key or scenario.name] = result
+        self.covered_routes.add(scenario.route)
+        latency = result["latency_ms"]
+        print(
+            f"  {key or scenario.name:<44} {result['throughput_rps']:>9.1f} req/s"
+            f"  p50 {latency['p50']:>8.2f} ms  p99 {latency['p99']:>8.2f} ms"
+            + (f"  错误 {result['errors']}" if result["errors"] else ""),
+            flush=True
+        )
+        return result
+
+    async def get_json(self, url: str) -> Any:
+        response = await self.client.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    async def post_json(self, url: str, body: dict, expected_status: int = 200) -> Any:
+        response = await self.client.post(url, json=body)
+        if response.status_code != expected_status:
+            raise RuntimeError(f"准备数据失败：POST {url} 返回 {response.status_code} {response.text[:200]}")
+        return response.json()
+
+    # ---------- 准备 ----------
+
+    async def discover(self) -> None:
+        """从数据中选出压测目标：任务最多的项目、最长依赖链的两端"""
+        projects = await self.get_json("/api/projects")
+        if not projects:
+            raise RuntimeError("数据库中没有项目")
+        self.project_ids = [project["id"] for project in projects]
+        self.project_id = max(projects, key=lambda project: (project["task_count"], -project["id"]))["id"]
+
+        longest = None
+        for project_id in self.project_ids:
+            path = await self.get_json(f"/api/projects/{project_id}/critical-path")
+            if longest is None or path["length"] > longest["length"]:
+                longest = path
+        self.deep_project_id = longest["project_id"]
+        self.chain_head = longest["tasks"][0]["id"]
+        self.chain_tail = longest["tasks"][-1]["id"]
+        self.chain_length = longest["length"]
+
+        tasks = await self.get_json(f"/api/tasks?project_id={self.project_id}")
+        self.task_ids = [task["id"] for task in tasks]
+        self.task_titles = [task["title"] for task in tasks]
+
+        # 写接口场景使用的独立项目
+        project = await self.post_json(
+            "/api/projects", {"name": f"基准写入 {self.run_tag}"}, expected_status=201
+        )
+        self.write_project_id = project["id"]
+
+    def describe_targets(self) -> dict:
+        return {
+            "project_id": self.project_id,
+            "project_tasks": len(self.task_ids),
+            "deep_project_id": self.deep_project_id,
+            "longest_chain": self.chain_length,
+            "chain_head": self.chain_head,
+            "chain_tail": self.chain_tail,
+        }
+
+    # ---------- 读接口 ----------
+
+    async def read_scenarios(self) -> None:
+        main = self.main
+        pid = self.project_id
+        task_ids = self.task_ids
+        warmup = self.args.warmup
+
+        def get(url: str, headers: Optional[dict] = None) -> RequestFactory:
+            kwargs = {"headers": headers} if headers else {}
+            return lambda index: ("GET", url, kwargs)
+
+        def clear_responses(index: int) -> None:
+            main.response_cache.clear()
+
+        def clear_layouts(index: int) -> None:
+            main.layout_cache.clear()
+
+        snapshot = await self.client.get(f"/api/tasks/with-dependencies?project_id={pid}")
+        snapshot_etag = snapshot.headers["etag"]
+        projects_etag = (await self.client.get("/api/projects")).headers["etag"]
+
+        scenarios = [
+            Scenario("root", "GET /", get("/"), self.iterations(), warmup=warmup),
+            Scenario("list_projects", "GET /api/projects", get("/api/projects"), self.iterations(), warmup=warmup),
+            Scenario(
+                "list_projects_cold", "GET /api/projects", get("/api/projects"),
+                self.iterations(), before=clear_responses
+            ),
+            Scenario(
+                "list_projects_not_modified", "GET /api/projects",
+                get("/api/projects", {"If-None-Match": projects_etag}),
+                self.iterations(), expected_status=304, warmup=warmup
+            ),
+            Scenario(
+                "get_project", "GET /api/projects/{project_id}",
+                get(f"/api/projects/{pid}"), self.iterations(), warmup=warmup
+            ),
+            Scenario(
+                "list_tasks_project", "GET /api/tasks",
+                get(f"/api/tasks?project_id={pid}"), self.iterations(0.25), warmup=warmup
+            ),
+            Scenario(
+                "list_tasks_page", "GET /api/tasks",
+                get("/api/tasks?limit=100&order_by=created_at"), self.iterations(), warmup=warmup
+            ),
+            Scenario(
+                "list_tasks_ndjson_all", "GET /api/tasks",
+                get("/api/tasks?format=ndjson"), self.iterations(0.05)
+            ),
+            Scenario(
+                "with_dependencies_project", "GET /api/tasks/with-dependencies",
+                get(f"/api/tasks/with-dependencies?project_id={pid}"), self.iterations(), warmup=warmup
+            ),
+            Scenario(
+                "with_dependencies_project_cold", "GET /api/tasks/with-dependencies",
+                get(f"/api/tasks/with-dependencies?project_id={pid}"),
+                self.iterations(0.25), before=clear_responses
+            ),
+            Scenario(
+                "with_dependencies_project_compact_cold", "GET /api/tasks/with-dependencies",
+                get(f"/api/tasks/with-dependencies?project_id={pid}&format=compact"),
+                self.iterations(0.25), before=clear_responses
+            ),
+            Scenario(
+                "with_dependencies_project_not_modified", "GET /api/tasks/with-dependencies",
+                get(f"/api/tasks/with-dependencies?project_id={pid}", {"If-None-Match": snapshot_etag}),
+                self.iterations(), expected_status=304, warmup=warmup
+            ),
+            Scenario(
+                "with_dependencies_all_cold", "GET /api/tasks/with-dependencies",
+                get("/api/tasks/with-dependencies"), self.iterations(0.05), before=clear_responses
+            ),
+            Scenario(
+                "ready_tasks_project", "GET /api/tasks/ready",
+                get(f"/api/tasks/ready?project_id={pid}"), self.iterations(0.5), warmup=warmup
+            ),
+            Scenario(
+                "search_project", "GET /api/tasks/search",
+                lambda index: ("GET", "/api/tasks/search", {
+                    "params": {"q": self.task_titles[index % len(self.task_titles)][:3], "project_id": pid}
+                }),
+                self.iterations(0.5), warmup=warmup
+            ),
+            Scenario(
+                "search_all", "GET /api/tasks/search",
+                lambda index: ("GET", "/api/tasks/search", {
+                    "params": {"q": self.task_titles[index % len(self.task_titles)][:4]}
+                }),
+                self.iterations(0.5), warmup=warmup
+            ),
+            Scenario(
+                "get_task", "GET /api/tasks/{task_id}",
+                lambda index: ("GET", f"/api/tasks/{task_ids[index % len(task_ids)]}", {}),
+                self.iterations(), warmup=warmup
+            ),
+            Scenario(
+                "ancestors_deep", "GET /api/tasks/{task_id}/ancestors",
+                get(f"/api/tasks/{self.chain_tail}/ancestors"), self.iterations(0.1), warmup=warmup
+            ),
+            Scenario(
+                "descendants_deep", "GET /api/tasks/{task_id}/descendants",
+                get(f"/api/tasks/{self.chain_head}/descendants"), self.iterations(0.1), warmup=warmup
+            ),
+            Scenario(
+                "critical_path", "GET /api/projects/{project_id}/critical-path",
+                get(f"/api/projects/{self.deep_project_id}/critical-path"), self.iterations(0.1), warmup=warmup
+            ),
+            Scenario(
+                "layout", "GET /api/projects/{project_id}/layout",
+                get(f"/api/projects/{pid}/layout"), self.iterations(), warmup=warmup
+            ),
+            Scenario(
+                "layout_cold", "GET /api/projects/{project_id}/layout",
+                get(f"/api/projects/{pid}/layout"), self.iterations(0.1), before=clear_layouts
+            ),
+            # 一屏视口（约 10 列 × 8 行）的区域查询；冷路径包括布局计算和空间索引构建
+            Scenario(
+                "layout_region_viewport", "GET /api/projects/{project_id}/layout/region",
+                get(f"/api/projects/{pid}/layout/region?max_column=9&max_row=7"), self.iterations(), warmup=warmup
+            ),
+            Scenario(
+                "layout_region_cold", "GET /api/projects/{project_id}/layout/region",
+                get(f"/api/projects/{pid}/layout/region?max_column=9&max_row=7"), self.iterations(0.1),
+                before=clear_layouts
+            ),
+            Scenario(
+                "dependency_consistency", "GET /api/dependencies/consistency",
+                get("/api/dependencies/consistency"), self.iterations(0.02)
+            ),
+            Scenario("cache_stats", "GET /api/cache/stats", get("/api/cache/stats"), self.iterations(), warmup=warmup),
+            Scenario("metrics", "GET /metrics", get("/metrics"), self.iterations(0.25), warmup=warmup),
+        ]
+        for scenario in scenarios:
+            await self.run_scenario(scenario)
+
+    # ---------- 写接口 ----------
+
+    async def write_scenarios(self) -> None:
+        wpid = self.write_project_id
+        start_revision = int((await self.client.get(
+            f"/api/tasks/with-dependencies?project_id={wpid}"
+        )).headers["x-revision"])
+        count = self.iterations()
+        created: List[int] = []
+        projects: List[int] = []
+
+        def remember(target: List[int]) -> Callable[[int, Any], None]:
+            def after(index: int, response) -> None:
+                if response.status_code in (200, 201):
+                    target.append(response.json()["id"])
+            return after
+
+        await self.run_scenario(Scenario(
+            "create_task", "POST /api/tasks",
+            lambda index: ("POST", "/api/tasks", {"json": {"title": f"基准任务 {index}", "project_id": wpid}}),
+            count, expected_status=201, after=remember(created)
+        ))
+        # 新任务依赖最长链的末端：循环检测需遍历整条链的全部前置任务才能确认无环
+        await self.run_scenario(Scenario(
+            "add_dependency_deep_accepted", "POST /api/tasks/{task_id}/dependencies",
+            lambda index: (
+                "POST", f"/api/tasks/{created[index]}/dependencies", {"json": {"depends_on_id": self.chain_tail}}
+            ),
+            len(created)
+        ))
+        # 链首依赖链尾：形成环，被拒绝
+        await self.run_scenario(Scenario(
+            "add_dependency_cycle_rejected", "POST /api/tasks/{task_id}/dependencies",
+            lambda index: (
+                "POST", f"/api/tasks/{self.chain_head}/dependencies", {"json": {"depends_on_id": self.chain_tail}}
+            ),
+            self.iterations(0.5), expected_status=400
+        ))
+        await self.cycle_check_scenarios()
+        await self.run_scenario(Scenario(
+            "update_task_status", "PUT /api/tasks/{task_id}",
+            lambda index: (
+                "PUT", f"/api/tasks/{self.task_ids[index % len(self.task_ids)]}",
+                {"json": {"status": ("completed", "pending", "in_progress")[index % 3]}}
+            ),
+            count
+        ))
+        half = len(created) // 2
+        await self.run_scenario(Scenario(
+            "remove_dependency", "DELETE /api/tasks/{task_id}/dependencies/{depends_on_id}",
+            lambda index: ("DELETE", f"/api/tasks/{created[index]}/dependencies/{self.chain_tail}", {}),
+            half, expected_status=204
+        ))
+        # 后一半任务仍带有依赖边
+        await self.run_scenario(Scenario(
+            "delete_task", "DELETE /api/tasks/{task_id}",
+            lambda index: ("DELETE", f"/api/tasks/{created[index]}", {}),
+            len(created), expected_status=204
+        ))
+
+        batch_size = self.args.batch_size
+
+        def batch_request(index: int):
+            operations = [
+                {"op": "create_task", "ref": f"t{n}", "title": f"导入任务 {index}-{n}", "project_id": wpid}
+                for n in range(batch_size)
+            ]
+            operations.extend(
+                {"op": "add_dependency", "task_id": f"t{n}", "depends_on_id": f"t{n - 1}"}
+                for n in range(1, batch_size)
+            )
+            return "POST", "/api/batch", {"json": {"operations": operations}}
+
+        await self.run_scenario(Scenario(
+            "batch_import", "POST /api/batch", batch_request,
+            self.iterations(0.05), items=batch_size * 2 - 1
+        ))
+
+        await self.run_scenario(Scenario(
+            "create_project", "POST /api/projects",
+            lambda index: ("POST", "/api/projects", {"json": {"name": f"基准项目 {self.run_tag}-{index}"}}),
+            self.iterations(0.25), expected_status=201, after=remember(projects)
+        ))
+        await self.run_scenario(Scenario(
+            "update_project", "PUT /api/projects/{project_id}",
+            lambda index: (
+                "PUT", f"/api/projects/{projects[index % len(projects)]}", {"json": {"color": "#%06x" % index}}
+            ),
+            self.iterations(0.25)
+        ))
+
+        await self.run_scenario(Scenario(
+            "delete_project", "DELETE /api/projects/{project_id}",
+            lambda index: ("DELETE", f"/api/projects/{projects[index]}", {}),
+            len(projects), expected_status=204
+        ))
+
+        # 增量同步：取回以上全部写入产生的变更
+        await self.run_scenario(Scenario(
+            "changes_since_writes", "GET /api/changes",
+            lambda index: ("GET", f"/api/changes?since={start_revision}", {}),
+            self.iterations(0.25)
+        ))
+
+    async def build_chain(self, length: int, spare: int) -> Tuple[List[int], List[int]]:
+        """在写入项目中一次批量创建长度为 length 的依赖链（每个任务依赖前一个）和 spare 个独立任务"""
+        operations = [
+            {"op": "create_task", "ref": f"c{n}", "title": f"依赖链 {length}-{n}", "project_id": self.write_project_id}
+            for n in range(length)
+        ]
+        operations.extend(
+            {"op": "add_dependency", "task_id": f"c{n}", "depends_on_id": f"c{n - 1}"} for n in range(1, length)
+        )
+        operations.extend(
+            {"op": "create_task", "ref": f"s{n}", "title": f"依赖链 {length} 外 {n}", "project_id": self.write_project_id}
+            for n in range(spare)
+        )
+        refs = (await self.post_json("/api/batch", {"operations": operations}))["refs"]
+        return [refs[f"c{n}"] for n in range(length)], [refs[f"s{n}"] for n in range(spare)]
+
+    async def cycle_check_scenarios(self) -> None:
+        """
+        按 --cycle-chain-lengths 的每个长度新建一条依赖链，分别测量添加依赖时循环检测的延迟：
+        - 接受：独立任务依赖链尾，需遍历整条链的前置任务才能确认无环
+        - 拒绝：链首依赖链尾，沿前置任务走到链首时发现环
+        """
+        count = self.iterations(0.5)
+        for length in self.args.cycle_chain_lengths:
+            chain, spare = await self.build_chain(length, count)
+            head, tail = chain[0], chain[-1]
+            await self.run_scenario(Scenario(
+                f"add_dependency_chain{length}_accepted", "POST /api/tasks/{task_id}/dependencies",
+                lambda index: ("POST", f"/api/tasks/{spare[index]}/dependencies", {"json": {"depends_on_id": tail}}),
+                count
+            ))
+            await self.run_scenario(Scenario(
+                f"add_dependency_chain{length}_cycle_rejected", "POST /api/tasks/{task_id}/dependencies",
+                lambda index: ("POST", f"/api/tasks/{head}/dependencies", {"json": {"depends_on_id": tail}}),
+                count, expected_status=400
+            ))
+
+    # ---------- 导出与导入 ----------
+
+    async def transfer_scenarios(self) -> dict:
+        """导出最大的项目（NDJSON 与 CSV 各一次），再把 NDJSON 导入为新项目；返回耗时、体积和吞吐"""
+        pid = self.project_id
+        result = {}
+        exported = {}
+        for format in ("ndjson", "csv"):
+            started = time.perf_counter()
+            response = await self.client.get(f"/api/projects/{pid}/export?format={format}")
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise RuntimeError(f"导出失败：{response.status_code} {response.text[:200]}")
+            exported[format] = response.content
+            result[f"export_{format}"] = {
+                "route": "GET /api/projects/{project_id}/export",
+                "bytes": len(response.content),
+                "elapsed_s": round(elapsed, 3),
+            }
+        self.covered_routes.add("GET /api/projects/{project_id}/export")
+
+        started = time.perf_counter()
+        response = await self.client.post(
+            f"/api/projects/import?name=benchmark-import-{int(time.time())}", content=exported["ndjson"]
+        )
+        elapsed = time.perf_counter() - started
+        if response.status_code != 201:
+            raise RuntimeError(f"导入失败：{response.status_code} {response.text[:200]}")
+        self.covered_routes.add("POST /api/projects/import")
+        imported = response.json()
+        result["import_ndjson"] = {
+            "route": "POST /api/projects/import",
+            "tasks": imported["tasks"],
+            "dependencies": imported["dependencies"],
+            "elapsed_s": round(elapsed, 3),
+            "tasks_per_s": round(imported["tasks"] / elapsed) if elapsed else 0,
+        }
+        for key, item in result.items():
+            detail = f"{item['bytes']} 字节" if "bytes" in item else f"{item['tasks']} 个任务 {item['dependencies']} 条依赖"
+            print(f"  {key:<44} {detail}  {item['elapsed_s']:>8.3f} s", flush=True)
+        return result
+
+    # ---------- 后台作业 ----------
+
+    async def wait_job(self, job: dict) -> dict:
+        while job["running"]:
+            await asyncio.sleep(0.05)
+            job = await self.get_json(f"/api/jobs/{job['id']}")
+        if job["error"]:
+            raise RuntimeError(f"作业失败：{job['error']}")
+        return job
+
+    async def run_job(self, key: str, route: str, method: str, url: str, probe_project: int, body=None) -> dict:
+        """启动作业，运行期间不断在 probe_project 中新建任务，测量作业期间其他写请求的延迟"""
+        started = time.perf_counter()
+        response = await self.client.request(method, url, json=body)
+        if response.status_code != 202:
+            raise RuntimeError(f"启动作业失败：{response.status_code} {response.text[:200]}")
+        self.covered_routes.add(route)
+        job = response.json()
+        latencies = []
+        while job["running"]:
+            probe_started = time.perf_counter()
+            (await self.client.post(
+                "/api/tasks", json={"title": f"job-probe-{len(latencies)}", "project_id": probe_project}
+            )).raise_for_status()
+            latencies.append(time.perf_counter() - probe_started)
+            job = await self.get_json(f"/api/jobs/{job['id']}")
+        job = await self.wait_job(job)
+        elapsed = time.perf_counter() - started
+        result = {
+            "route": route,
+            "batch_size": job["batch_size"],
+            "batches": job["batches"],
+            "tasks": job["tasks"] + job["archived_tasks"],
+            "dependencies": job["dependencies"],
+            "elapsed_s": round(elapsed, 3),
+            "tasks_per_s": round((job["tasks"] + job["archived_tasks"]) / elapsed) if elapsed else 0,
+            "concurrent_write_ms": latency_summary(latencies),
+        }
+        p99 = result["concurrent_write_ms"].get("p99", 0)
+        print(
+            f"  {key:<44} {result['tasks']} 个任务 {result['batches']} 批  {result['elapsed_s']:>8.3f} s"
+            f"  {result['tasks_per_s']} 任务/s  并发写 p99 {p99} ms",
+            flush=True
+        )
+        return result
+
+    async def job_scenarios(self) -> dict:
+        """
+        导入最大项目的副本，把其中一半任务移动到新项目，再把新项目合并回副本，最后级联删除副本
+        （数据集恢复原状）；返回每个作业的耗时、吞吐和作业期间其他写请求的延迟
+        """
+        suffix = int(time.time())
+        response = await self.client.get(f"/api/projects/{self.project_id}/export")
+        copy = (await self.client.post(
+            f"/api/projects/import?name=benchmark-jobs-{suffix}", content=response.content
+        )).json()["project"]["id"]
+        target = (await self.post_json("/api/projects", {"name": f"benchmark-jobs-target-{suffix}"}, 201))["id"]
+        probe = (await self.post_json("/api/projects", {"name": f"benchmark-jobs-probe-{suffix}"}, 201))["id"]
+        page = await self.get_json(f"/api/tasks/with-dependencies?project_id={copy}&format=compact&fields=id")
+        task_ids = page["columns"]["id"]
+
+        result = {
+            "move_tasks": await self.run_job(
+                "move_tasks", "POST /api/tasks/move", "POST", "/api/tasks/move", probe,
+                {"task_ids": task_ids[::2], "target_project_id": target},
+            ),
+            "merge_project": await self.run_job(
+                "merge_project", "POST /api/projects/{project_id}/merge", "POST",
+                f"/api/projects/{target}/merge", probe, {"target_project_id": copy},
+            ),
+            "delete_project_cascade": await self.run_job(
+                "delete_project_cascade", "DELETE /api/projects/{project_id}", "DELETE",
+                f"/api/projects/{copy}?cascade=true", probe,
+            ),
+        }
+        response = await self.client.delete(f"/api/projects/{probe}?cascade=true")
+        await self.wait_job(response.json())
+        self.covered_routes.update(("GET /api/jobs/{job_id}", "GET /api/jobs"))
+        await self.get_json("/api/jobs")
+        return result
+
+    # ---------- 归档 ----------
+
+    async def archive_scenarios(self) -> dict:
+        """
+        归档数据集中全部已完成的任务（改变数据集，放在最后运行），
+        再测含归档任务的读取和恢复；返回归档作业的耗时和吞吐
+        """
+        started = time.perf_counter()
+        response = await self.client.post("/api/archive/run?older_than_days=0")
+        if response.status_code != 202:
+            raise RuntimeError(f"启动归档失败：{response.status_code} {response.text[:200]}")
+        self.covered_routes.add("POST /api/archive/run")
+        while True:
+            status = await self.get_json("/api/archive/status")
+            if not status["running"]:
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        self.covered_routes.add("GET /api/archive/status")
+        if status["error"]:
+            raise RuntimeError(f"归档失败：{status['error']}")
+        result = {
+            "route": "POST /api/archive/run",
+            "batch_size": status["batch_size"],
+            "batches": status["batches"],
+            "archived_tasks": status["archived_tasks"],
+            "archived_dependencies": status["archived_dependencies"],
+            "elapsed_s": round(elapsed, 3),
+            "tasks_per_s": round(status["archived_tasks"] / elapsed) if elapsed else 0,
+        }
+        print(
+            f"  {'archive_run':<44} {result['archived_tasks']} 个任务 {result['batches']} 批"
+            f"  {result['elapsed_s']:>8.3f} s  {result['tasks_per_s']} 任务/s",
+            flush=True
+        )
+
+        pid = self.project_id
+        archived = [
+            task["id"]
+            for task in await self.get_json(f"/api/tasks?project_id={pid}&include_archived=true")
+            if task["archived"]
+        ]
+        if not archived:
+            return result
+
+        def get(url: str) -> RequestFactory:
+            return lambda index: ("GET", url, {})
+
+        count = min(self.iterations(0.5), len(archived))
+        await self.run_scenario(Scenario(
+            "archive_status", "GET /api/archive/status", get("/api/archive/status"), self.iterations()
+        ))
+        await self.run_scenario(Scenario(
+            "list_tasks_project_include_archived", "GET /api/tasks",
+            get(f"/api/tasks?project_id={pid}&include_archived=true"), self.iterations(0.25),
+            warmup=self.args.warmup
+        ))
+        await self.run_scenario(Scenario(
+            "get_task_archived", "GET /api/tasks/{task_id}",
+            lambda index: ("GET", f"/api/tasks/{archived[index % len(archived)]}?include_archived=true", {}),
+            self.iterations()
+        ))
+        # 按归档时的顺序逐个恢复：依赖关系另一端仍在归档中的边留在归档表
+        await self.run_scenario(Scenario(
+            "restore_task", "POST /api/tasks/{task_id}/restore",
+            lambda index: ("POST", f"/api/tasks/{archived[index]}/restore", {}),
+            count
+        ))
+        return result
+
+    # ---------- 并发 ----------
+
+    async def concurrency_scenarios(self) -> None:
+        pid = self.project_id
+        task_ids = self.task_ids
+        reads = (
+            f"/api/tasks/with-dependencies?project_id={pid}",
+            "/api/tasks?limit=100",
+            f"/api/tasks/ready?project_id={pid}",
+        )
+
+        def mixed(index: int):
+            # 约 10% 写入（更新任务状态），其余为读
+            if index % 10 == 9:
+                return "PUT", f"/api/tasks/{task_ids[index % len(task_ids)]}", {
+                    "json": {"status": ("completed", "pending")[index // 10 % 2]}
+                }
+            if index % 3 == 0:
+                return "GET", f"/api/tasks/{task_ids[index % len(task_ids)]}", {}
+            return "GET", reads[index % len(reads)], {}
+
+        def writes(index: int):
+            return "PUT", f"/api/tasks/{task_ids[index % len(task_ids)]}", {
+                "json": {"status": ("completed", "pending", "in_progress")[index % 3]}
+            }
+
+        def creates(index: int):
+            return "POST", "/api/tasks", {
+                "json": {"title": f"并发创建 {index}", "project_id": self.write_project_id}
+            }
+
+        for level in self.args.concurrency:
+            await self.run_scenario(
+                Scenario("mixed", "mixed", mixed, self.iterations(2)), level, key=f"concurrency_mixed_c{level}"
+            )
+            await self.run_scenario(
+                Scenario("writes", "PUT /api/tasks/{task_id}", writes, self.iterations()),
+                level, key=f"concurrency_writes_c{level}"
+            )
+            await self.run_scenario(
+                Scenario("creates", "POST /api/tasks", creates, self.iterations(), expected_status=201),
+                level, key=f"concurrency_creates_c{level}"
+            )
+
+    # ---------- SSE 扇出 ----------
+
+    async def sse_fanout(self) -> dict:
+        """
+        直接以 ASGI 调用打开 N 个 /api/events 连接（httpx.ASGITransport 会缓冲整个响应体，无法读流），
+        每轮更新一次任务，测量各连接收到对应事件的延迟
+        """
+        app = self.main.app
+        subscribers = self.args.sse_subscribers
+        rounds = max(1, self.iterations(0.1))
+        disconnect = asyncio.Event()
+        queues: List[asyncio.Queue] = []
+        streams = []
+
+        for _ in range(subscribers):
+            queue: asyncio.Queue = asyncio.Queue()
+
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message, queue=queue):
+                if message["type"] == "http.response.body" and message.get("body"):
+                    queue.put_nowait((time.perf_counter(), message["body"]))
+
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": "/api/events",
+                "raw_path": b"/api/events",
+                "root_path": "",
+                "query_string": f"project_id={self.project_id}".encode(),
+                "headers": [(b"host", b"benchmark")],
+                "client": ("127.0.0.1", 0),
+                "server": ("benchmark", 80),
+            }
+            streams.append(asyncio.create_task(app(scope, receive, send)))
+            queues.append(queue)
+
+        # 等待每个连接输出首条 retry 指令，确认已订阅
+        for queue in queues:
+            await asyncio.wait_for(queue.get(), 10)
+
+        latencies: List[float] = []
+        last_delivery: List[float] = []
+        task_id = self.task_ids[0]
+        try:
+            for index in range(rounds):
+                start = time.perf_counter()
+                response = await self.client.put(
+                    f"/api/tasks/{task_id}", json={"title": f"推送测试 {index}"}
+                )
+                response.raise_for_status()
+                arrivals = []
+                for queue in queues:
+                    while True:
+                        arrived, body = await asyncio.wait_for(queue.get(), 10)
+                        if body.startswith(b"data:"):
+                            break
+                    arrivals.append(arrived - start)
+                latencies.extend(arrivals)
+                last_delivery.append(max(arrivals))
+        finally:
+            disconnect.set()
+            await asyncio.wait(streams, timeout=5)
+            for stream in streams:
+                stream.cancel()
+        self.covered_routes.add("GET /api/events")
+
+        result = {
+            "route": "GET /api/events",
+            "subscribers": subscribers,
+            "rounds": rounds,
+            "delivery_ms": latency_summary(latencies),
+            "last_delivery_ms": latency_summary(last_delivery),
+        }
+        print(
+            f"  {'sse_fanout':<44} {subscribers} 订阅者"
+            f"  p50 {result['delivery_ms']['p50']:>8.2f} ms  最后送达 p99 {result['last_delivery_ms']['p99']:>8.2f} ms",
+            flush=True
+        )
+        return result
+
+    # ---------- 组件 ----------
+
+    def component_benchmarks(self) -> dict:
+        from sqlalchemy import select
+
+        import models
+        import schemas
+        import serialization
+        from database import SessionLocal
+        from graph_index import dependency_graph
+        from pydantic import TypeAdapter
+
+        results = {}
+        repeat = self.args.repeat
+
+        # 循环检测：被拒绝（链尾可达链首）与接受（遍历链尾的全部前置任务后确认不可达）
+        with SessionLocal() as db:
+            dependency_graph.ensure_loaded(db)
+            rows = db.execute(select(*models.TASK_COLUMNS)).all()
+        checks = max(10, self.iterations(0.5))
+        for name, target in (("cycle_check_rejected", self.chain_head), ("cycle_check_accepted", -1)):
+            durations = timed(lambda: dependency_graph.has_path(self.chain_tail, target), checks)
+            results[name] = {"calls": checks, "chain_length": self.chain_length, "latency_ms": latency_summary(durations)}
+
+        # 行序列化：orjson 快速路径、标准库 json、Pydantic response_model 路径
+        adapter = TypeAdapter(List[schemas.TaskResponse])
+        encoders = {
+            "fast": lambda: serialization.dumps(serialization.task_dicts(rows)),
+            "stdlib_json": lambda: json.dumps(
+                serialization.task_dicts(rows), ensure_ascii=False, default=str
+            ).encode(),
+            "pydantic": lambda: adapter.dump_json(adapter.validate_python(serialization.task_dicts(rows))),
+        }
+        serialization_result = {"rows": len(rows), "orjson": serialization.orjson is not None}
+        for name, encode in encoders.items():
+            durations = sorted(timed(encode, repeat))
+            median = percentile(durations, 50)
+            serialization_result[name] = {
+                "median_ms": round(median * 1000, 3),
+                "rows_per_s": round(len(rows) / median) if median else 0,
+            }
+        results["serialization"] = serialization_result
+        return results
+
+    async def payload_benchmarks(self) -> dict:
+        """任务最多的项目：JSON 与紧凑格式的原始 / gzip 体积和解析耗时"""
+        base = f"/api/tasks/with-dependencies?project_id={self.project_id}"
+        identity = {"Accept-Encoding": "identity"}
+        result = {"project_id": self.project_id}
+        for name, url in (("json", base), ("compact", base + "&format=compact")):
+            response = await self.client.get(url, headers=identity)
+            response.raise_for_status()
+            body = response.content
+            if name == "json":
+                decode = lambda: json.loads(body)
+            else:
+                decode = lambda: decode_compact(json.loads(body))
+            durations = sorted(timed(decode, self.args.repeat))
+            result[name] = {
+                "bytes": len(body),
+                "gzip_bytes": len(gzip.compress(body, compresslevel=6)),
+                "decode_median_ms": round(percentile(durations, 50) * 1000, 3),
+            }
+        return result
+
+    def uncovered_routes(self) -> List[str]:
+        from fastapi.routing import APIRoute
+
+        routes = {
+            f"{method} {route.path}"
+            for route in self.main.app.routes if isinstance(route, APIRoute)
+            for method in route.methods
+        }
+        return sorted(routes - self.covered_routes)
+
+
+def decode_compact(data: dict) -> List[dict]:
+    """与 static/js/api.js 的 decodeCompactTasks 相同的还原过程（用于估算解析成本）"""
+    count = data["count"]
+    ids = data["columns"]["id"]
+    tasks = [{"id": task_id, "dependencies": [], "dependents": []} for task_id in ids]
+    by_id = {task["id"]: task for task in tasks}
+    for name, values in data["columns"].items():
+        if name == "id":
+            continue
+        for index in range(count):
+            tasks[index][name] = values[index]
+    for task_id, depends_on_id in zip(data["edges"]["task_id"], data["edges"]["depends_on_id"]):
+        task = by_id.get(task_id)
+        prerequisite = by_id.get(depends_on_id)
+        if task is not None:
+            task["dependencies"].append(depends_on_id)
+        if prerequisite is not None:
+            prerequisite["dependents"].append(task_id)
+    return tasks
+
+
+def print_components(components: dict) -> None:
+    for name in ("cycle_check_rejected", "cycle_check_accepted"):
+        print(f"  {name:<44} p50 {components[name]['latency_ms']['p50']:>8.3f} ms"
+              f"（依赖链长度 {components[name]['chain_length']}）")
+    serialization = components["serialization"]
+    for name in ("fast", "stdlib_json", "pydantic"):
+        print(f"  {'serialization_' + name:<44} {serialization[name]['rows_per_s']:>9} 行/s"
+              f"  {serialization[name]['median_ms']:>8.2f} ms / {serialization['rows']} 行")
+    payload = components["payload"]
+    for name in ("json", "compact"):
+        print(f"  {'payload_' + name:<44} {payload[name]['bytes']:>9} 字节（gzip {payload[name]['gzip_bytes']}）"
+              f"  解析 {payload[name]['decode_median_ms']:>7.2f} ms")
+
+
+# ==================== 运行 ====================
+
+def git_revision() -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def prepare_database(args: argparse.Namespace, workdir: str) -> dict:
+    path = os.path.join(workdir, "benchmark.db")
+    if args.db:
+        shutil.copyfile(args.db, path)
+        return {"source": os.path.abspath(args.db), "size_bytes": os.path.getsize(path)}
+    summary = generate.generate_from_args(path, args)
+    summary["source"] = "generated"
+    return summary
+
+
+async def run_benchmark(args: argparse.Namespace, dataset: dict) -> dict:
+    import httpx
+
+    import main
+
+    # 应用抛出的异常（连接池超时、database is locked 等）按 500 计入错误数，不中断压测
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        benchmark = Benchmark(main, client, args)
+        await benchmark.discover()
+        print(f"压测目标：{json.dumps(benchmark.describe_targets(), ensure_ascii=False)}", flush=True)
+
+        groups = set(args.only) if args.only else {
+            "read", "write", "concurrency", "sse", "components", "transfer", "jobs", "archive"
+        }
+        extra = {}
+        if "read" in groups:
+            print("读接口：", flush=True)
+            await benchmark.read_scenarios()
+        if "write" in groups:
+            print("写接口：", flush=True)
+            await benchmark.write_scenarios()
+        if "concurrency" in groups:
+            print("并发：", flush=True)
+            await benchmark.concurrency_scenarios()
+        if "sse" in groups:
+            print("SSE 推送：", flush=True)
+            extra["sse_fanout"] = await benchmark.sse_fanout()
+        if "components" in groups:
+            print("组件：", flush=True)
+            components = benchmark.component_benchmarks()
+            components["payload"] = await benchmark.payload_benchmarks()
+            extra["components"] = components
+            print_components(components)
+        if "transfer" in groups:
+            print("导出与导入：", flush=True)
+            extra["transfer"] = await benchmark.transfer_scenarios()
+        if "jobs" in groups:
+            print("后台作业：", flush=True)
+            extra["jobs"] = await benchmark.job_scenarios()
+        if "archive" in groups:
+            print("归档：", flush=True)
+            extra["archive"] = await benchmark.archive_scenarios()
+
+        uncovered = benchmark.uncovered_routes()
+        if uncovered and not args.only:
+            print(f"未覆盖的路由：{', '.join(uncovered)}", flush=True)
+
+        with main.SessionLocal() as db:
+            counts = {
+                "projects": db.query(main.models.Project).count(),
+                "tasks": db.query(main.models.Task).count(),
+                "dependencies": db.query(main.models.Dependency).count(),
+                "archived_tasks": db.query(main.models.ArchivedTask).count(),
+            }
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "db_mode": os.environ.get("TASK_MANAGER_DB_MODE", "sync"),
+            "group_commit": main.write_queue.writer.stats() if main.write_queue.GROUP_COMMIT_ENABLED else None,
+            "env": {key: value for key, value in sorted(os.environ.items()) if key.startswith("TASK_MANAGER_")},
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "concurrency_levels": args.concurrency,
+            "dataset": dataset,
+            "dataset_after_run": counts,
+            "targets": benchmark.describe_targets(),
+            "uncovered_routes": uncovered,
+        },
+        "scenarios": benchmark.results,
+        **extra,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="在进程内压测全部接口，结果写入 JSON")
+    parser.add_argument("--output", default="benchmark-results.json", help="结果文件（默认 benchmark-results.json）")
+    parser.add_argument("--db", help="使用已有数据库的副本，而不是生成新数据")
+    parser.add_argument("--iterations", type=int, default=200, help="每个场景的基准请求数，重场景按比例减少（默认 200）")
+    parser.add_argument("--warmup", type=int, default=5, help="读场景计时前的预热请求数（默认 5）")
+    parser.add_argument("--repeat", type=int, default=5, help="组件基准的重复次数（默认 5）")
+    parser.add_argument(
+        "--concurrency", type=lambda value: [int(level) for level in value.split(",")], default=[1, 8, 32],
+        help="并发场景的并发度，逗号分隔（默认 1,8,32）"
+    )
+    parser.add_argument("--batch-size", type=int, default=500, help="批量导入场景每批创建的任务数（默认 500）")
+    parser.add_argument(
+        "--cycle-chain-lengths", type=lambda value: [int(length) for length in value.split(",")],
+        default=[100, 1000, 10000], help="循环检测场景的依赖链长度，逗号分隔（默认 100,1000,10000）"
+    )
+    parser.add_argument("--sse-subscribers", type=int, default=100, help="SSE 扇出场景的连接数（默认 100）")
+    parser.add_argument(
+        "--only", action="append", choices=("read", "write", "concurrency", "sse", "components", "transfer", "jobs", "archive"),
+        help="只运行指定的场景组（可重复）"
+    )
+    parser.add_argument("--db-mode", choices=("sync", "async"), help="覆盖 TASK_MANAGER_DB_MODE")
+    parser.add_argument(
+        "--group-commit", choices=("on", "off"), help="覆盖 TASK_MANAGER_GROUP_COMMIT（写接口经单写入线程组提交）"
+    )
+    parser.add_argument("--keep-db", action="store_true", help="保留压测使用的数据库副本")
+    generate.add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="task-manager-bench-")
+    try:
+        # database 模块在导入时读取这些环境变量，必须在生成数据和导入应用之前设置
+        os.environ["TASK_MANAGER_DB_PATH"] = os.path.join(workdir, "benchmark.db")
+        if args.db_mode:
+            os.environ["TASK_MANAGER_DB_MODE"] = args.db_mode
+        if args.group_commit:
+            os.environ["TASK_MANAGER_GROUP_COMMIT"] = "1" if args.group_commit == "on" else "0"
+        dataset = prepare_database(args, workdir)
+        results = asyncio.run(run_benchmark(args, dataset))
+    finally:
+        if args.keep_db:
+            print(f"数据库副本：{os.path.join(workdir, 'benchmark.db')}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+多进程部署的缓存同步（TASK_MANAGER_WORKERS > 1 或 TASK_MANAGER_CACHE_SYNC=1）
+
+多个工作进程（uvicorn --workers / gunicorn）共享同一个 tasks.db 时，每个进程各有一份
+内存结构：依赖索引、布局缓存、响应缓存和 SSE 订阅者。写接口只更新本进程的这些结构，
+其他进程需要发现这次写入并刷新受影响的部分：
+
+1. 变化检测：专用连接上的 PRAGMA data_version 在其他连接提交后才会变化，
+   未变化时一次检查只需几微秒，不查询任何表
+2. 增量刷新：变化后读取本进程同步水位之后的 changes 记录，按记录涉及的项目失效
+   响应缓存和布局缓存，按依赖边的增删更新依赖索引，并向本进程的 SSE 订阅者推送
+3. 无法增量时（水位早于变更日志压缩水位，或积压超过 TASK_MANAGER_CACHE_SYNC_MAX_CHANGES 条）
+   清空全部缓存、丢弃依赖索引，并通知所有订阅者 resync
+
+同步的时机：
+- 每个请求开始前检查一次（CacheSyncMiddleware），客户端在一个进程写入后到另一个进程读取，
+  总能读到这次写入
+- 后台线程每 TASK_MANAGER_CACHE_SYNC_INTERVAL_MS 检查一次，SSE 推送和空闲进程的缓存不依赖请求
+- 循环依赖检测不依赖这里的同步：检测前取得写锁，依赖索引自行重放之后已提交的依赖修改
+
+本进程自己的写入也会出现在 changes 中，重放是幂等的：依赖边的增删按修订号顺序执行，
+同步期间持有依赖索引的锁，本进程提交后回调对索引的修改排在同步读到的快照之后。
+本进程已推送过的事件不再重复推送。
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import anyio
+from sqlalchemy.orm import Session
+
+import models
+import change_log
+from database import DB_PATH, SessionLocal
+from event_bus import broker
+from graph_index import dependency_graph
+from graph_layout import layout_cache
+from response_cache import response_cache
+
+# python main.py 启动的工作进程数
+WORKERS = max(1, int(os.environ.get("TASK_MANAGER_WORKERS", "1")))
+# 默认在多个工作进程时开启；由 gunicorn 等外部进程管理器启动时需显式设置为 1
+CACHE_SYNC_ENABLED = os.environ.get(
+    "TASK_MANAGER_CACHE_SYNC", "1" if WORKERS > 1 else "0"
+).lower() in ("1", "true", "yes", "on")
+# 后台检查间隔（毫秒），即其他进程的写入推送给本进程 SSE 订阅者的最大延迟
+CACHE_SYNC_INTERVAL = float(os.environ.get("TASK_MANAGER_CACHE_SYNC_INTERVAL_MS", "100")) / 1000
+# 一次同步最多增量处理的变更记录数，超过时整体失效
+CACHE_SYNC_MAX_CHANGES = int(os.environ.get("TASK_MANAGER_CACHE_SYNC_MAX_CHANGES", "5000"))
+
+# 启动时建表、迁移和重建计数表的进程间互斥锁文件
+STARTUP_LOCK_PATH = DB_PATH.with_name(DB_PATH.name + "-startup.lock")
+
+
+@contextmanager
+def startup_lock(timeout: float = 600):
+    """
+    串行化多个工作进程的启动初始化（建表、迁移、重建计数表）
+    在独立的锁文件上持有 SQLite 排他事务，不占用 tasks.db 的写锁，迁移仍可分批提交
+    """
+    conn = sqlite3.connect(STARTUP_LOCK_PATH, timeout=timeout, isolation_level=None)
+    try:
+        conn.execute("BEGIN EXCLUSIVE")
+        try:
+            yield
+        finally:
+            conn.execute("ROLLBACK")
+    finally:
+        conn.close()
+
+
+class CacheSync:
+    """检测其他连接的提交，把 changes 中的新记录应用到本进程的内存结构"""
+
+    def __init__(self, max_changes: int = CACHE_SYNC_MAX_CHANGES):
+        self.max_changes = max_changes
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # 已同步的 data_version 与修订号
+        self._data_version: Optional[int] = None
+        self.revision = 0
+        self.syncs = 0
+        self.applied_changes = 0
+        self.full_resets = 0
+        self.last_sync_at: Optional[float] = None
+
+    def start(self, interval: float = CACHE_SYNC_INTERVAL) -> None:
+        """从当前修订号开始同步，并启动后台检查线程（interval 为 0 时只在请求时检查）"""
+        broker.track_local = True
+        with self._sync_lock:
+            self._data_version = self._read_data_version()
+            with SessionLocal() as db:
+                self.revision = change_log.current_revision(db)
+        if interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="cache-sync", daemon=True)
+            self._thread.start()
+
+    def _read_data_version(self) -> int:
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+            return self._probe.execute("PRAGMA data_version").fetchone()[0]
+
+    def stale(self) -> bool:
+        """上次同步之后数据库是否有其他连接提交（可在事件循环中调用）"""
+        return self._data_version is not None and self._read_data_version() != self._data_version
+
+    def sync(self) -> int:
+        """数据库有新提交时应用新的变更记录，返回应用的记录数"""
+        if self._data_version is None:
+            return 0
+        with self._sync_lock:
+            data_version = self._read_data_version()
+            if data_version == self._data_version:
+                return 0
+            # 先持有依赖索引的锁再开始读：已执行的提交后回调都在快照之内，之后的排在重放之后
+            with dependency_graph.lock, SessionLocal() as db:
+                applied = self._apply(db)
+            self._data_version = data_version
+            self.syncs += 1
+            self.last_sync_at = time.time()
+            return applied
+
+    def _apply(self, db: Session) -> int:
+        if self.revision < change_log.compacted_revision(db):
+            return self._reset(db)
+
+        rows = (
+            db.query(
+                models.Change.revision,
+                models.Change.entity,
+                models.Change.op,
+                models.Change.entity_id,
+                models.Change.project_id,
+                models.Change.task_id,
+                models.Change.depends_on_id,
+            )
+            .filter(models.Change.revision > self.revision)
+            .order_by(models.Change.revision)
+            .limit(self.max_changes + 1)
+            .all()
+        )
+        if not rows:
+            return 0
+        if len(rows) > self.max_changes:
+            return self._reset(db)
+
+        latest: Dict[Optional[int], int] = {}
+        for row in rows:
+            dependency_graph.apply_change(row.entity, row.op, row.entity_id, row.task_id, row.depends_on_id)
+            latest[row.project_id] = row.revision
+
+        projects = [project_id for project_id in latest if project_id is not None]
+        response_cache.invalidate(*projects)
+        layout_cache.invalidate(*projects)
+
+        self.revision = rows[-1].revision
+        # 每个项目推送一条事件，携带该项目最新的修订号；本进程已推送过的跳过
+        local = broker.pop_local(self.revision)
+        broker.publish([
+            {"revision": revision, "entity": "batch", "op": "applied", "project_id": project_id}
+            for project_id, revision in latest.items()
+            if revision not in local
+        ])
+        self.applied_changes += len(rows)
+        return len(rows)
+
+    def _reset(self, db: Session) -> int:
+        """增量不可用：整体失效，订阅者重新全量同步"""
+        response_cache.clear()
+        layout_cache.clear()
+        dependency_graph.invalidate()
+        self.revision = change_log.current_revision(db)
+        broker.pop_local(self.revision)
+        broker.resync()
+        self.full_resets += 1
+        return 0
+
+    def _run(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.sync()
+            except Exception:
+                # 数据库暂时不可读（如迁移重建表）时下次再试
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._data_version is not None,
+            "revision": self.revision,
+            "syncs": self.syncs,
+            "applied_changes": self.applied_changes,
+            "full_resets": self.full_resets,
+            "last_sync_at": self.last_sync_at,
+        }
+
+
+# 进程级共享实例；未调用 start() 时 stale() / sync() 不做任何事
+cache_sync = CacheSync()
+
+
+class CacheSyncMiddleware:
+    """每个请求开始前检查其他进程的写入，有新提交时在线程池中同步"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and cache_sync.stale():
+            await anyio.to_thread.run_sync(cache_sync.sync)
+        await self.app(scope, receive, send)
@@ -0,0 +1,197 @@
+"""
+变更日志
+
+所有写接口在同一事务内向 changes 表追加记录，revision（自增主键）即全局修订号。
+客户端记住上次同步的修订号，通过 GET /api/changes?since= 只拉取之后的增量。
+
+旧记录按保留条数定期压缩；客户端的 since 早于压缩水位时需要全量重新加载。
+"""
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, insert, or_
+from sqlalchemy.orm import Session
+
+import models
+from event_bus import queue_event
+
+# 保留最近多少条变更记录
+CHANGE_LOG_RETAIN = int(os.environ.get("TASK_MANAGER_CHANGE_LOG_RETAIN", "10000"))
+# 每写入多少条记录触发一次压缩
+CHANGE_LOG_COMPACT_EVERY = int(os.environ.get("TASK_MANAGER_CHANGE_LOG_COMPACT_EVERY", "1000"))
+
+COMPACTED_KEY = "changes.compacted_revision"
+
+# 使实体从默认视图中移除的操作
+REMOVAL_OPS = ("deleted", "archived")
+
+
+def record(
+    db: Session,
+    entity: str,
+    op: str,
+    entity_id: int,
+    project_ids: Iterable[Optional[int]],
+    task_id: Optional[int] = None,
+    depends_on_id: Optional[int] = None,
+) -> int:
+    """
+    追加变更记录（不提交，随调用方事务一起生效），返回新的修订号
+    同一变更涉及多个项目时（如跨项目依赖）每个项目记一行
+    事务提交后，每行记录作为一条事件推送给订阅者
+    """
+    changes = [
+        models.Change(
+            entity=entity,
+            op=op,
+            entity_id=entity_id,
+            project_id=project_id,
+            task_id=task_id,
+            depends_on_id=depends_on_id,
+        )
+        for project_id in dict.fromkeys(project_ids)
+    ]
+    db.add_all(changes)
+    db.flush()
+    for change in changes:
+        message = {
+            "revision": change.revision,
+            "entity": entity,
+            "op": op,
+            "id": entity_id,
+            "project_id": change.project_id,
+        }
+        if entity == "dependency":
+            message["task_id"] = task_id
+            message["depends_on_id"] = depends_on_id
+        queue_event(db, message)
+
+    first, revision = changes[0].revision, changes[-1].revision
+    _maybe_compact(db, first, revision)
+    return revision
+
+
+def record_many(db: Session, entries: Iterable[dict]) -> Optional[int]:
+    """
+    批量追加变更记录（批量操作使用），返回最后一条的修订号
+    entries 每项包含 entity, op, entity_id, project_ids，依赖变更另含 task_id, depends_on_id
+    每个涉及的项目只推送一条 batch 事件
+    """
+    rows = [
+        {
+            "entity": entry["entity"],
+            "op": entry["op"],
+            "entity_id": entry["entity_id"],
+            "project_id": project_id,
+            "task_id": entry.get("task_id"),
+            "depends_on_id": entry.get("depends_on_id"),
+        }
+        for entry in entries
+        for project_id in dict.fromkeys(entry["project_ids"])
+    ]
+    if not rows:
+        return None
+
+    # 不要求 RETURNING 按参数顺序返回：SQLite 上要求顺序时逐行执行，否则按多行 VALUES 分批插入
+    revisions = db.execute(
+        insert(models.Change.__table__).returning(models.Change.revision),
+        rows
+    ).scalars().all()
+    first, revision = min(revisions), max(revisions)
+
+    for project_id in dict.fromkeys(row["project_id"] for row in rows):
+        queue_event(db, {
+            "revision": revision,
+            "entity": "batch",
+            "op": "applied",
+            "project_id": project_id,
+        })
+
+    _maybe_compact(db, first, revision)
+    return revision
+
+
+def _maybe_compact(db: Session, first: int, revision: int) -> None:
+    """修订号跨过 CHANGE_LOG_COMPACT_EVERY 的整数倍时压缩一次"""
+    if CHANGE_LOG_COMPACT_EVERY <= 0:
+        return
+    if revision // CHANGE_LOG_COMPACT_EVERY > (first - 1) // CHANGE_LOG_COMPACT_EVERY:
+        compact(db, revision - CHANGE_LOG_RETAIN)
+
+
+def current_revision(db: Session) -> int:
+    """当前最新修订号"""
+    latest = db.query(func.max(models.Change.revision)).scalar()
+    return latest if latest is not None else compacted_revision(db)
+
+
+def compacted_revision(db: Session) -> int:
+    state = db.get(models.AppState, COMPACTED_KEY)
+    return state.value if state is not None else 0
+
+
+def compact(db: Session, through_revision: int) -> None:
+    """删除 revision <= through_revision 的记录，并推进压缩水位（不提交）"""
+    if through_revision <= compacted_revision(db):
+        return
+    db.query(models.Change).filter(models.Change.revision <= through_revision).delete()
+    state = db.get(models.AppState, COMPACTED_KEY)
+    if state is None:
+        db.add(models.AppState(key=COMPACTED_KEY, value=through_revision))
+        # 同一事务内再次压缩时 db.get 需要能查到这一行
+        db.flush()
+    else:
+        state.value = through_revision
+
+
+def collect(db: Session, since: int, project_id: Optional[int] = None) -> Dict:
+    """
+    汇总 since 之后的变更，同一实体只保留最后一次操作
+
+    返回:
+    - revision: 当前修订号
+    - full_reload: since 早于压缩水位，增量已不完整
+    - tasks / projects: {"upserted": set(id), "deleted": set(id)}
+    - dependencies: {"added": set((task_id, depends_on_id)), "removed": set(...)}
+    """
+    revision = current_revision(db)
+    result = {
+        "revision": revision,
+        "full_reload": since < compacted_revision(db),
+        "tasks": {"upserted": set(), "deleted": set()},
+        "projects": {"upserted": set(), "deleted": set()},
+        "dependencies": {"added": set(), "removed": set()},
+    }
+    if result["full_reload"]:
+        return result
+
+    query = db.query(
+        models.Change.entity,
+        models.Change.op,
+        models.Change.entity_id,
+        models.Change.task_id,
+        models.Change.depends_on_id,
+    ).filter(models.Change.revision > since, models.Change.revision <= revision)
+    if project_id is not None:
+        # 项目列表本身的变更始终下发，供侧边栏更新
+        query = query.filter(or_(
+            models.Change.project_id == project_id,
+            models.Change.entity == "project"
+        ))
+
+    latest: Dict[Tuple, str] = {}
+    for entity, op, entity_id, task_id, depends_on_id in query.order_by(models.Change.revision):
+        if entity == "dependency":
+            latest[(entity, (task_id, depends_on_id))] = op
+        else:
+            latest[(entity, entity_id)] = op
+
+    for (entity, key), op in latest.items():
+        # 归档对客户端等同于删除，恢复等同于新建
+        removed = op in REMOVAL_OPS
+        if entity == "dependency":
+            result["dependencies"]["removed" if removed else "added"].add(key)
+        else:
+            bucket = result["tasks" if entity == "task" else "projects"]
+            bucket["deleted" if removed else "upserted"].add(key)
+    return result
@@ -0,0 +1,148 @@
+"""
+响应压缩
+
+按请求的 Accept-Encoding 协商 br（需安装 brotli）或 gzip，压缩一次性返回的响应体。
+流式响应（SSE、NDJSON 导出）原样透传：压缩需要缓冲，会破坏逐条推送的实时性。
+
+压缩后的响应仍带强 ETag：在原 ETag 后加编码后缀（"<摘要>-gzip"、"<摘要>-br"），
+同一内容的每种编码各有一个 ETag，且压缩输出是确定的（gzip 头部不写入时间）。
+请求的 If-None-Match 带当前编码的后缀时先去掉后缀再交给接口比较，304 响应再加回后缀。
+可压缩类型的响应都带 Vary: Accept-Encoding。
+
+- TASK_MANAGER_COMPRESSION=0 关闭压缩
+- TASK_MANAGER_COMPRESS_MIN_SIZE 小于该字节数的响应不压缩（默认 1024）
+"""
+import gzip
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+COMPRESSION_ENABLED = os.environ.get("TASK_MANAGER_COMPRESSION", "1").lower() not in ("0", "false", "no", "off")
+MINIMUM_SIZE = int(os.environ.get("TASK_MANAGER_COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/",
+)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """从 Accept-Encoding 中选出可用的编码，优先 br"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """按编码区分的强 ETag；弱 ETag 原样返回"""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoding(if_none_match: str, encoding: str) -> str:
+    """去掉 If-None-Match 中各 ETag 的当前编码后缀，接口按原 ETag 比较"""
+    return if_none_match.replace(f'-{encoding}"', '"')
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding", ""))
+        # 客户端用压缩响应的 ETag 验证时，接口看到的是原 ETag，304 响应需加回后缀
+        revalidating = False
+        if_none_match = request_headers.get("if-none-match")
+        if encoding is not None and if_none_match and f'-{encoding}"' in if_none_match:
+            revalidating = True
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value) for name, value in scope["headers"] if name != b"if-none-match"
+            ] + [(b"if-none-match", strip_encoding(if_none_match, encoding).encode("latin-1"))]
+
+        start_message: Optional[Message] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # 等到第一段响应体再决定是否压缩
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            streaming = message.get("more_body", False)
+            if start["status"] == 304:
+                # 与对应的 200 响应带相同的 ETag 和 Vary
+                etag = headers.get("etag")
+                if revalidating and etag:
+                    headers["ETag"] = encoded_etag(etag, encoding)
+                headers.add_vary_header("Accept-Encoding")
+                await send(start)
+                await send(message)
+                return
+            if not streaming and content_type.startswith(COMPRESSIBLE_TYPES):
+                # 响应内容随 Accept-Encoding 变化（包括未压缩的小响应），共享缓存需按它区分
+                headers.add_vary_header("Accept-Encoding")
+            if (
+                encoding is None
+                or streaming
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            etag = headers.get("etag")
+            if etag:
+                headers["ETag"] = encoded_etag(etag, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,19 +1,85 @@
 import os
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 # 获取项目根目录（database.py 所在目录）
 PROJECT_ROOT = Path(__file__).parent.resolve()
-DB_PATH = PROJECT_ROOT / "tasks.db"
+# 可通过环境变量指定数据库文件，默认在项目目录下
+DB_PATH = Path(os.environ.get("TASK_MANAGER_DB_PATH", PROJECT_ROOT / "tasks.db")).resolve()
 
 # 使用绝对路径，确保数据库文件始终在项目目录下
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
+# ==================== SQLite 存储配置 ====================
+# 通过 TASK_MANAGER_STORAGE_PROFILE 选择预设，单项可用 TASK_MANAGER_SQLITE_<PRAGMA> 覆盖
+
+STORAGE_PROFILES = {
+    # SQLite 默认行为（回滚日志、FULL 同步），用于对比或排查问题
+    "legacy": {},
+    # WAL：读写互不阻塞；NORMAL 同步在 WAL 下不会损坏数据库，仅断电时可能丢失最后的事务
+    "default": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,        # 64 MB 页缓存（负数单位为 KB）
+        "mmap_size": 268435456,      # 256 MB 内存映射读
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,        # 写锁等待 5 秒，而不是立即报 database is locked
+    },
+    # 最大耐久性：WAL + FULL 同步
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+
+def load_storage_profile() -> dict:
+    name = os.environ.get("TASK_MANAGER_STORAGE_PROFILE", "default")
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"未知的存储配置：{name}（可选：{', '.join(STORAGE_PROFILES)}）")
+    pragmas = dict(STORAGE_PROFILES[name])
+    for pragma in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout"):
+        value = os.environ.get(f"TASK_MANAGER_SQLITE_{pragma.upper()}")
+        if value is not None:
+            pragmas[pragma] = value
+    return pragmas
+
+
+SQLITE_PRAGMAS = load_storage_profile()
+
+# 数据库访问模式：sync（同步会话，接口运行在线程池中）或 async（aiosqlite 异步会话）
+DB_MODE = os.environ.get("TASK_MANAGER_DB_MODE", "sync")
+if DB_MODE not in ("sync", "async"):
+    raise ValueError(f"未知的数据库访问模式：{DB_MODE}（可选：sync, async）")
+
+# 连接池：WAL 下多个读连接可并发，写入仍由 SQLite 串行化
+# 上限（pool_size + max_overflow）需大于线程池大小（Starlette 默认 40），否则高并发时取连接超时
+POOL_SIZE = int(os.environ.get("TASK_MANAGER_DB_POOL_SIZE", "20"))
+POOL_MAX_OVERFLOW = int(os.environ.get("TASK_MANAGER_DB_MAX_OVERFLOW", "40"))
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
 )
+
+
+@event.listens_for(engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新连接建立时应用存储配置"""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -25,3 +91,33 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def acquire_write_lock(db: Session) -> None:
+    """
+    让当前事务立即取得数据库写锁（不修改任何行），持有到提交或回滚
+    之后其他连接无法提交，本事务接下来看到的数据就是写入时的数据
+    """
+    db.execute(text("UPDATE app_state SET value = value WHERE 0"))
+
+
+# ==================== 提交后回调 ====================
+
+def after_commit(db: Session, callback, *args) -> None:
+    """登记事务提交后执行的回调（更新内存索引、失效缓存等），事务回滚则丢弃"""
+    db.info.setdefault("after_commit", []).append((callback, args))
+
+
+# 保存点（组提交中单个操作）的释放和回滚也会触发这两个事件，只处理最外层事务
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    for callback, args in session.info.pop("after_commit", ()):
+        callback(*args)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("after_commit", None)
@@ -0,0 +1,174 @@
+"""
+实时变更推送
+
+写接口提交事务后，把简短的变更事件广播给订阅了对应项目的客户端（Server-Sent Events）。
+事件只携带修订号和实体标识，客户端收到后通过 /api/changes 增量同步。
+
+- 写接口运行在线程池中，通过 loop.call_soon_threadsafe 把一次发布投递到事件循环，
+  再在事件循环内分发给所有订阅者，发布开销与订阅者数量无关
+- 每个订阅者一个有界队列，消费过慢时丢弃积压事件并发送 resync，让客户端自行补齐
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# 每个订阅者最多积压的事件数
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("TASK_MANAGER_EVENT_QUEUE_SIZE", "256"))
+# 空闲时发送心跳注释的间隔（秒），防止代理断开连接
+HEARTBEAT_INTERVAL = float(os.environ.get("TASK_MANAGER_EVENT_HEARTBEAT", "15"))
+
+RESYNC = {"type": "resync"}
+
+
+class Subscriber:
+    __slots__ = ("project_id", "queue")
+
+    def __init__(self, project_id: Optional[int]):
+        self.project_id = project_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, message: dict) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # 积压过多：清空队列，只保留一条 resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class EventBroker:
+    """按项目分组的订阅者注册表"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # project_id -> 订阅者集合；None 表示订阅全部项目
+        self._subscribers: Dict[Optional[int], Set[Subscriber]] = {}
+        self._lock = threading.Lock()
+        # 跨进程缓存同步开启时记录本进程提交后推送过的修订号，同步时不再重复推送（见 cache_sync.py）
+        self.track_local = False
+        self._local_revisions: Set[int] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(group) for group in self._subscribers.values())
+
+    def subscribe(self, project_id: Optional[int]) -> Subscriber:
+        """在事件循环内调用"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(project_id)
+        with self._lock:
+            self._subscribers.setdefault(project_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            group = self._subscribers.get(subscriber.project_id)
+            if group is not None:
+                group.discard(subscriber)
+                if not group:
+                    del self._subscribers[subscriber.project_id]
+
+    def publish(self, messages: Iterable[dict]) -> None:
+        """可在任意线程调用"""
+        messages = list(messages)
+        loop = self._loop
+        if not messages or loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(messages)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, messages)
+
+    def mark_local(self, messages: Iterable[dict]) -> None:
+        with self._lock:
+            self._local_revisions.update(message["revision"] for message in messages)
+
+    def pop_local(self, through_revision: int) -> Set[int]:
+        """取出并移除不大于 through_revision 的本进程修订号"""
+        with self._lock:
+            popped = {revision for revision in self._local_revisions if revision <= through_revision}
+            self._local_revisions -= popped
+            return popped
+
+    def resync(self) -> None:
+        """通知全部订阅者重新全量同步（可在任意线程调用）"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch_all, RESYNC)
+
+    def _dispatch_all(self, message: dict) -> None:
+        with self._lock:
+            subscribers = [subscriber for group in self._subscribers.values() for subscriber in group]
+        for subscriber in subscribers:
+            subscriber.offer(message)
+
+    def _dispatch(self, messages) -> None:
+        with self._lock:
+            subscribers = {
+                project_id: list(group) for project_id, group in self._subscribers.items()
+            }
+        everyone = subscribers.get(None, [])
+        for message in messages:
+            for subscriber in everyone:
+                subscriber.offer(message)
+            project_id = message.get("project_id")
+            if project_id is not None:
+                for subscriber in subscribers.get(project_id, []):
+                    subscriber.offer(message)
+
+    async def stream(self, subscriber: Subscriber, is_disconnected):
+        """SSE 数据流：逐条输出事件，空闲时输出心跳"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(message, separators=(',', ':'))}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+# 进程级共享实例
+broker = EventBroker()
+
+
+# ==================== 与数据库会话挂钩 ====================
+
+def queue_event(db: Session, message: dict) -> None:
+    """登记待发布事件，事务提交后才会广播；回滚则丢弃"""
+    db.info.setdefault("pending_events", []).append(message)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    # 保存点释放时不发布，等最外层事务提交
+    if session.in_nested_transaction():
+        return
+    messages = session.info.pop("pending_events", None)
+    if messages:
+        if broker.track_local:
+            broker.mark_local(messages)
+        broker.publish(messages)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("pending_events", None)
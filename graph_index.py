@@ -0,0 +1,352 @@
+"""
+依赖关系图的进程内索引
+
+从 dependencies 表一次性加载正向、反向邻接表，之后由写接口增量维护，
+循环依赖检测等可达性查询全部在内存中迭代完成，不再逐节点查询数据库。
+
+索引记录自己已包含的 changes 修订号。写事务做循环检测前先取得数据库写锁，
+再重放该修订号之后其他连接提交的依赖修改（其他进程的写入、本进程尚未执行的提交后回调），
+检测所用的图与本事务提交时的数据一致。
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+import change_log
+from database import SessionLocal, acquire_write_lock, after_commit
+
+
+class GraphOverlay:
+    """
+    叠加在索引之上的未提交修改（批量操作、组提交校验时使用）
+
+    - added: 新增的边 task_id -> {depends_on_id}
+    - removed: 删除的边 {(task_id, depends_on_id)}
+    - removed_nodes: 删除的任务
+    - base: 下层叠加层（组提交时，批量操作的叠加层位于同组已执行操作的叠加层之上）
+    """
+
+    def __init__(self, base: Optional["GraphOverlay"] = None):
+        self.added: Dict[int, Set[int]] = defaultdict(set)
+        self.removed: Set[Tuple[int, int]] = set()
+        self.removed_nodes: Set[int] = set()
+        self.base = base
+
+    def copy(self) -> "GraphOverlay":
+        overlay = GraphOverlay(self.base)
+        for task_id, targets in self.added.items():
+            overlay.added[task_id] = set(targets)
+        overlay.removed = set(self.removed)
+        overlay.removed_nodes = set(self.removed_nodes)
+        return overlay
+
+    def add_edge(self, task_id: int, depends_on_id: int) -> None:
+        self.removed.discard((task_id, depends_on_id))
+        self.added[task_id].add(depends_on_id)
+
+    def remove_edge(self, task_id: int, depends_on_id: int) -> None:
+        self.added.get(task_id, set()).discard(depends_on_id)
+        self.removed.add((task_id, depends_on_id))
+
+
+class DependencyGraph:
+    """
+    依赖关系邻接索引
+
+    - forward[task_id]: task_id 依赖的任务集合（task_id -> depends_on_id）
+    - reverse[task_id]: 依赖 task_id 的任务集合（depends_on_id -> task_id）
+    """
+
+    def __init__(self):
+        self._forward: Dict[int, Set[int]] = defaultdict(set)
+        self._reverse: Dict[int, Set[int]] = defaultdict(set)
+        self._lock = threading.RLock()
+        self._loaded = False
+        # 索引已包含的 changes 修订号（不早于实际包含的修改，之后的修改重放是幂等的）
+        self.revision = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def lock(self) -> threading.RLock:
+        """索引的可重入锁：持有期间其他线程不能修改或查询索引（跨进程同步时使用）"""
+        return self._lock
+
+    def load(self, db: Session) -> None:
+        """从 dependencies 表（重新）加载全部边"""
+        # 先读已提交的修订号再读边：期间提交的修改之后会被重放
+        with SessionLocal() as state:
+            revision = change_log.current_revision(state)
+        rows = db.query(models.Dependency.task_id, models.Dependency.depends_on_id).all()
+        with self._lock:
+            self._forward = defaultdict(set)
+            self._reverse = defaultdict(set)
+            for task_id, depends_on_id in rows:
+                self._forward[task_id].add(depends_on_id)
+                self._reverse[depends_on_id].add(task_id)
+            self.revision = revision
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session) -> None:
+        """首次使用时加载索引"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load(db)
+
+    def invalidate(self) -> None:
+        """丢弃索引，下次使用时重新加载"""
+        with self._lock:
+            self._loaded = False
+
+    # ==================== 增量维护 ====================
+
+    def add_edge(self, task_id: int, depends_on_id: int) -> None:
+        """记录“task_id 依赖 depends_on_id”"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._forward[task_id].add(depends_on_id)
+            self._reverse[depends_on_id].add(task_id)
+
+    def remove_edge(self, task_id: int, depends_on_id: int) -> None:
+        """移除“task_id 依赖 depends_on_id”"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._discard(task_id, depends_on_id)
+
+    def remove_task(self, task_id: int) -> None:
+        """移除任务及其所有出入边"""
+        with self._lock:
+            if not self._loaded:
+                return
+            for depends_on_id in list(self._forward.get(task_id, ())):
+                self._discard(task_id, depends_on_id)
+            for dependent_id in list(self._reverse.get(task_id, ())):
+                self._discard(dependent_id, task_id)
+
+    def apply_change(self, entity: str, op: str, entity_id: int, task_id: Optional[int], depends_on_id: Optional[int]) -> None:
+        """按一条 changes 记录修改索引（依赖边的增删、任务的删除或归档），重复执行是幂等的"""
+        removed = op in change_log.REMOVAL_OPS
+        if entity == "dependency":
+            if removed:
+                self.remove_edge(task_id, depends_on_id)
+            else:
+                self.add_edge(task_id, depends_on_id)
+        elif entity == "task" and removed:
+            self.remove_task(entity_id)
+
+    def catch_up(self) -> int:
+        """
+        重放索引修订号之后已提交的依赖修改，返回重放的记录数（未加载时加载）
+        在独立会话中读取，只看到已提交的数据；调用方事务中未提交的修改不会进入索引
+        """
+        with self._lock, SessionLocal() as db:
+            if not self._loaded or self.revision < change_log.compacted_revision(db):
+                self.load(db)
+                return 0
+            revision = change_log.current_revision(db)
+            if revision <= self.revision:
+                return 0
+            change = models.Change
+            rows = db.query(
+                change.entity, change.op, change.entity_id, change.task_id, change.depends_on_id
+            ).filter(
+                change.revision > self.revision,
+                change.revision <= revision,
+                change.entity.in_(("dependency", "task")),
+            ).order_by(change.revision).all()
+            for row in rows:
+                self.apply_change(*row)
+            self.revision = revision
+            return len(rows)
+
+    def _discard(self, task_id: int, depends_on_id: int) -> None:
+        targets = self._forward.get(task_id)
+        if targets is not None:
+            targets.discard(depends_on_id)
+            if not targets:
+                del self._forward[task_id]
+        sources = self._reverse.get(depends_on_id)
+        if sources is not None:
+            sources.discard(task_id)
+            if not sources:
+                del self._reverse[depends_on_id]
+
+    # ==================== 查询 ====================
+
+    def dependencies_of(self, task_id: int) -> Set[int]:
+        with self._lock:
+            return set(self._forward.get(task_id, ()))
+
+    def has_edge(self, task_id: int, depends_on_id: int, overlay: Optional[GraphOverlay] = None) -> bool:
+        with self._lock:
+            return depends_on_id in self._neighbors(task_id, overlay)
+
+    def edges_of(self, task_id: int, overlay: Optional[GraphOverlay] = None) -> List[Tuple[int, int]]:
+        """任务的全部出边和入边（叠加 overlay 后）"""
+        with self._lock:
+            return (
+                [(task_id, depends_on_id) for depends_on_id in self._neighbors(task_id, overlay)]
+                + [(dependent_id, task_id) for dependent_id in self._dependents(task_id, overlay)]
+            )
+
+    def dependents_of(self, task_id: int) -> Set[int]:
+        with self._lock:
+            return set(self._reverse.get(task_id, ()))
+
+    def has_path(self, start_id: int, target_id: int, overlay: Optional[GraphOverlay] = None) -> bool:
+        """
+        沿正向边（依赖方向）判断 start_id 能否到达 target_id
+        使用显式栈迭代，避免深链触发递归深度限制
+        提供 overlay 时在索引叠加未提交修改后的图上判断
+        """
+        with self._lock:
+            if start_id == target_id:
+                return True
+            visited = {start_id}
+            stack = [start_id]
+            while stack:
+                current_id = stack.pop()
+                for next_id in self._neighbors(current_id, overlay):
+                    if next_id == target_id:
+                        return True
+                    if next_id not in visited:
+                        visited.add(next_id)
+                        stack.append(next_id)
+            return False
+
+    def find_cycle(self, start_ids: Iterable[int], overlay: Optional[GraphOverlay] = None) -> Optional[List[Tuple[int, int]]]:
+        """
+        从 start_ids 出发做一次迭代三色 DFS，检查（叠加 overlay 后的）图中是否有环
+        每个节点至多访问一次；发现环时返回环上的边列表，否则返回 None
+        """
+        GRAY, BLACK = 1, 2
+        color: Dict[int, int] = {}
+        with self._lock:
+            for start_id in start_ids:
+                if start_id in color:
+                    continue
+                color[start_id] = GRAY
+                path = [start_id]
+                stack = [iter(list(self._neighbors(start_id, overlay)))]
+                while stack:
+                    next_id = next(stack[-1], None)
+                    if next_id is None:
+                        stack.pop()
+                        color[path.pop()] = BLACK
+                        continue
+                    state = color.get(next_id)
+                    if state == GRAY:
+                        cycle_nodes = path[path.index(next_id):] + [next_id]
+                        return list(zip(cycle_nodes, cycle_nodes[1:]))
+                    if state is None:
+                        color[next_id] = GRAY
+                        path.append(next_id)
+                        stack.append(iter(list(self._neighbors(next_id, overlay))))
+        return None
+
+    def _neighbors(self, task_id: int, overlay: Optional[GraphOverlay]) -> Iterable[int]:
+        if overlay is None:
+            return self._forward.get(task_id, ())
+        if task_id in overlay.removed_nodes:
+            return ()
+        neighbors = [
+            depends_on_id for depends_on_id in self._neighbors(task_id, overlay.base)
+            if depends_on_id not in overlay.removed_nodes
+            and (task_id, depends_on_id) not in overlay.removed
+        ]
+        neighbors.extend(overlay.added.get(task_id, ()))
+        return neighbors
+
+    def _dependents(self, task_id: int, overlay: Optional[GraphOverlay]) -> Iterable[int]:
+        """反向邻居（叠加 overlay 后），需遍历叠加层新增的边"""
+        if overlay is None:
+            return self._reverse.get(task_id, ())
+        if task_id in overlay.removed_nodes:
+            return ()
+        dependents = [
+            dependent_id for dependent_id in self._dependents(task_id, overlay.base)
+            if dependent_id not in overlay.removed_nodes
+            and (dependent_id, task_id) not in overlay.removed
+        ]
+        dependents.extend(
+            dependent_id for dependent_id, targets in overlay.added.items() if task_id in targets
+        )
+        return dependents
+
+    def edges(self) -> Iterable[Tuple[int, int]]:
+        with self._lock:
+            return [
+                (task_id, depends_on_id)
+                for task_id, targets in self._forward.items()
+                for depends_on_id in targets
+            ]
+
+    # ==================== 一致性校验 ====================
+
+    def check_consistency(self, db: Session) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        将索引与 dependencies 表比对
+        返回 {"missing": 表中有但索引缺失的边, "extra": 索引中多出的边}，均为空表示一致
+        """
+        rows = db.query(models.Dependency.task_id, models.Dependency.depends_on_id).all()
+        table_edges = {(task_id, depends_on_id) for task_id, depends_on_id in rows}
+        with self._lock:
+            index_edges = set(self.edges())
+            reverse_edges = {
+                (task_id, depends_on_id)
+                for depends_on_id, sources in self._reverse.items()
+                for task_id in sources
+            }
+        return {
+            "missing": sorted(table_edges - index_edges),
+            "extra": sorted((index_edges | reverse_edges) - table_edges),
+        }
+
+
+# 进程级共享实例
+dependency_graph = DependencyGraph()
+
+
+# ==================== 随事务更新索引 ====================
+
+# 组提交时写入线程在会话上放置的叠加层：记录同组已执行、尚未提交的修改
+GROUP_OVERLAY_KEY = "graph_overlay"
+
+
+def group_overlay(db: Session) -> Optional[GraphOverlay]:
+    return db.info.get(GROUP_OVERLAY_KEY)
+
+
+def sync_for_write(db: Session) -> None:
+    """
+    写事务做循环检测前调用：取得数据库写锁，再把索引追到已提交的最新修订号
+    之后到本事务提交前没有其他提交，索引（叠加 group_overlay）上的检测结果在提交时仍然成立
+    组提交时写入线程已用 BEGIN IMMEDIATE 持有写锁
+    """
+    if group_overlay(db) is None:
+        acquire_write_lock(db)
+    dependency_graph.catch_up()
+
+
+def stage(db: Session, method: str, *args) -> None:
+    """
+    登记索引修改（add_edge / remove_edge / remove_task），在事务提交后执行
+    组提交时同时记入叠加层，同组后续操作的循环检测可以看到这次修改
+    """
+    overlay = group_overlay(db)
+    if overlay is not None:
+        if method == "remove_task":
+            # 按边删除而不是屏蔽节点：SQLite 可能把被删除的最大ID分配给同组新建的任务
+            for edge in dependency_graph.edges_of(args[0], overlay):
+                overlay.remove_edge(*edge)
+        else:
+            getattr(overlay, method)(*args)
+    after_commit(db, getattr(dependency_graph, method), *args)
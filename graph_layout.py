@@ -0,0 +1,273 @@
+"""
+依赖图布局计算
+
+按项目计算每个任务的依赖深度（最长路径）并分配列、行。
+深度使用拓扑排序一次线性遍历求得，结果按项目缓存，
+任务或依赖关系变化时由写接口使对应项目的缓存失效。
+
+区域查询（SpatialIndex）：只返回列、行落在给定范围内的任务，以及包围盒与该范围相交的依赖边，
+大项目的依赖图可以按视口分块加载。连接线沿源任务所在行水平走到目标任务所在列再垂直走到目标，
+始终位于两端任务的包围盒内，按包围盒相交判断即不会漏掉穿过视口的边。
+"""
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+
+# 空间索引的网格单元大小（列数 × 行数）
+CELL_COLUMNS = 4
+CELL_ROWS = 16
+# 包围盒覆盖的单元数超过该值的边不放入网格，查询时逐条检查
+MAX_EDGE_CELLS = 64
+
+
+def _project_edges(db: Session, project_id: int) -> List[Tuple[int, int]]:
+    """依赖方属于该项目的全部依赖边 (task_id, depends_on_id)"""
+    return (
+        db.query(models.Dependency.task_id, models.Dependency.depends_on_id)
+        .join(models.Task, models.Task.id == models.Dependency.task_id)
+        .filter(models.Task.project_id == project_id)
+        .all()
+    )
+
+
+def compute_layout(db: Session, project_id: int) -> dict:
+    """
+    计算项目布局
+
+    深度定义与前端一致：无依赖的任务深度为 0，
+    否则为 1 + max(依赖任务深度)，项目外的依赖任务深度按 0 计。
+    同一深度（列）内按任务ID顺序分配行号。
+    """
+    task_ids = [
+        task_id for (task_id,) in
+        db.query(models.Task.id)
+        .filter(models.Task.project_id == project_id)
+        .order_by(models.Task.id)
+    ]
+    in_project = set(task_ids)
+
+    edges = _project_edges(db, project_id)
+
+    depth: Dict[int, int] = {task_id: 0 for task_id in task_ids}
+    indegree: Dict[int, int] = {task_id: 0 for task_id in task_ids}
+    dependents = defaultdict(list)
+    for task_id, depends_on_id in edges:
+        # 有任何依赖（包括项目外的）时深度至少为 1
+        depth[task_id] = 1
+        if depends_on_id in in_project:
+            indegree[task_id] += 1
+            dependents[depends_on_id].append(task_id)
+
+    # Kahn 拓扑排序，同时沿边松弛最长路径
+    queue = deque(task_id for task_id in task_ids if indegree[task_id] == 0)
+    while queue:
+        current_id = queue.popleft()
+        for dependent_id in dependents[current_id]:
+            if depth[current_id] + 1 > depth[dependent_id]:
+                depth[dependent_id] = depth[current_id] + 1
+            indegree[dependent_id] -= 1
+            if indegree[dependent_id] == 0:
+                queue.append(dependent_id)
+
+    rows_in_column: Dict[int, int] = defaultdict(int)
+    positions = {}
+    for task_id in task_ids:
+        column = depth[task_id]
+        positions[task_id] = {"column": column, "row": rows_in_column[column]}
+        rows_in_column[column] += 1
+
+    return {
+        "project_id": project_id,
+        "column_count": max(rows_in_column) + 1 if rows_in_column else 0,
+        "row_count": max(rows_in_column.values()) if rows_in_column else 0,
+        "positions": positions,
+    }
+
+
+class SpatialIndex:
+    """
+    布局的空间索引
+
+    任务：每列按行号排列的任务ID，按列、行范围查找即切片
+    依赖边：按两端任务的包围盒放入覆盖的网格单元，包围盒过大的边单独存放
+    """
+
+    def __init__(self, layout: dict, edges: List[Tuple[int, int]]):
+        positions = layout["positions"]
+        self.column_count = layout["column_count"]
+        self.row_count = layout["row_count"]
+        self.positions = positions
+
+        self.columns: List[List[int]] = [[] for _ in range(self.column_count)]
+        for task_id, position in positions.items():
+            self.columns[position["column"]].append(task_id)
+        for column in self.columns:
+            column.sort(key=lambda task_id: positions[task_id]["row"])
+
+        # 边：(task_id, depends_on_id, min_column, max_column, min_row, max_row)
+        self.cells: Dict[Tuple[int, int], list] = defaultdict(list)
+        self.wide: list = []
+        for task_id, depends_on_id in edges:
+            source = positions.get(depends_on_id)
+            target = positions.get(task_id)
+            if source is None or target is None:
+                # 项目外的前置任务不在布局中
+                continue
+            edge = (
+                task_id, depends_on_id,
+                min(source["column"], target["column"]), max(source["column"], target["column"]),
+                min(source["row"], target["row"]), max(source["row"], target["row"]),
+            )
+            cells = self._cells(*edge[2:])
+            if len(cells) > MAX_EDGE_CELLS:
+                self.wide.append(edge)
+            else:
+                for cell in cells:
+                    self.cells[cell].append(edge)
+
+    @staticmethod
+    def _cells(min_column: int, max_column: int, min_row: int, max_row: int) -> List[Tuple[int, int]]:
+        return [
+            (cell_column, cell_row)
+            for cell_column in range(min_column // CELL_COLUMNS, max_column // CELL_COLUMNS + 1)
+            for cell_row in range(min_row // CELL_ROWS, max_row // CELL_ROWS + 1)
+        ]
+
+    def tasks_in(self, min_column: int, max_column: int, min_row: int, max_row: int) -> List[int]:
+        """列、行落在范围内（含两端）的任务ID，按列、行排序"""
+        task_ids = []
+        for column in self.columns[max(min_column, 0):max_column + 1]:
+            task_ids.extend(column[max(min_row, 0):max_row + 1])
+        return task_ids
+
+    def edges_in(self, min_column: int, max_column: int, min_row: int, max_row: int) -> List[Tuple[int, int]]:
+        """包围盒与范围相交的依赖边 (task_id, depends_on_id)"""
+        min_column, min_row = max(min_column, 0), max(min_row, 0)
+        max_column, max_row = min(max_column, self.column_count - 1), min(max_row, self.row_count - 1)
+        if min_column > max_column or min_row > max_row:
+            return []
+        seen = set()
+        found = []
+        candidates = [self.cells.get(cell, ()) for cell in self._cells(min_column, max_column, min_row, max_row)]
+        candidates.append(self.wide)
+        for bucket in candidates:
+            for edge in bucket:
+                key = edge[:2]
+                if key in seen:
+                    continue
+                if edge[2] <= max_column and edge[3] >= min_column and edge[4] <= max_row and edge[5] >= min_row:
+                    seen.add(key)
+                    found.append(key)
+        return found
+
+
+class LayoutCache:
+    """
+    按项目缓存布局结果
+
+    每个项目维护一个版本号，失效时递增；计算期间若发生失效，
+    计算结果不写入缓存，避免并发写入后缓存旧布局。
+    """
+
+    def __init__(self):
+        self._layouts: Dict[int, dict] = {}
+        self._indexes: Dict[int, SpatialIndex] = {}
+        self._versions: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, project_id: int) -> dict:
+        with self._lock:
+            cached = self._layouts.get(project_id)
+            version = self._versions[project_id]
+        if cached is not None:
+            return cached
+
+        layout = compute_layout(db, project_id)
+        with self._lock:
+            if self._versions[project_id] == version:
+                self._layouts[project_id] = layout
+        return layout
+
+    def spatial_index(self, db: Session, project_id: int) -> SpatialIndex:
+        """项目布局的空间索引，与布局一起缓存、一起失效"""
+        with self._lock:
+            cached = self._indexes.get(project_id)
+            version = self._versions[project_id]
+        if cached is not None:
+            return cached
+
+        index = SpatialIndex(self.get(db, project_id), _project_edges(db, project_id))
+        with self._lock:
+            if self._versions[project_id] == version:
+                self._indexes[project_id] = index
+        return index
+
+    def invalidate(self, *project_ids: int) -> None:
+        with self._lock:
+            for project_id in project_ids:
+                self._versions[project_id] += 1
+                self._layouts.pop(project_id, None)
+                self._indexes.pop(project_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for project_id in set(self._layouts) | set(self._indexes):
+                self._versions[project_id] += 1
+            self._layouts.clear()
+            self._indexes.clear()
+
+
+# 进程级共享实例
+layout_cache = LayoutCache()
+
+
+def layout_region(
+    db: Session,
+    project_id: int,
+    min_column: int,
+    max_column: int,
+    min_row: int,
+    max_row: int,
+    fields: Sequence[str],
+    limit: int,
+) -> dict:
+    """
+    布局中一块区域的任务和依赖边
+    tasks 为区域内的任务（只含 fields 字段），edges 为包围盒与区域相交的边，
+    positions 包含区域内任务和这些边两端任务（可能在区域外）的列、行
+    区域内任务数超过 limit 时抛出 ValueError
+    """
+    index = layout_cache.spatial_index(db, project_id)
+    task_ids = index.tasks_in(min_column, max_column, min_row, max_row)
+    if len(task_ids) > limit:
+        raise ValueError(f"区域内有 {len(task_ids)} 个任务，超过上限 {limit}，请缩小范围")
+    edges = index.edges_in(min_column, max_column, min_row, max_row)
+
+    rows = []
+    if task_ids:
+        rows = (
+            db.query(*(getattr(models.Task, field) for field in fields))
+            .filter(models.Task.id.in_(task_ids))
+            .order_by(models.Task.id)
+            .all()
+        )
+    endpoints = set(task_ids)
+    for task_id, depends_on_id in edges:
+        endpoints.add(task_id)
+        endpoints.add(depends_on_id)
+    return {
+        "project_id": project_id,
+        "column_count": index.column_count,
+        "row_count": index.row_count,
+        "tasks": [dict(zip(fields, row)) for row in rows],
+        "positions": {task_id: index.positions[task_id] for task_id in sorted(endpoints)},
+        "edges": {
+            "task_id": [task_id for task_id, _ in edges],
+            "depends_on_id": [depends_on_id for _, depends_on_id in edges],
+        },
+    }
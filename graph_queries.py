@@ -0,0 +1,157 @@
+"""
+依赖关系的传递查询
+
+- 前置任务（ancestors）：任务直接或间接依赖的全部任务
+- 后续任务（descendants）：直接或间接依赖该任务的全部任务
+- 关键路径：项目内最长的依赖链
+
+前置 / 后续任务用递归 CTE 沿 dependencies 表展开，一条 SQL 返回整个子图（边和任务列）。
+"""
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, literal, select
+from sqlalchemy.orm import Session, aliased
+
+import models
+from serialization import task_dict
+
+
+def transitive_subgraph(db: Session, task_id: int, direction: str, max_depth: Optional[int] = None) -> dict:
+    """
+    沿依赖方向（ancestors）或被依赖方向（descendants）展开子图
+
+    递归 CTE 的每一行是一条可达的边；UNION 去重保证每条边只展开一次，
+    指定 max_depth 时额外携带层数并在达到上限后停止展开。
+    返回 {"root_id", "max_depth", "tasks": [...含 depth], "edges": [{"task_id", "depends_on_id"}]}，
+    depth 为距起点的最少跳数，起点本身不在 tasks 中。
+    """
+    dep = models.Dependency
+    ancestors = direction == "ancestors"
+    near = dep.task_id if ancestors else dep.depends_on_id
+
+    columns = [dep.task_id, dep.depends_on_id]
+    if max_depth is not None:
+        columns.append(literal(1).label("depth"))
+    walk = select(*columns).where(near == task_id).cte("walk", recursive=True)
+
+    step = aliased(dep)
+    step_near = step.task_id if ancestors else step.depends_on_id
+    frontier = walk.c.depends_on_id if ancestors else walk.c.task_id
+    step_columns = [step.task_id, step.depends_on_id]
+    step_query = select(*step_columns).join(walk, step_near == frontier)
+    if max_depth is not None:
+        step_query = select(*step_columns, walk.c.depth + 1).join(
+            walk, and_(step_near == frontier, walk.c.depth < max_depth)
+        )
+    walk = walk.union(step_query)
+
+    far = walk.c.depends_on_id if ancestors else walk.c.task_id
+    rows = db.execute(
+        select(
+            walk.c.task_id.label("edge_task_id"),
+            walk.c.depends_on_id.label("edge_depends_on_id"),
+            *models.TASK_COLUMNS
+        ).join(models.Task, models.Task.id == far)
+    ).all()
+
+    edges = set()
+    tasks: Dict[int, dict] = {}
+    adjacency = defaultdict(list)
+    for row in rows:
+        edge = (row.edge_task_id, row.edge_depends_on_id)
+        if edge in edges:
+            continue
+        edges.add(edge)
+        if ancestors:
+            adjacency[edge[0]].append(edge[1])
+        else:
+            adjacency[edge[1]].append(edge[0])
+        if row.id not in tasks:
+            tasks[row.id] = task_dict(row)
+
+    # 按返回的边做一次广度优先遍历求最少跳数
+    depth = {task_id: 0}
+    queue = deque([task_id])
+    while queue:
+        current_id = queue.popleft()
+        for next_id in adjacency[current_id]:
+            if next_id not in depth:
+                depth[next_id] = depth[current_id] + 1
+                queue.append(next_id)
+
+    for found_id, task in tasks.items():
+        task["depth"] = depth.get(found_id, 0)
+
+    return {
+        "root_id": task_id,
+        "max_depth": max_depth,
+        "tasks": sorted(tasks.values(), key=lambda task: (task["depth"], task["id"])),
+        "edges": [
+            {"task_id": edge_task_id, "depends_on_id": edge_depends_on_id}
+            for edge_task_id, edge_depends_on_id in sorted(edges)
+        ],
+    }
+
+
+def critical_path(db: Session, project_id: int) -> dict:
+    """
+    项目内最长的依赖链（按任务数计），只考虑两端都在项目内的依赖
+
+    一条查询取出项目任务并左连接其依赖边（项目外的前置任务忽略），再做 Kahn 拓扑排序求最长路径，
+    时间与边数成线性；长度相同时选择任务ID较小的链。
+    返回 {"project_id", "length", "tasks": [从最早的前置任务到最终任务], "edges"}
+    """
+    rows = db.execute(
+        select(*models.TASK_COLUMNS, models.Dependency.depends_on_id.label("prerequisite_id"))
+        .outerjoin(models.Dependency, models.Dependency.task_id == models.Task.id)
+        .where(models.Task.project_id == project_id)
+        .order_by(models.Task.id)
+    ).all()
+
+    tasks: Dict[int, dict] = {}
+    for row in rows:
+        if row.id not in tasks:
+            tasks[row.id] = task_dict(row)
+
+    indegree = {task_id: 0 for task_id in tasks}
+    dependents = defaultdict(list)
+    for row in rows:
+        if row.prerequisite_id in tasks:
+            indegree[row.id] += 1
+            dependents[row.prerequisite_id].append(row.id)
+
+    # length[id]: 以该任务结尾的最长链长度；previous[id]: 链上的前一个任务
+    length = {task_id: 1 for task_id in tasks}
+    previous: Dict[int, int] = {}
+    queue = deque(task_id for task_id in tasks if indegree[task_id] == 0)
+    while queue:
+        current_id = queue.popleft()
+        for dependent_id in dependents[current_id]:
+            candidate = length[current_id] + 1
+            if candidate > length[dependent_id] or (
+                candidate == length[dependent_id] and current_id < previous.get(dependent_id, current_id)
+            ):
+                length[dependent_id] = candidate
+                previous[dependent_id] = current_id
+            indegree[dependent_id] -= 1
+            if indegree[dependent_id] == 0:
+                queue.append(dependent_id)
+
+    path: List[int] = []
+    if tasks:
+        end_id = min(tasks, key=lambda task_id: (-length[task_id], task_id))
+        path.append(end_id)
+        while path[-1] in previous:
+            path.append(previous[path[-1]])
+        path.reverse()
+
+    return {
+        "project_id": project_id,
+        "length": len(path),
+        "tasks": [tasks[task_id] for task_id in path],
+        "edges": [
+            {"task_id": dependent_id, "depends_on_id": prerequisite_id}
+            for prerequisite_id, dependent_id in zip(path, path[1:])
+        ],
+    }
@@ -1,20 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session, aliased
+from typing import Any, Dict, List, Literal, Optional, Sequence, Union
+from datetime import datetime
+from collections import defaultdict
+from contextlib import asynccontextmanager
+import os
+
+import anyio
 
 import models
 import schemas
-from database import engine, get_db
+import project_stats
+import task_readiness
+import change_log
+import batch
+import graph_queries
+import pagination
+import migrations
+import metrics
+import serialization
+import search
+import graph_index
+import archive
+import project_transfer
+import project_jobs
+from database import engine, get_db, SessionLocal, after_commit
+from async_db import db_handler
+import write_queue
+from write_queue import write_handler, writer
+from compression import CompressionMiddleware
+from graph_index import dependency_graph
+from graph_layout import layout_cache, layout_region
+from response_cache import response_cache
+from event_bus import broker
+from cache_sync import CACHE_SYNC_ENABLED, WORKERS, CacheSyncMiddleware, cache_sync, startup_lock
+
+# python main.py 以多进程启动时设置，工作进程跳过主进程已完成的初始化
+INITIALIZED_ENV = "TASK_MANAGER_INITIALIZED"
+
+# 数据库初始化；多个工作进程同时启动时逐个执行，python main.py 启动多进程时由主进程执行一次
+if os.environ.get(INITIALIZED_ENV) != "1":
+    with startup_lock():
+        # 创建数据库表，并为已有数据库补建索引
+        models.Base.metadata.create_all(bind=engine)
+        _upgrade = migrations.upgrade_schema(engine)
+
+        # 项目计数表和任务就绪状态随写入增量维护：只在首次建立或迁移改写了数据后按现有任务重建，
+        # 平时启动不做全表聚合；是否一致由 GET /api/dependencies/consistency 校验
+        if _upgrade["applied"] or not migrations.side_tables_ready(engine):
+            migrations.rebuild_side_tables(engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """只在实际提供服务的进程中启动后台线程（多进程启动时主进程不启动）"""
+    # 按 TASK_MANAGER_ARCHIVE_INTERVAL_HOURS 定期归档已完成的旧任务
+    archive.start_scheduler()
+    # 多进程部署：检测其他工作进程的写入并刷新本进程的缓存和依赖索引
+    if CACHE_SYNC_ENABLED:
+        cache_sync.start()
+    yield
 
-# 创建数据库表
-models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Task Manager API",
     description="轻量级个人任务管理系统，支持任务依赖管理和项目管理",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # 添加 CORS 支持
@@ -24,8 +80,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Revision", "X-Next-Cursor", "Server-Timing", "X-Profile-File"],
 )
 
+# 多进程部署：请求开始前应用其他工作进程的写入
+if CACHE_SYNC_ENABLED:
+    app.add_middleware(CacheSyncMiddleware)
+
+# 按 Accept-Encoding 压缩响应（br / gzip）
+app.add_middleware(CompressionMiddleware)
+
+# 请求耗时、SQL 次数与耗时（Server-Timing 响应头和 /metrics）
+app.add_middleware(metrics.MetricsMiddleware)
+
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -33,49 +100,35 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # ==================== Project CRUD 接口 ====================
 
 @app.get("/api/projects", response_model=List[schemas.ProjectResponse])
-def get_all_projects(db: Session = Depends(get_db)):
-    """获取所有项目（含任务统计）"""
-    projects = db.query(models.Project).all()
-    result = []
-    for project in projects:
-        # 统计每个项目的任务数量
-        task_count = db.query(models.Task).filter(
-            models.Task.project_id == project.id
-        ).count()
-        result.append(schemas.ProjectResponse(
-            id=project.id,
-            name=project.name,
-            description=project.description,
-            color=project.color,
-            created_at=project.created_at,
-            task_count=task_count
-        ))
-    return result
+@db_handler
+def get_all_projects(request: Request, db: Session = Depends(get_db)):
+    """获取所有项目（含任务统计），响应带 ETag 并缓存，未变化时返回 304"""
+    def load():
+        projects = db.query(models.Project).all()
+        counts = project_stats.get_counts(db)
+        return [
+            project_response(project, counts.get(project.id, {})).model_dump()
+            for project in projects
+        ], {}
+
+    return response_cache.serve(request, ("projects",), None, load)
 
 
 @app.get("/api/projects/{project_id}", response_model=schemas.ProjectResponse)
+@db_handler
 def get_project(project_id: int, db: Session = Depends(get_db)):
     """获取项目详情"""
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="项目不存在")
 
-    task_count = db.query(models.Task).filter(
-        models.Task.project_id == project.id
-    ).count()
-
-    return schemas.ProjectResponse(
-        id=project.id,
-        name=project.name,
-        description=project.description,
-        color=project.color,
-        created_at=project.created_at,
-        task_count=task_count
-    )
+    counts = project_stats.get_counts(db, [project.id])
+    return project_response(project, counts.get(project.id, {}))
 
 
 @app.post("/api/projects", response_model=schemas.ProjectResponse, status_code=status.HTTP_201_CREATED)
-def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)):
+@write_handler
+def create_project(project: schemas.ProjectCreate, response: Response, db: Session = Depends(get_db)):
     """创建新项目"""
     # 检查项目名是否已存在
     existing = db.query(models.Project).filter(models.Project.name == project.name).first()
@@ -84,13 +137,23 @@ def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)
 
     db_project = models.Project(**project.model_dump())
     db.add(db_project)
+    db.flush()
+    revision = change_log.record(db, "project", "created", db_project.id, [db_project.id])
+    after_commit(db, response_cache.invalidate, db_project.id)
     db.commit()
+    set_revision(response, revision)
     db.refresh(db_project)
     return db_project
 
 
 @app.put("/api/projects/{project_id}", response_model=schemas.ProjectResponse)
-def update_project(project_id: int, project_update: schemas.ProjectUpdate, db: Session = Depends(get_db)):
+@write_handler
+def update_project(
+    project_id: int,
+    project_update: schemas.ProjectUpdate,
+    response: Response,
+    db: Session = Depends(get_db)
+):
     """更新项目"""
     db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not db_project:
@@ -110,73 +173,304 @@ def update_project(project_id: int, project_update: schemas.ProjectUpdate, db: S
     for field, value in update_data.items():
         setattr(db_project, field, value)
 
+    revision = change_log.record(db, "project", "updated", project_id, [project_id])
+    after_commit(db, response_cache.invalidate, project_id)
     db.commit()
+    set_revision(response, revision)
     db.refresh(db_project)
-    return db_project
+    counts = project_stats.get_counts(db, [project_id])
+    return project_response(db_project, counts.get(project_id, {}))
 
 
-@app.delete("/api/projects/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_project(project_id: int, db: Session = Depends(get_db)):
-    """删除项目（仅限空项目）"""
+@app.delete(
+    "/api/projects/{project_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={202: {"model": schemas.JobStatus, "description": "cascade=true 时返回后台作业的状态"}},
+)
+@write_handler
+def delete_project(
+    project_id: int,
+    response: Response,
+    cascade: bool = Query(False, description="连同项目的任务（含归档任务）和依赖关系一起，在后台分批删除"),
+    batch_size: Optional[int] = Query(None, ge=1, le=10000, description="级联删除时每批删除的任务数"),
+    db: Session = Depends(get_db)
+):
+    """删除项目（默认仅限空项目；cascade=true 时启动后台级联删除，进度见 GET /api/jobs/{job_id}）"""
     db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not db_project:
         raise HTTPException(status_code=404, detail="项目不存在")
 
+    if cascade:
+        try:
+            job = project_jobs.jobs.start(
+                db, project_jobs.DELETE_PROJECT, project_id=project_id, batch_size=batch_size
+            )
+        except project_jobs.JobError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        return JSONResponse(job, status_code=status.HTTP_202_ACCEPTED)
+
     # 检查项目下是否还有任务
-    task_count = db.query(models.Task).filter(
-        models.Task.project_id == project_id
-    ).count()
+    task_count = sum(project_stats.get_counts(db, [project_id]).get(project_id, {}).values())
     if task_count > 0:
         raise HTTPException(
             status_code=400,
-            detail=f"无法删除：项目还有 {task_count} 个任务"
+            detail=f"无法删除：项目还有 {task_count} 个任务（可使用 cascade=true 级联删除）"
+        )
+    archived_count = archive.archived_count(db, project_id)
+    if archived_count > 0:
+        raise HTTPException(
+            status_code=400,
+            detail=f"无法删除：项目还有 {archived_count} 个归档任务"
         )
 
+    db.query(models.ProjectTaskCount).filter(
+        models.ProjectTaskCount.project_id == project_id
+    ).delete()
     db.delete(db_project)
+    revision = change_log.record(db, "project", "deleted", project_id, [project_id])
+    after_commit(db, response_cache.invalidate, project_id)
+    after_commit(db, layout_cache.invalidate, project_id)
     db.commit()
+    set_revision(response, revision)
     return None
 
 
+@app.get("/api/projects/{project_id}/export")
+@db_handler
+def export_project(
+    project_id: int,
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="ndjson（含项目信息）或 csv（每行一个任务）"),
+    db: Session = Depends(get_db)
+):
+    """流式导出项目的任务和项目内的依赖关系（一个读事务内的快照），可由 POST /api/projects/import 导入"""
+    if db.query(models.Project.id).filter(models.Project.id == project_id).first() is None:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    stream = project_transfer.export_csv if format == "csv" else project_transfer.export_ndjson
+    return StreamingResponse(
+        stream(project_id),
+        media_type=project_transfer.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="project-{project_id}.{format}"'}
+    )
+
+
+@app.post("/api/projects/import", response_model=schemas.ProjectImportResult, status_code=status.HTTP_201_CREATED)
+async def import_project(
+    request: Request,
+    response: Response,
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="默认按 Content-Type 判断，非 text/csv 时为 ndjson"),
+    name: Optional[str] = Query(None, description="新项目名称；CSV 导入时必填，NDJSON 导入时覆盖文件中的名称")
+):
+    """从导出文件新建项目：任务分配新ID，依赖关系按新ID写入，整体在一个事务中完成"""
+    if format is None:
+        format = "csv" if "text/csv" in request.headers.get("content-type", "") else "ndjson"
+    # 先接收完整的请求体（临时文件），再进入写事务
+    spool = await project_transfer.spool_body(request)
+
+    def run():
+        result = write_queue.run_write(project_transfer.import_project, spool, format, name)
+        with SessionLocal() as db:
+            project = db.get(models.Project, result["project_id"])
+            counts = project_stats.get_counts(db, [project.id])
+            return {**result, "project": project_response(project, counts.get(project.id, {}))}
+
+    try:
+        result = await anyio.to_thread.run_sync(run)
+    except project_transfer.TransferError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    finally:
+        spool.close()
+    set_revision(response, result["revision"])
+    return result
+
+
+@app.get("/api/projects/{project_id}/layout", response_model=schemas.ProjectLayout)
+@db_handler
+def get_project_layout(project_id: int, db: Session = Depends(get_db)):
+    """获取项目的依赖图布局（每个任务的列、行），结果按项目缓存"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="项目不存在")
+
+    return serialization.json_response(layout_cache.get(db, project_id))
+
+
+@app.get("/api/projects/{project_id}/layout/region", response_model=schemas.LayoutRegion)
+@db_handler
+def get_project_layout_region(
+    project_id: int,
+    min_column: int = Query(0, ge=0, description="区域的起始列"),
+    max_column: int = Query(..., ge=0, description="区域的结束列（含）"),
+    min_row: int = Query(0, ge=0, description="区域的起始行"),
+    max_row: int = Query(..., ge=0, description="区域的结束行（含）"),
+    fields: Optional[str] = Query(None, description="逗号分隔的任务字段，id 始终返回，默认不含 description"),
+    limit: int = Query(2000, ge=1, le=10000, description="区域内任务数上限，超过时返回 400"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取依赖图布局中一块区域（列、行范围）的任务和依赖边，供大项目按视口加载
+    边按两端任务的包围盒与区域相交返回，positions 含这些边在区域外一端的位置
+    """
+    if min_column > max_column or min_row > max_row:
+        raise HTTPException(status_code=400, detail="区域范围无效")
+    try:
+        selected_fields = serialization.parse_fields(fields) or serialization.COMPACT_FIELDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="项目不存在")
+
+    try:
+        region = layout_region(db, project_id, min_column, max_column, min_row, max_row, selected_fields, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return serialization.json_response(region)
+
+
+@app.get("/api/projects/{project_id}/critical-path", response_model=schemas.CriticalPath)
+@db_handler
+def get_project_critical_path(project_id: int, db: Session = Depends(get_db)):
+    """获取项目内最长的依赖链"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="项目不存在")
+
+    return serialization.json_response(graph_queries.critical_path(db, project_id))
+
+
 # ==================== 任务 CRUD 接口 ====================
 
-@app.get("/api/tasks", response_model=List[schemas.TaskResponse])
+@app.get("/api/tasks", response_model=List[schemas.TaskListItem])
+@db_handler
 def get_all_tasks(
+    request: Request,
+    response: Response,
     project_id: Optional[int] = Query(None, description="过滤指定项目的任务"),
+    status_filter: Optional[List[str]] = Query(None, alias="status", description="按状态过滤，可重复"),
+    created_after: Optional[datetime] = Query(None, description="创建时间 >= 该值"),
+    created_before: Optional[datetime] = Query(None, description="创建时间 < 该值"),
+    order_by: Literal["id", "created_at"] = Query("id", description="排序字段（升序）"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="每页条数，不指定则返回全部"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    format: Optional[Literal["json", "ndjson"]] = Query(None, description="ndjson 表示逐行流式输出"),
+    include_archived: bool = Query(False, description="同时返回归档任务（带 archived 标记）"),
     db: Session = Depends(get_db)
 ):
-    """获取所有任务（可选按项目过滤）"""
-    query = db.query(models.Task)
-    if project_id is not None:
-        query = query.filter(models.Task.project_id == project_id)
-    tasks = query.all()
-    return tasks
+    """
+    获取任务（可选按项目、状态、创建时间过滤）
 
+    - 指定 limit 时按 (order_by, id) 键集分页，下一页游标在响应头 X-Next-Cursor 中（NDJSON 输出同样）
+    - format=ndjson 或 Accept: application/x-ndjson 时以 NDJSON 流式输出，内存占用恒定
+    - 默认只返回活跃任务，include_archived=true 时包含归档任务
+    """
+    filters = dict(
+        project_id=project_id,
+        statuses=status_filter,
+        created_after=created_after,
+        created_before=created_before,
+        order_by=order_by,
+        cursor=cursor,
+        include_archived=include_archived,
+    )
+    try:
+        stmt = pagination.build_task_query(**filters)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", "")):
+        headers = {}
+        if limit is not None:
+            # 响应头须在输出前确定：先取本页最后一行及其后一行，流式输出按键值读到最后一行为止，
+            # 期间的并发写入不会使下一页跳过或重复
+            boundary = db.execute(stmt.offset(limit - 1).limit(2)).all()
+            if boundary:
+                last = pagination.encode_cursor(order_by, boundary[0])
+                stmt, limit = pagination.build_task_query(**filters, until=last), None
+                if len(boundary) > 1:
+                    headers["X-Next-Cursor"] = last
+        return StreamingResponse(
+            pagination.stream_ndjson(stmt, limit),
+            media_type="application/x-ndjson",
+            headers=headers,
+        )
+
+    fields = serialization.ARCHIVABLE_TASK_FIELDS if include_archived else serialization.TASK_FIELDS
+    if limit is None:
+        return serialization.json_response(serialization.task_dicts(db.execute(stmt), fields))
+
+    # 多取一行判断是否还有下一页
+    rows = db.execute(stmt.limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(order_by, rows[-1])
+    return serialization.json_response(serialization.task_dicts(rows, fields), response)
 
-@app.get("/api/tasks/with-dependencies", response_model=List[schemas.TaskWithDependencies])
+
+@app.get(
+    "/api/tasks/with-dependencies",
+    response_model=Union[List[schemas.TaskWithDependencies], schemas.CompactTaskSnapshot, List[Dict[str, Any]]]
+)
+@db_handler
 def get_all_tasks_with_dependencies(
+    request: Request,
     project_id: Optional[int] = Query(None, description="过滤指定项目的任务"),
+    format: Optional[Literal["json", "compact"]] = Query(None, description="compact 表示列式紧凑格式"),
+    fields: Optional[str] = Query(None, description="逗号分隔的任务字段，id 始终返回"),
     db: Session = Depends(get_db)
 ):
-    """获取所有任务及其依赖关系（可选按项目过滤）"""
-    query = db.query(models.Task)
-    if project_id is not None:
-        query = query.filter(models.Task.project_id == project_id)
-    tasks = query.all()
-
-    result = []
-    for task in tasks:
-        dependencies = [d.depends_on_id for d in task.dependencies]
-        dependents = [d.task_id for d in task.dependents]
-        result.append(schemas.TaskWithDependencies(
-            **schemas.TaskResponse.model_validate(task).model_dump(),
-            dependencies=dependencies,
-            dependents=dependents
-        ))
-    return result
+    """
+    获取所有任务及其依赖关系（可选按项目过滤），响应头 X-Revision 为读取前的修订号
+    响应带 ETag 并按项目缓存，未变化时返回 304
+
+    - format=compact：字段按列返回，依赖关系为一份扁平的边列表（默认不含 description）
+    - fields=id,title,...：只返回指定字段
+    """
+    try:
+        selected_fields = serialization.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def load():
+        # 先取修订号再读数据：期间的写入会在下次增量同步中重放，不会遗漏
+        revision = change_log.current_revision(db)
+        tasks = load_tasks_with_dependencies(db, project_id, selected_fields, compact=format == "compact")
+        return tasks, {"X-Revision": str(revision)}
+
+    key = ("tasks-with-dependencies", project_id, format == "compact", selected_fields)
+    return response_cache.serve(request, key, project_id, load)
+
+
+@app.get("/api/tasks/ready", response_model=List[schemas.TaskResponse])
+@db_handler
+def get_ready_tasks(
+    project_id: Optional[int] = Query(None, description="过滤指定项目的任务"),
+    db: Session = Depends(get_db)
+):
+    """获取可以开始的任务：未完成，且所有前置任务都已完成"""
+    return serialization.json_response(serialization.task_dicts(task_readiness.ready_tasks(db, project_id)))
+
+
+@app.get("/api/tasks/search", response_model=List[schemas.TaskSearchResult])
+@db_handler
+def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200, description="搜索词，空格分隔的多个词需同时命中"),
+    project_id: Optional[int] = Query(None, description="只搜索指定项目"),
+    limit: int = Query(20, ge=1, le=100, description="最多返回条数"),
+    db: Session = Depends(get_db)
+):
+    """按标题和描述全文搜索任务，按相关度排序，带高亮标题和描述片段"""
+    if not search.available:
+        raise HTTPException(status_code=503, detail="当前 SQLite 不支持 FTS5 全文搜索")
+    try:
+        results = search.search(db, q, project_id, limit)
+    except search.InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return serialization.json_response(results)
 
 
 @app.post("/api/tasks", response_model=schemas.TaskResponse, status_code=status.HTTP_201_CREATED)
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db)):
+@write_handler
+def create_task(task: schemas.TaskCreate, response: Response, db: Session = Depends(get_db)):
     """创建新任务（未指定 project_id 时使用默认项目）"""
     # 如果未指定项目，使用默认项目（ID=1）
     project_id = task.project_id if task.project_id is not None else 1
@@ -191,68 +485,116 @@ def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db)):
     task_data["project_id"] = project_id
     db_task = models.Task(**task_data)
     db.add(db_task)
+    project_stats.task_created(db, project_id, db_task.status)
+    db.flush()
+    task_readiness.task_created(db, db_task.id, project_id, db_task.status)
+    revision = change_log.record(db, "task", "created", db_task.id, [project_id])
+    after_commit(db, response_cache.invalidate, project_id)
+    after_commit(db, layout_cache.invalidate, project_id)
     db.commit()
+    set_revision(response, revision)
     db.refresh(db_task)
     return db_task
 
 
-@app.get("/api/tasks/{task_id}", response_model=schemas.TaskWithDependencies)
-def get_task(task_id: int, db: Session = Depends(get_db)):
+@app.get(
+    "/api/tasks/{task_id}",
+    response_model=Union[schemas.TaskWithDependencies, schemas.ArchivedTaskWithDependencies]
+)
+@db_handler
+def get_task(
+    task_id: int,
+    include_archived: bool = Query(False, description="任务已归档时返回归档的任务"),
+    db: Session = Depends(get_db)
+):
     """获取任务详情（包含依赖关系）"""
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if not task:
-        raise HTTPException(status_code=404, detail="任务不存在")
+        archived = archive.archived_task_detail(db, task_id) if include_archived else None
+        if archived is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        return serialization.json_response(archived)
 
-    # 获取依赖的任务ID列表
-    dependencies = [dep.depends_on_id for dep in task.dependencies]
-    # 获取被依赖的任务ID列表
-    dependents = [dep.task_id for dep in task.dependents]
-
-    return schemas.TaskWithDependencies(
-        **schemas.TaskResponse.model_validate(task).model_dump(),
-        dependencies=dependencies,
-        dependents=dependents
-    )
+    return serialization.json_response(task_with_dependencies(db, task))
 
 
 @app.put("/api/tasks/{task_id}", response_model=schemas.TaskResponse)
-def update_task(task_id: int, task_update: schemas.TaskUpdate, db: Session = Depends(get_db)):
+@write_handler
+def update_task(
+    task_id: int,
+    task_update: schemas.TaskUpdate,
+    response: Response,
+    db: Session = Depends(get_db)
+):
     """更新任务"""
     db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if not db_task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
+    old_status = db_task.status
     update_data = task_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_task, field, value)
 
+    project_stats.task_changed(db, db_task.project_id, old_status, db_task.project_id, db_task.status)
+    task_readiness.task_changed(db, task_id, old_status, db_task.status, db_task.project_id)
+    revision = change_log.record(db, "task", "updated", task_id, [db_task.project_id])
+    after_commit(db, response_cache.invalidate, db_task.project_id)
     db.commit()
+    set_revision(response, revision)
     db.refresh(db_task)
     return db_task
 
 
 @app.delete("/api/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_task(task_id: int, db: Session = Depends(get_db)):
+@write_handler
+def delete_task(task_id: int, response: Response, db: Session = Depends(get_db)):
     """删除任务（同时删除相关的依赖关系）"""
     db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if not db_task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
+    # 依赖关系被删除后，相邻任务所在项目的布局也会变化
+    edges = task_edges_with_projects(db, task_id)
+    affected_projects = {db_task.project_id}
+    for edge in edges:
+        affected_projects.update((edge.task_project_id, edge.prerequisite_project_id))
+        change_log.record(
+            db, "dependency", "deleted", edge.id,
+            [edge.task_project_id, edge.prerequisite_project_id],
+            task_id=edge.task_id, depends_on_id=edge.depends_on_id
+        )
+
+    # 后续任务的就绪计数需在依赖关系删除前调整
+    task_readiness.task_deleted(db, task_id, db_task.status)
+
     # 删除相关的依赖关系
     db.query(models.Dependency).filter(
         (models.Dependency.task_id == task_id) |
         (models.Dependency.depends_on_id == task_id)
     ).delete()
 
+    project_stats.task_deleted(db, db_task.project_id, db_task.status)
     db.delete(db_task)
+    revision = change_log.record(db, "task", "deleted", task_id, [db_task.project_id])
+    after_commit(db, response_cache.invalidate, *affected_projects)
+    graph_index.stage(db, "remove_task", task_id)
+    after_commit(db, layout_cache.invalidate, *affected_projects)
     db.commit()
+    set_revision(response, revision)
     return None
 
 
 # ==================== 任务依赖管理接口 ====================
 
 @app.post("/api/tasks/{task_id}/dependencies", response_model=schemas.TaskWithDependencies)
-def add_dependency(task_id: int, dep: schemas.DependencyCreate, db: Session = Depends(get_db)):
+@write_handler
+def add_dependency(
+    task_id: int,
+    dep: schemas.DependencyCreate,
+    response: Response,
+    db: Session = Depends(get_db)
+):
     """为任务添加依赖（任务 task_id 依赖于任务 depends_on_id）"""
     # 验证任务存在
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
@@ -282,22 +624,25 @@ def add_dependency(task_id: int, dep: schemas.DependencyCreate, db: Session = De
     # 创建依赖关系
     db_dep = models.Dependency(task_id=task_id, depends_on_id=dep.depends_on_id)
     db.add(db_dep)
+    db.flush()
+    task_readiness.dependency_added(db, task_id, prerequisite.status)
+    revision = change_log.record(
+        db, "dependency", "created", db_dep.id, [task.project_id, prerequisite.project_id],
+        task_id=task_id, depends_on_id=dep.depends_on_id
+    )
+    after_commit(db, response_cache.invalidate, task.project_id, prerequisite.project_id)
+    graph_index.stage(db, "add_edge", task_id, dep.depends_on_id)
+    after_commit(db, layout_cache.invalidate, task.project_id, prerequisite.project_id)
     db.commit()
-    db.refresh(task)
+    set_revision(response, revision)
 
     # 返回更新后的任务
-    dependencies = [d.depends_on_id for d in task.dependencies]
-    dependents = [d.task_id for d in task.dependents]
-
-    return schemas.TaskWithDependencies(
-        **schemas.TaskResponse.model_validate(task).model_dump(),
-        dependencies=dependencies,
-        dependents=dependents
-    )
+    return serialization.json_response(task_with_dependencies(db, task), response)
 
 
 @app.delete("/api/tasks/{task_id}/dependencies/{depends_on_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_dependency(task_id: int, depends_on_id: int, db: Session = Depends(get_db)):
+@write_handler
+def remove_dependency(task_id: int, depends_on_id: int, response: Response, db: Session = Depends(get_db)):
     """
     删除依赖关系
 
@@ -326,37 +671,430 @@ def remove_dependency(task_id: int, depends_on_id: int, db: Session = Depends(ge
         raise HTTPException(status_code=404, detail="依赖关系不存在")
 
     db.delete(db_dep)
+    task_readiness.dependency_removed(db, task_id, prerequisite.status)
+    revision = change_log.record(
+        db, "dependency", "deleted", db_dep.id, [task.project_id, prerequisite.project_id],
+        task_id=task_id, depends_on_id=depends_on_id
+    )
+    after_commit(db, response_cache.invalidate, task.project_id, prerequisite.project_id)
+    graph_index.stage(db, "remove_edge", task_id, depends_on_id)
+    after_commit(db, layout_cache.invalidate, task.project_id, prerequisite.project_id)
     db.commit()
+    set_revision(response, revision)
     return None
 
 
+@app.get("/api/tasks/{task_id}/ancestors", response_model=schemas.TaskSubgraph)
+@db_handler
+def get_task_ancestors(
+    task_id: int,
+    max_depth: Optional[int] = Query(None, ge=1, description="最多展开的层数，不指定时展开全部"),
+    db: Session = Depends(get_db)
+):
+    """获取任务直接或间接依赖的全部任务及其间的依赖边"""
+    if not db.query(models.Task.id).filter(models.Task.id == task_id).first():
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    return serialization.json_response(graph_queries.transitive_subgraph(db, task_id, "ancestors", max_depth))
+
+
+@app.get("/api/tasks/{task_id}/descendants", response_model=schemas.TaskSubgraph)
+@db_handler
+def get_task_descendants(
+    task_id: int,
+    max_depth: Optional[int] = Query(None, ge=1, description="最多展开的层数，不指定时展开全部"),
+    db: Session = Depends(get_db)
+):
+    """获取直接或间接依赖该任务的全部任务及其间的依赖边"""
+    if not db.query(models.Task.id).filter(models.Task.id == task_id).first():
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    return serialization.json_response(graph_queries.transitive_subgraph(db, task_id, "descendants", max_depth))
+
+
+@app.get("/api/dependencies/consistency")
+@db_handler
+def check_dependency_index(db: Session = Depends(get_db)):
+    """校验内存依赖索引、任务就绪状态、项目计数、全文搜索索引与数据库是否一致"""
+    dependency_graph.ensure_loaded(db)
+    diff = dependency_graph.check_consistency(db)
+    readiness = task_readiness.check_consistency(db)
+    project_counts = project_stats.check_consistency(db)
+    search_consistent = not search.available or search.check_integrity(db.connection())
+    return {
+        "consistent": (
+            not diff["missing"] and not diff["extra"] and not any(readiness.values())
+            and not project_counts and search_consistent
+        ),
+        **diff,
+        "readiness": readiness,
+        "project_counts": project_counts,
+        "search": search_consistent
+    }
+
+
 # ==================== 辅助函数 ====================
 
+def project_response(project: models.Project, status_counts: dict) -> schemas.ProjectResponse:
+    """组装项目响应（任务数来自项目计数表）"""
+    return schemas.ProjectResponse(
+        id=project.id,
+        name=project.name,
+        description=project.description,
+        color=project.color,
+        created_at=project.created_at,
+        task_count=sum(status_counts.values()),
+        status_counts=status_counts
+    )
+
+
+def set_revision(response: Response, revision: int) -> None:
+    """在响应头中返回写操作后的修订号"""
+    response.headers["X-Revision"] = str(revision)
+
+
+def task_edges_with_projects(db: Session, task_id: int) -> list:
+    """任务的全部出入边，附带两端任务所在的项目ID"""
+    dependent = aliased(models.Task)
+    prerequisite = aliased(models.Task)
+    return db.query(
+        models.Dependency.id,
+        models.Dependency.task_id,
+        models.Dependency.depends_on_id,
+        dependent.project_id.label("task_project_id"),
+        prerequisite.project_id.label("prerequisite_project_id"),
+    ).join(
+        dependent, dependent.id == models.Dependency.task_id
+    ).join(
+        prerequisite, prerequisite.id == models.Dependency.depends_on_id
+    ).filter(
+        (models.Dependency.task_id == task_id) |
+        (models.Dependency.depends_on_id == task_id)
+    ).all()
+
+
+def task_with_dependencies(db: Session, task: models.Task) -> dict:
+    """单个任务及其直接依赖、被依赖的任务ID（两条列查询，不经过 Pydantic）"""
+    dependencies = db.execute(
+        select(models.Dependency.depends_on_id)
+        .where(models.Dependency.task_id == task.id)
+        .order_by(models.Dependency.id)
+    ).scalars().all()
+    dependents = db.execute(
+        select(models.Dependency.task_id)
+        .where(models.Dependency.depends_on_id == task.id)
+        .order_by(models.Dependency.id)
+    ).scalars().all()
+    return {**serialization.task_dict(task), "dependencies": dependencies, "dependents": dependents}
+
+
+def load_tasks_with_dependencies(
+    db: Session,
+    project_id: Optional[int] = None,
+    fields: Optional[Sequence[str]] = None,
+    compact: bool = False,
+):
+    """
+    批量加载任务及其依赖关系
+    固定两条查询：一次取任务列，一次取相关的依赖边，再按任务ID分组，
+    不再逐个任务懒加载 dependencies / dependents
+
+    fields 为要返回的任务字段（只查询这些列）；compact 时返回列式结构和扁平边列表
+    """
+    if fields is None:
+        fields = serialization.COMPACT_FIELDS if compact else serialization.TASK_FIELDS
+    task_query = db.query(*(getattr(models.Task, field) for field in fields))
+    dep_query = db.query(models.Dependency.task_id, models.Dependency.depends_on_id)
+    if project_id is not None:
+        task_query = task_query.filter(models.Task.project_id == project_id)
+        project_task_ids = select(models.Task.id).where(models.Task.project_id == project_id)
+        dep_query = dep_query.filter(or_(
+            models.Dependency.task_id.in_(project_task_ids),
+            models.Dependency.depends_on_id.in_(project_task_ids)
+        ))
+
+    rows = task_query.order_by(models.Task.id).all()
+    edges = dep_query.order_by(models.Dependency.id).all()
+    if compact:
+        return serialization.compact_tasks(fields, rows, edges)
+
+    dependencies = defaultdict(list)
+    dependents = defaultdict(list)
+    for task_id, depends_on_id in edges:
+        dependencies[task_id].append(depends_on_id)
+        dependents[depends_on_id].append(task_id)
+
+    return [
+        {
+            **dict(zip(fields, row)),
+            "dependencies": dependencies.get(row.id, []),
+            "dependents": dependents.get(row.id, []),
+        }
+        for row in rows
+    ]
+
+
 def would_create_cycle(db: Session, prerequisite_id: int, dependent_id: int) -> bool:
     """
     检查添加依赖是否会产生循环依赖
-    使用 DFS 检查从 prerequisite_id 是否能到达 dependent_id
+    在内存依赖索引上检查从 prerequisite_id 是否能到达 dependent_id
+    （组提交时叠加同组已执行、尚未提交的依赖修改）
+    检查前取得写锁并重放其他连接已提交的依赖修改，并发的添加不会各自通过检查而共同成环
+    """
+    graph_index.sync_for_write(db)
+    return dependency_graph.has_path(prerequisite_id, dependent_id, graph_index.group_overlay(db))
+
+
+# ==================== 批量操作接口 ====================
+
+@app.post("/api/batch", response_model=schemas.BatchResponse)
+@write_handler
+def apply_batch(request: schemas.BatchRequest, response: Response, db: Session = Depends(get_db)):
+    """
+    在一个事务内执行一组操作（创建/更新/删除任务、增删依赖）
+
+    create_task 可指定 ref，同批后续操作用字符串 ref 引用新任务；
+    循环依赖按整批修改后的图校验，任一操作失败则整批回滚
     """
-    visited = set()
+    try:
+        result = batch.apply_batch(db, request.operations)
+    except batch.BatchError as e:
+        db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    touched = result.pop("touched")
+    for task_id in touched["deleted_tasks"]:
+        graph_index.stage(db, "remove_task", task_id)
+    for task_id, depends_on_id in touched["removed_edges"]:
+        graph_index.stage(db, "remove_edge", task_id, depends_on_id)
+    for task_id, depends_on_id in touched["added_edges"]:
+        graph_index.stage(db, "add_edge", task_id, depends_on_id)
+    after_commit(db, layout_cache.invalidate, *touched["projects"])
+    after_commit(db, response_cache.invalidate, *touched["changed_projects"])
+    db.commit()
+    set_revision(response, result["revision"])
+    return result
+
+
+# ==================== 归档接口 ====================
+
+@app.post("/api/archive/run", response_model=schemas.ArchiveStatus, status_code=status.HTTP_202_ACCEPTED)
+def run_archive(
+    older_than_days: Optional[float] = Query(None, ge=0, description="归档完成时间早于多少天的任务，默认取配置"),
+    batch_size: Optional[int] = Query(None, ge=1, le=10000, description="每批归档的任务数"),
+):
+    """在后台开始归档已完成的旧任务（分批提交），进度见 GET /api/archive/status"""
+    if not archive.job.start(older_than_days, batch_size):
+        raise HTTPException(status_code=409, detail="归档任务正在运行")
+    return archive.job.status()
+
+
+@app.get("/api/archive/status", response_model=schemas.ArchiveStatus)
+def get_archive_status():
+    """最近一次归档的进度"""
+    return archive.job.status()
+
+
+@app.post("/api/tasks/{task_id}/restore", response_model=schemas.TaskWithDependencies)
+@write_handler
+def restore_task(task_id: int, response: Response, db: Session = Depends(get_db)):
+    """恢复归档的任务（保留原ID），另一端仍存在的依赖关系一并恢复"""
+    try:
+        revision = archive.restore_task(db, task_id)
+    except archive.ArchiveError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    db.commit()
+    set_revision(response, revision)
+    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    return serialization.json_response(task_with_dependencies(db, task), response)
+
+
+# ==================== 后台作业接口 ====================
 
-    def dfs(current_id: int) -> bool:
-        if current_id == dependent_id:
-            return True
-        if current_id in visited:
-            return False
-        visited.add(current_id)
+def start_job(db: Session, kind: str, **params) -> JSONResponse:
+    try:
+        job = project_jobs.jobs.start(db, kind, **params)
+    except project_jobs.JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    return JSONResponse(job, status_code=status.HTTP_202_ACCEPTED)
 
-        # 获取当前任务依赖的所有任务
-        deps = db.query(models.Dependency).filter(
-            models.Dependency.task_id == current_id
-        ).all()
 
-        for dep in deps:
-            if dfs(dep.depends_on_id):
-                return True
-        return False
+@app.post("/api/tasks/move", response_model=schemas.JobStatus, status_code=status.HTTP_202_ACCEPTED)
+@write_handler
+def move_tasks(
+    request: schemas.TaskMoveRequest,
+    batch_size: Optional[int] = Query(None, ge=1, le=10000, description="每批移动的任务数"),
+    db: Session = Depends(get_db)
+):
+    """在后台把任务分批移动到目标项目（依赖关系保持不变），进度见 GET /api/jobs/{job_id}"""
+    if not request.task_ids:
+        raise HTTPException(status_code=400, detail="task_ids 不能为空")
+    if db.get(models.Project, request.target_project_id) is None:
+        raise HTTPException(status_code=404, detail="目标项目不存在")
+    return start_job(
+        db,
+        project_jobs.MOVE_TASKS,
+        target_project_id=request.target_project_id,
+        task_ids=list(dict.fromkeys(request.task_ids)),
+        batch_size=batch_size,
+    )
+
+
+@app.post("/api/projects/{project_id}/merge", response_model=schemas.JobStatus, status_code=status.HTTP_202_ACCEPTED)
+@write_handler
+def merge_project(
+    project_id: int,
+    request: schemas.ProjectMergeRequest,
+    batch_size: Optional[int] = Query(None, ge=1, le=10000, description="每批移动的任务数"),
+    db: Session = Depends(get_db)
+):
+    """在后台把项目的全部任务（含归档任务）分批移动到目标项目，完成后删除该项目"""
+    if db.get(models.Project, project_id) is None:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    if request.target_project_id == project_id:
+        raise HTTPException(status_code=400, detail="不能合并到项目自身")
+    if db.get(models.Project, request.target_project_id) is None:
+        raise HTTPException(status_code=404, detail="目标项目不存在")
+    return start_job(
+        db,
+        project_jobs.MERGE_PROJECT,
+        project_id=project_id,
+        target_project_id=request.target_project_id,
+        batch_size=batch_size,
+    )
+
+
+@app.get("/api/jobs", response_model=List[schemas.JobStatus])
+def list_jobs():
+    """最近的后台作业（多进程部署时包括其他进程启动的作业），最新的在前"""
+    return project_jobs.jobs.list()
+
+
+@app.get("/api/jobs/{job_id}", response_model=schemas.JobStatus)
+def get_job(job_id: int):
+    """后台作业的进度"""
+    job = project_jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="作业不存在")
+    return job
+
+
+# ==================== 缓存统计与指标 ====================
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """响应缓存的命中、未命中、304 与淘汰计数，以及跨进程缓存同步的状态"""
+    return {"responses": response_cache.stats(), "sync": cache_sync.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus 文本格式的请求、SQL 与缓存指标"""
+    cache = response_cache.stats()
+    return PlainTextResponse(
+        metrics.registry.render([
+            ("task_manager_response_cache_hits_total", "counter", "响应缓存命中次数", cache["hits"]),
+            ("task_manager_response_cache_misses_total", "counter", "响应缓存未命中次数", cache["misses"]),
+            ("task_manager_response_cache_not_modified_total", "counter", "返回 304 的次数", cache["not_modified"]),
+            ("task_manager_response_cache_bytes", "gauge", "响应缓存占用字节数", cache["bytes"]),
+            ("task_manager_event_subscribers", "gauge", "SSE 订阅者数量", broker.subscriber_count),
+            *group_commit_metrics(),
+            *cache_sync_metrics(),
+        ]),
+        media_type=metrics.CONTENT_TYPE
+    )
+
+
+def group_commit_metrics() -> list:
+    """组提交开启时附加写入队列的指标"""
+    if not write_queue.GROUP_COMMIT_ENABLED:
+        return []
+    stats = writer.stats()
+    return [
+        ("task_manager_group_commit_groups_total", "counter", "组提交的提交次数", stats["groups"]),
+        ("task_manager_group_commit_operations_total", "counter", "经组提交执行的写操作数", stats["operations"]),
+        ("task_manager_group_commit_failed_operations_total", "counter", "组内回滚的写操作数", stats["failed_operations"]),
+        ("task_manager_group_commit_failed_commits_total", "counter", "整组提交失败次数", stats["failed_commits"]),
+        ("task_manager_group_commit_largest_group", "gauge", "最大的一组操作数", stats["largest_group"]),
+        ("task_manager_group_commit_queue_depth", "gauge", "等待执行的写操作数", stats["queue_depth"]),
+    ]
+
+
+def cache_sync_metrics() -> list:
+    """跨进程缓存同步开启时附加同步指标"""
+    if not CACHE_SYNC_ENABLED:
+        return []
+    stats = cache_sync.stats()
+    return [
+        ("task_manager_cache_sync_total", "counter", "检测到其他连接提交后执行的同步次数", stats["syncs"]),
+        ("task_manager_cache_sync_changes_total", "counter", "同步时应用的变更记录数", stats["applied_changes"]),
+        ("task_manager_cache_sync_full_resets_total", "counter", "无法增量同步而整体失效的次数", stats["full_resets"]),
+        ("task_manager_cache_sync_revision", "gauge", "本进程已同步到的修订号", stats["revision"]),
+    ]
+
+
+# ==================== 增量同步接口 ====================
+
+@app.get("/api/changes", response_model=schemas.ChangeFeed)
+@db_handler
+def get_changes(
+    since: int = Query(..., ge=0, description="上次同步时的修订号"),
+    project_id: Optional[int] = Query(None, description="只返回指定项目的任务和依赖变更"),
+    db: Session = Depends(get_db)
+):
+    """获取 since 之后的增量变更（每个实体只返回最终状态）"""
+    collected = change_log.collect(db, since, project_id)
+
+    task_ids = collected["tasks"]["upserted"]
+    tasks = []
+    if task_ids:
+        tasks = db.query(*models.TASK_COLUMNS).filter(models.Task.id.in_(task_ids)).order_by(models.Task.id).all()
+
+    project_ids = collected["projects"]["upserted"]
+    projects = []
+    if project_ids:
+        counts = project_stats.get_counts(db, project_ids)
+        projects = [
+            project_response(project, counts.get(project.id, {}))
+            for project in db.query(models.Project).filter(models.Project.id.in_(project_ids))
+        ]
+
+    def edge_list(edges):
+        return [
+            {"task_id": task_id, "depends_on_id": depends_on_id}
+            for task_id, depends_on_id in sorted(edges)
+        ]
 
-    return dfs(prerequisite_id)
+    return {
+        "revision": collected["revision"],
+        "full_reload": collected["full_reload"],
+        "tasks": {
+            "upserted": [dict(row._mapping) for row in tasks],
+            "deleted": sorted(collected["tasks"]["deleted"]),
+        },
+        "projects": {
+            "upserted": projects,
+            "deleted": sorted(collected["projects"]["deleted"]),
+        },
+        "dependencies": {
+            "added": edge_list(collected["dependencies"]["added"]),
+            "removed": edge_list(collected["dependencies"]["removed"]),
+        },
+    }
+
+
+@app.get("/api/events")
+async def stream_events(
+    request: Request,
+    project_id: Optional[int] = Query(None, description="只推送指定项目的变更")
+):
+    """以 Server-Sent Events 推送变更事件（修订号 + 实体标识），客户端据此调用 /api/changes"""
+    subscriber = broker.subscribe(project_id)
+    return StreamingResponse(
+        broker.stream(subscriber, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/")
@@ -371,4 +1109,9 @@ def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    if WORKERS > 1:
+        # 工作进程按模块路径各自导入应用；初始化已在本进程完成
+        os.environ[INITIALIZED_ENV] = "1"
+        uvicorn.run("main:app", host="0.0.0.0", port=8001, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,248 @@
+"""
+请求与 SQL 计量
+
+- MetricsMiddleware 按路由记录请求耗时直方图和状态码计数，
+  并在响应头 Server-Timing 中给出本次请求的总耗时、SQL 次数与 SQL 耗时
+- SQLAlchemy 引擎事件统计每个请求执行的查询次数和耗时（通过 contextvars 传到线程池中的接口）
+- render() 以 Prometheus 文本格式输出，由 GET /metrics 暴露
+
+可选的按请求性能剖析（cProfile）：
+TASK_MANAGER_PROFILING=1 时，请求带 X-Profile: 1 头或 ?profile=1 参数即对该请求剖析，
+结果保存到 TASK_MANAGER_PROFILE_DIR（默认 profiles/），文件名在响应头 X-Profile-File 中，
+可用 python -m pstats 或 snakeviz 查看。剖析事件循环线程时，同时在处理的其他请求也会被计入。
+"""
+import contextvars
+import cProfile
+import functools
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILING_ENABLED = os.environ.get("TASK_MANAGER_PROFILING", "0").lower() in ("1", "true", "yes", "on")
+PROFILE_DIR = os.environ.get("TASK_MANAGER_PROFILE_DIR", "profiles")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+# 当前请求需要剖析时，线程池中的接口把各自的剖析结果追加到这里
+_request_profiles: contextvars.ContextVar[Optional[List[cProfile.Profile]]] = contextvars.ContextVar(
+    "request_profiles", default=None
+)
+
+
+# ==================== SQL 计量 ====================
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_time += elapsed
+
+
+# ==================== 指标注册表 ====================
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    return ",".join(
+        '%s="%s"' % (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._queries: Dict[Tuple[str, str], Histogram] = {}
+        self._sql_time: Dict[Tuple[str, str], float] = defaultdict(float)
+
+    def record(self, method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            self._requests[(method, route, status)] += 1
+            if key not in self._latency:
+                self._latency[key] = Histogram(LATENCY_BUCKETS)
+                self._queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            self._latency[key].observe(duration)
+            self._queries[key].observe(stats.queries)
+            self._sql_time[key] += stats.sql_time
+
+    def _render_histogram(self, lines: List[str], name: str, histograms: Dict[Tuple[str, str], Histogram]) -> None:
+        for (method, route), histogram in sorted(histograms.items()):
+            labels = _labels(method=method, route=route)
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def render(self, extra: Iterable[Tuple[str, str, str, float]] = ()) -> str:
+        """Prometheus 文本格式；extra 为附加指标 (名称, 类型, 说明, 值)"""
+        lines: List[str] = []
+        with self._lock:
+            lines.append("# HELP task_manager_http_requests_total 按路由和状态码统计的请求数")
+            lines.append("# TYPE task_manager_http_requests_total counter")
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f"task_manager_http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}"
+                )
+
+            lines.append("# HELP task_manager_http_request_duration_seconds 请求耗时")
+            lines.append("# TYPE task_manager_http_request_duration_seconds histogram")
+            self._render_histogram(lines, "task_manager_http_request_duration_seconds", self._latency)
+
+            lines.append("# HELP task_manager_db_queries_per_request 每个请求执行的 SQL 次数")
+            lines.append("# TYPE task_manager_db_queries_per_request histogram")
+            self._render_histogram(lines, "task_manager_db_queries_per_request", self._queries)
+
+            lines.append("# HELP task_manager_db_query_seconds_total 按路由累计的 SQL 耗时")
+            lines.append("# TYPE task_manager_db_query_seconds_total counter")
+            for (method, route), total in sorted(self._sql_time.items()):
+                lines.append(f"task_manager_db_query_seconds_total{{{_labels(method=method, route=route)}}} {total:.6f}")
+
+        for name, kind, description, value in extra:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# 进程级共享实例
+registry = MetricsRegistry()
+
+
+# ==================== 中间件 ====================
+
+def _profile_requested(scope: Scope) -> bool:
+    if not PROFILING_ENABLED:
+        return False
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile" and value not in (b"", b"0"):
+            return True
+    query = scope.get("query_string", b"").decode("latin-1")
+    return any(part in ("profile=1", "profile=true") for part in query.split("&"))
+
+
+def _route_label(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        stats_token = _request_stats.set(stats)
+        profiles: Optional[List[cProfile.Profile]] = None
+        profile_file = None
+        if _profile_requested(scope):
+            profiles = []
+            profiles_token = _request_profiles.set(profiles)
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile_file = os.path.join(
+                PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns()}.prof"
+            )
+            loop_profile = cProfile.Profile()
+            loop_profile.enable()
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'app;dur={elapsed:.1f}, db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries"'
+                )
+                if profile_file is not None:
+                    headers.append("X-Profile-File", profile_file)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            duration = time.perf_counter() - start
+            registry.record(scope["method"], _route_label(scope), status_code, duration, stats)
+            _request_stats.reset(stats_token)
+            if profiles is not None:
+                loop_profile.disable()
+                _request_profiles.reset(profiles_token)
+                combined = pstats.Stats(loop_profile)
+                for profile in profiles:
+                    combined.add(profile)
+                combined.dump_stats(profile_file)
+
+
+def profiled(func):
+    """
+    线程池中执行的同步接口：当前请求需要剖析时在本线程内单独剖析
+    （cProfile 只记录启用它的线程）
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiles = _request_profiles.get()
+        if profiles is None:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            profiles.append(profile)
+
+    return wrapper
@@ -0,0 +1,454 @@
+"""
+数据库结构升级
+
+create_all 只会创建缺失的表，已有表的结构变化和数据改写由这里的版本化迁移完成。
+schema_migrations 表记录每个迁移的版本号、开始与完成时间；应用启动时调用 upgrade_schema：
+
+1. 按版本号顺序执行尚未完成的迁移（MIGRATIONS）
+2. 补建模型中声明的索引、全文搜索索引和完成时间触发器（幂等，每次启动都检查）
+
+每个迁移分为三步：
+- prepare：在一个写事务内检查并修改结构；数据库已是目标结构时返回 False，直接记为已完成
+- batch：可选，分批改写数据。每批处理 cursor 之后的一段ID，与新的 cursor 一起提交，
+  批与批之间暂停，其他连接的读写可以穿插进行；进程中断后从记录的 cursor 继续
+- finish：可选，最后一批之后与"已完成"标记在同一事务内执行
+
+第一次执行新的迁移前，若数据库已有数据，先用 SQLite 在线备份接口备份（不阻塞其他连接的写入）。
+多个进程同时启动时各批次在写锁上串行，进度以表中记录为准，不会重复处理。
+
+也可以单独运行（数据库路径取自 TASK_MANAGER_DB_PATH）：
+    python migrations.py                   # 执行迁移、补建索引
+    python migrations.py --status          # 查看各迁移的状态
+    python migrations.py --backup          # 只备份数据库
+    python migrations.py --rebuild-search  # 按 tasks 表重建全文搜索索引
+    python migrations.py --rebuild-counts  # 按 tasks / dependencies 表重建项目计数表和任务就绪状态
+"""
+import argparse
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+import archive
+import models
+import project_stats
+import search
+import task_readiness
+
+MIGRATION_BATCH_SIZE = int(os.environ.get("TASK_MANAGER_MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_BATCH_PAUSE = float(os.environ.get("TASK_MANAGER_MIGRATION_BATCH_PAUSE_MS", "10")) / 1000
+# 执行新迁移前是否自动备份
+MIGRATION_BACKUP = os.environ.get("TASK_MANAGER_MIGRATION_BACKUP", "1").lower() in ("1", "true", "yes", "on")
+# 备份文件目录，默认与数据库文件相同
+BACKUP_DIR = os.environ.get("TASK_MANAGER_BACKUP_DIR")
+# 回滚日志模式下在线备份每步复制的页数
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_PAUSE = 0.01
+
+# app_state 中的标记：项目计数表和任务就绪状态已按现有数据建立，之后随写入增量维护
+SIDE_TABLES_KEY = "side_tables.rebuilt"
+
+DEFAULT_PROJECT_ID = 1
+REBUILD_TABLE = "tasks_new"
+REBUILD_TRIGGER_PREFIX = "tasks_rebuild_"
+
+
+class Migration:
+    def __init__(
+        self,
+        version: int,
+        name: str,
+        prepare: Callable[[Connection], Optional[bool]],
+        batch: Optional[Callable[[Connection, int, int], Optional[int]]] = None,
+        finish: Optional[Callable[[Connection], None]] = None,
+    ):
+        self.version = version
+        self.name = name
+        self.prepare = prepare
+        self.batch = batch
+        self.finish = finish
+
+
+# ==================== 在线备份 ====================
+
+def backup_path(engine: Engine) -> str:
+    database = Path(engine.url.database)
+    directory = Path(BACKUP_DIR) if BACKUP_DIR else database.parent
+    return str(directory / f"{database.name}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+
+def backup_database(engine: Engine, destination: Optional[str] = None) -> str:
+    """
+    用 SQLite 在线备份接口把数据库复制到 destination，返回备份文件路径
+    WAL 模式下一次复制读事务开始时的完整快照，不阻塞其他连接写入；
+    回滚日志模式下每复制 BACKUP_STEP_PAGES 页释放一次读锁，其间有其他连接写入时备份自动从头开始
+    """
+    destination = destination or backup_path(engine)
+    Path(destination).parent.mkdir(parents=True, exist_ok=True)
+    raw = engine.raw_connection()
+    try:
+        source = raw.driver_connection
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        target = sqlite3.connect(destination)
+        try:
+            source.backup(target, pages=-1 if wal else BACKUP_STEP_PAGES, sleep=BACKUP_STEP_PAUSE)
+        finally:
+            target.close()
+    finally:
+        raw.close()
+    return destination
+
+
+# ==================== 工具 ====================
+
+@contextmanager
+def write_transaction(engine: Engine):
+    """BEGIN IMMEDIATE 开始的事务：开始时即取得写锁，检查与修改之间不会插入其他写入"""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _table_sql(conn: Connection, name: str) -> str:
+    row = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+    ).first()
+    return row[0] if row else ""
+
+
+def _columns(conn: Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')]
+
+
+def _id_range(conn: Connection, table: str, cursor: int, size: int) -> Optional[int]:
+    """cursor 之后第 size 个ID（不足时为最大ID）；没有更多行时返回 None"""
+    return conn.execute(text(
+        f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > :cursor ORDER BY id LIMIT :size)"
+    ), {"cursor": cursor, "size": size}).scalar()
+
+
+# ==================== 1. 项目层级 ====================
+# 取代原 migrate_to_projects.py：旧数据库的任务没有 project_id，全部归入默认项目
+
+def add_projects_prepare(conn: Connection) -> bool:
+    models.Project.__table__.create(bind=conn, checkfirst=True)
+    added = "project_id" not in _columns(conn, "tasks")
+    if added:
+        # 带默认值的新列只修改表定义，已有行读出时即为默认值，不改写整张表
+        conn.exec_driver_sql(f"ALTER TABLE tasks ADD COLUMN project_id INTEGER DEFAULT {DEFAULT_PROJECT_ID}")
+    orphaned = conn.execute(text("SELECT 1 FROM tasks WHERE project_id IS NULL LIMIT 1")).first() is not None
+    if not (added or orphaned):
+        return False
+    conn.execute(text(
+        "INSERT OR IGNORE INTO projects (id, name, description, color) "
+        "VALUES (:id, '默认项目', '系统自动创建的默认项目', '#2196f3')"
+    ), {"id": DEFAULT_PROJECT_ID})
+    return orphaned
+
+
+def add_projects_batch(conn: Connection, cursor: int, size: int) -> Optional[int]:
+    upper = _id_range(conn, "tasks", cursor, size)
+    if upper is None:
+        return None
+    conn.execute(text(
+        "UPDATE tasks SET project_id = :project_id WHERE id > :cursor AND id <= :upper AND project_id IS NULL"
+    ), {"project_id": DEFAULT_PROJECT_ID, "cursor": cursor, "upper": upper})
+    return upper
+
+
+# ==================== 2. 依赖关系去重 ====================
+# 为 (task_id, depends_on_id) 唯一索引做准备：重复的依赖关系只保留 id 最小的一条
+
+def dedupe_dependencies_prepare(conn: Connection) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM dependencies GROUP BY task_id, depends_on_id HAVING COUNT(*) > 1 LIMIT 1"
+    )).first() is not None
+
+
+def dedupe_dependencies_batch(conn: Connection, cursor: int, size: int) -> Optional[int]:
+    upper = _id_range(conn, "dependencies", cursor, size)
+    if upper is None:
+        return None
+    conn.execute(text("""
+        DELETE FROM dependencies
+        WHERE id > :cursor AND id <= :upper
+          AND EXISTS (
+              SELECT 1 FROM dependencies AS kept
+              WHERE kept.task_id = dependencies.task_id
+                AND kept.depends_on_id = dependencies.depends_on_id
+                AND kept.id < dependencies.id
+          )
+    """), {"cursor": cursor, "upper": upper})
+    return upper
+
+
+# ==================== 3. 重建 tasks 表 ====================
+# 旧数据库的 tasks 表没有 AUTOINCREMENT（SQLite 会把被删除的最大ID分配给新任务，
+# 与归档任务的ID冲突）也没有 completed_at 列：按当前模型建新表 tasks_new，
+# tasks 上的触发器把期间的增删改同步到新表，旧数据按ID分批复制，最后在一个事务内换表。
+# 其他表对 tasks 的外键引用不变，任务保留原有ID。
+
+def _rebuild_columns(conn: Connection) -> str:
+    existing = set(_columns(conn, "tasks"))
+    return ", ".join(column for column in models.Task.__table__.columns.keys() if column in existing)
+
+
+def rebuild_tasks_prepare(conn: Connection) -> bool:
+    table = models.Task.__table__
+    sql = _table_sql(conn, "tasks")
+    if "AUTOINCREMENT" in sql.upper() and set(_columns(conn, "tasks")) >= set(table.columns.keys()):
+        return False
+
+    if not _table_sql(conn, REBUILD_TABLE):
+        # 只建表不建索引：索引名与旧表的相同，换表后再创建
+        metadata = MetaData()
+        models.Project.__table__.to_metadata(metadata)
+        conn.execute(CreateTable(table.to_metadata(metadata, name=REBUILD_TABLE)))
+    columns = _rebuild_columns(conn)
+    copy = f"INSERT OR REPLACE INTO {REBUILD_TABLE} ({columns}) SELECT {columns} FROM tasks WHERE id = new.id"
+    for trigger, body in (
+        ("ai", f"AFTER INSERT ON tasks BEGIN {copy}; END"),
+        ("au", f"AFTER UPDATE ON tasks BEGIN DELETE FROM {REBUILD_TABLE} WHERE id = old.id; {copy}; END"),
+        ("ad", f"AFTER DELETE ON tasks BEGIN DELETE FROM {REBUILD_TABLE} WHERE id = old.id; END"),
+    ):
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {REBUILD_TRIGGER_PREFIX}{trigger} {body}")
+    return True
+
+
+def rebuild_tasks_batch(conn: Connection, cursor: int, size: int) -> Optional[int]:
+    upper = _id_range(conn, "tasks", cursor, size)
+    if upper is None:
+        return None
+    columns = _rebuild_columns(conn)
+    # 触发器已同步过的行比这里读到的更新，不覆盖
+    conn.execute(text(
+        f"INSERT OR IGNORE INTO {REBUILD_TABLE} ({columns}) "
+        f"SELECT {columns} FROM tasks WHERE id > :cursor AND id <= :upper"
+    ), {"cursor": cursor, "upper": upper})
+    return upper
+
+
+def rebuild_tasks_finish(conn: Connection) -> None:
+    triggers = conn.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'tasks'"
+    )).all()
+    for name, _ in triggers:
+        conn.exec_driver_sql(f'DROP TRIGGER "{name}"')
+    # 改名时不改写其他表的外键、全文搜索外部内容表对 tasks 的引用
+    conn.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+    try:
+        conn.exec_driver_sql("ALTER TABLE tasks RENAME TO tasks_old")
+        conn.exec_driver_sql("DROP TABLE tasks_old")
+        conn.exec_driver_sql(f"ALTER TABLE {REBUILD_TABLE} RENAME TO tasks")
+    finally:
+        conn.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+    # 复制时的显式ID只把自增序列推到现存的最大ID：旧表中被删除的最大ID和已归档任务的ID
+    # 仍可能被分配给新任务，序列至少要越过归档表中的最大ID
+    if _table_sql(conn, "archived_tasks"):
+        archived = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM archived_tasks")).scalar()
+        sequence = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'")).scalar()
+        if sequence is None:
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', :seq)"), {"seq": archived})
+        elif sequence < archived:
+            conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'tasks'"), {"seq": archived})
+    # 在新表上重建原有的触发器（全文搜索、完成时间）和索引
+    for name, sql in triggers:
+        if not name.startswith(REBUILD_TRIGGER_PREFIX):
+            conn.exec_driver_sql(sql)
+    for index in models.Task.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS = (
+    Migration(1, "add_projects", add_projects_prepare, add_projects_batch),
+    Migration(2, "dedupe_dependencies", dedupe_dependencies_prepare, dedupe_dependencies_batch),
+    Migration(3, "rebuild_tasks_table", rebuild_tasks_prepare, rebuild_tasks_batch, rebuild_tasks_finish),
+)
+
+
+# ==================== 执行 ====================
+
+def _progress(conn: Connection, version: int):
+    return conn.execute(text(
+        "SELECT cursor, applied_at FROM schema_migrations WHERE version = :version"
+    ), {"version": version}).first()
+
+
+def migration_status(engine: Engine) -> List[dict]:
+    """每个迁移的状态：applied（已完成）、running（分批执行中）或 pending（未开始）"""
+    models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        rows = {
+            row.version: row
+            for row in conn.execute(text("SELECT version, cursor, started_at, applied_at FROM schema_migrations"))
+        }
+    status = []
+    for migration in MIGRATIONS:
+        row = rows.get(migration.version)
+        status.append({
+            "version": migration.version,
+            "name": migration.name,
+            "state": "pending" if row is None else ("applied" if row.applied_at else "running"),
+            "cursor": row.cursor if row else None,
+            "started_at": row.started_at if row else None,
+            "applied_at": row.applied_at if row else None,
+        })
+    return status
+
+
+def run_migration(
+    engine: Engine,
+    migration: Migration,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    pause: float = MIGRATION_BATCH_PAUSE,
+) -> bool:
+    """执行（或继续执行）一个迁移，返回是否修改了数据库"""
+    with write_transaction(engine) as conn:
+        row = _progress(conn, migration.version)
+        if row is not None and row.applied_at is not None:
+            return False
+        if row is None:
+            needed = migration.prepare(conn) is not False
+            conn.execute(text("""
+                INSERT INTO schema_migrations (version, name, cursor, started_at, applied_at)
+                VALUES (:version, :name, 0, CURRENT_TIMESTAMP, CASE WHEN :needed THEN NULL ELSE CURRENT_TIMESTAMP END)
+            """), {"version": migration.version, "name": migration.name, "needed": needed})
+            if not needed:
+                return False
+
+    while True:
+        with write_transaction(engine) as conn:
+            row = _progress(conn, migration.version)
+            # 其他进程已经完成
+            if row.applied_at is not None:
+                return True
+            cursor = migration.batch(conn, row.cursor, batch_size) if migration.batch else None
+            if cursor is None:
+                if migration.finish:
+                    migration.finish(conn)
+                conn.execute(text(
+                    "UPDATE schema_migrations SET applied_at = CURRENT_TIMESTAMP WHERE version = :version"
+                ), {"version": migration.version})
+                return True
+            conn.execute(text(
+                "UPDATE schema_migrations SET cursor = :cursor WHERE version = :version"
+            ), {"cursor": cursor, "version": migration.version})
+        time.sleep(pause)
+
+
+def stamp(conn: Connection) -> None:
+    """把全部迁移记为已完成（按当前模型新建的数据库使用，跳过检查和迁移前备份）"""
+    for migration in MIGRATIONS:
+        conn.execute(text("""
+            INSERT OR IGNORE INTO schema_migrations (version, name, cursor, started_at, applied_at)
+            VALUES (:version, :name, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        """), {"version": migration.version, "name": migration.name})
+
+
+def migrate(engine: Engine, backup: bool = MIGRATION_BACKUP) -> dict:
+    """
+    按版本号顺序执行尚未完成的迁移
+    返回 {"applied": 修改了数据库的迁移名, "backup": 备份文件路径或 None}
+    """
+    models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    status = migration_status(engine)
+    backup_file = None
+    if backup and any(item["state"] == "pending" for item in status):
+        with engine.connect() as conn:
+            has_data = conn.execute(text("SELECT 1 FROM tasks LIMIT 1")).first() is not None
+        if has_data:
+            backup_file = backup_database(engine)
+
+    applied = [migration.name for migration in MIGRATIONS if run_migration(engine, migration)]
+    return {"applied": applied, "backup": backup_file}
+
+
+def ensure_indexes(engine: Engine) -> None:
+    """创建模型中声明但数据库中缺失的索引"""
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
+def rebuild_search_index(engine: Engine) -> bool:
+    """重建全文搜索索引（索引与 tasks 表不一致或从外部导入数据后使用）"""
+    if not search.ensure_index(engine):
+        return False
+    with engine.begin() as conn:
+        search.rebuild(conn)
+    return True
+
+
+def side_tables_ready(engine: Engine) -> bool:
+    """项目计数表和任务就绪状态是否已按现有数据建立过"""
+    with Session(bind=engine) as db:
+        return db.get(models.AppState, SIDE_TABLES_KEY) is not None
+
+
+def rebuild_side_tables(engine: Engine) -> None:
+    """按 tasks / dependencies 表重建项目计数表和任务就绪状态（两次全表聚合），并记下标记"""
+    with Session(bind=engine) as db:
+        project_stats.rebuild(db)
+        task_readiness.rebuild(db)
+        db.merge(models.AppState(key=SIDE_TABLES_KEY, value=1))
+        db.commit()
+
+
+def upgrade_schema(engine: Engine) -> dict:
+    result = migrate(engine)
+    ensure_indexes(engine)
+    search.ensure_index(engine)
+    archive.ensure_triggers(engine)
+    with engine.connect() as conn:
+        # 让查询规划器根据新索引更新统计信息
+        conn.execute(text("PRAGMA optimize"))
+    return result
+
+
+if __name__ == "__main__":
+    from database import DB_PATH, engine
+
+    parser = argparse.ArgumentParser(description="升级数据库结构")
+    parser.add_argument("--status", action="store_true", help="只查看各迁移的状态")
+    parser.add_argument("--backup", nargs="?", const="", metavar="PATH", help="只备份数据库（默认写到数据库所在目录）")
+    parser.add_argument("--no-backup", action="store_true", help="执行迁移前不备份")
+    parser.add_argument("--rebuild-search", action="store_true", help="重建全文搜索索引")
+    parser.add_argument("--rebuild-counts", action="store_true", help="重建项目计数表和任务就绪状态")
+    args = parser.parse_args()
+
+    print(f"数据库文件：{DB_PATH}")
+    if args.backup is not None:
+        print(f"✓ 已备份到 {backup_database(engine, args.backup or None)}")
+    elif args.status:
+        for item in migration_status(engine):
+            print(f"  {item['version']:>3}  {item['name']:<24} {item['state']:<8} {item['applied_at'] or ''}")
+    else:
+        models.Base.metadata.create_all(bind=engine)
+        result = migrate(engine, backup=MIGRATION_BACKUP and not args.no_backup)
+        if result["backup"]:
+            print(f"✓ 迁移前已备份到 {result['backup']}")
+        print(f"✓ 已执行迁移：{', '.join(result['applied'])}" if result["applied"] else "✓ 没有需要执行的迁移")
+        upgrade_schema(engine)
+        print("✓ 索引已补齐")
+        if args.rebuild_search:
+            if rebuild_search_index(engine):
+                print("✓ 全文搜索索引已重建")
+            else:
+                print("✗ 当前 SQLite 不支持 FTS5 trigram 分词，无法建立全文搜索索引")
+        if args.rebuild_counts or result["applied"]:
+            rebuild_side_tables(engine)
+            print("✓ 项目计数表和任务就绪状态已重建")
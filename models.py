@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -19,6 +19,15 @@ class Project(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # 按项目过滤、按项目+状态统计
+        Index("ix_tasks_project_status", "project_id", "status"),
+        Index("ix_tasks_status", "status"),
+        # 按创建时间游标分页
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        # 任务ID不复用：归档的任务恢复时保留原ID
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -26,6 +35,8 @@ class Task(Base):
     status = Column(String(20), default="pending")  # pending, in_progress, completed
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 最近一次变为 completed 的时间，由 tasks 表上的触发器维护（见 archive.py）
+    completed_at = Column(DateTime(timezone=True))
 
     # 所属项目
     project = relationship("Project", back_populates="tasks")
@@ -45,8 +56,24 @@ class Task(Base):
     )
 
 
+# 任务列表查询使用的列（不加载 ORM 实体）
+TASK_COLUMNS = (
+    Task.id,
+    Task.title,
+    Task.description,
+    Task.status,
+    Task.project_id,
+    Task.created_at,
+)
+
+
 class Dependency(Base):
     __tablename__ = "dependencies"
+    __table_args__ = (
+        # 同一对依赖只能存在一条；也用于按 task_id 查询
+        Index("uq_dependencies_task_depends_on", "task_id", "depends_on_id", unique=True),
+        Index("ix_dependencies_depends_on_id", "depends_on_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
@@ -56,3 +83,133 @@ class Dependency(Base):
     dependent = relationship("Task", foreign_keys=[task_id], back_populates="dependencies")
     # depends_on_id 指向的任务
     prerequisite = relationship("Task", foreign_keys=[depends_on_id], back_populates="dependents")
+
+
+class ArchivedTask(Base):
+    """归档的已完成任务，保留原任务ID"""
+    __tablename__ = "archived_tasks"
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String(200), nullable=False)
+    description = Column(Text)
+    status = Column(String(20))
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# 归档任务查询使用的列，与 TASK_COLUMNS 一一对应
+ARCHIVED_TASK_COLUMNS = (
+    ArchivedTask.id,
+    ArchivedTask.title,
+    ArchivedTask.description,
+    ArchivedTask.status,
+    ArchivedTask.project_id,
+    ArchivedTask.created_at,
+)
+
+
+class ArchivedDependency(Base):
+    """随任务归档的依赖关系（至少一端是归档任务）"""
+    __tablename__ = "archived_dependencies"
+    __table_args__ = (
+        Index("uq_archived_dependencies_task_depends_on", "task_id", "depends_on_id", unique=True),
+        Index("ix_archived_dependencies_depends_on_id", "depends_on_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    depends_on_id = Column(Integer, nullable=False)
+
+
+class ProjectTaskCount(Base):
+    """项目任务计数（按状态），由任务写接口增量维护"""
+    __tablename__ = "project_task_counts"
+
+    project_id = Column(Integer, ForeignKey("projects.id"), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class TaskReadiness(Base):
+    """任务就绪状态：未完成的前置任务数，由任务和依赖写接口增量维护"""
+    __tablename__ = "task_readiness"
+    __table_args__ = (
+        # 就绪任务 = (project_id, completed=False, unfinished_prerequisites=0) 的等值查找
+        Index("ix_task_readiness_project_state", "project_id", "completed", "unfinished_prerequisites"),
+    )
+
+    task_id = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    completed = Column(Boolean, nullable=False, default=False)
+    unfinished_prerequisites = Column(Integer, nullable=False, default=0)
+
+
+class Change(Base):
+    """变更记录：每次写操作追加一行，revision 单调递增，供客户端增量同步"""
+    __tablename__ = "changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    revision = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(20), nullable=False)  # task, project, dependency
+    op = Column(String(10), nullable=False)      # created, updated, deleted, archived, restored
+    entity_id = Column(Integer, nullable=False)
+    project_id = Column(Integer, index=True)
+    # 依赖关系变更时记录边的两端
+    task_id = Column(Integer)
+    depends_on_id = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AppState(Base):
+    """应用内部状态（键值对）"""
+    __tablename__ = "app_state"
+
+    key = Column(String(100), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class BackgroundJob(Base):
+    """项目的分批后台作业（见 project_jobs.py）：多进程部署时任一进程都能查询进度"""
+    __tablename__ = "background_jobs"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(20), nullable=False)    # delete_project, move_tasks, merge_project
+    running = Column(Boolean, nullable=False, default=True)
+    project_id = Column(Integer)
+    target_project_id = Column(Integer)
+    batch_size = Column(Integer, nullable=False)
+    total_tasks = Column(Integer)
+    # ISO 8601（UTC，精确到秒），与接口返回的格式相同
+    started_at = Column(String(32), nullable=False)
+    finished_at = Column(String(32))
+    batches = Column(Integer, nullable=False, default=0)
+    tasks = Column(Integer, nullable=False, default=0)
+    archived_tasks = Column(Integer, nullable=False, default=0)
+    dependencies = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+
+class JobClaim(Base):
+    """运行中的后台作业对项目的占用：每个项目一行，作业结束时删除"""
+    __tablename__ = "job_claims"
+
+    project_id = Column(Integer, primary_key=True, autoincrement=False)
+    job_id = Column(Integer, nullable=False)
+    # 执行作业的进程每批更新一次；超过 TASK_MANAGER_JOB_STALE_SECONDS 未更新视为该进程已退出
+    heartbeat_at = Column(String(32), nullable=False)
+
+
+class SchemaMigration(Base):
+    """已执行的数据库迁移（见 migrations.py），applied_at 为空表示正在分批执行"""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100), nullable=False)
+    # 分批改写数据时已处理到的任务 / 依赖ID，中断后从这里继续
+    cursor = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    applied_at = Column(DateTime(timezone=True))
@@ -0,0 +1,142 @@
+"""
+任务列表的键集（游标）分页与 NDJSON 流式输出
+
+游标是不透明字符串，编码了排序字段和最后一行的 (排序值, id)，
+下一页通过 WHERE (排序值, id) > (游标值) 定位，不使用 OFFSET，翻页代价与页码无关。
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from sqlalchemy import String, and_, literal, or_, select, type_coerce, union_all
+from sqlalchemy.sql import Select
+
+import models
+from database import SessionLocal
+from serialization import dumps
+
+ORDER_FIELDS = {
+    "id": models.Task.id,
+    "created_at": models.Task.created_at,
+}
+
+# 流式输出时每次从数据库游标读取的行数
+STREAM_BATCH_SIZE = 1000
+
+# created_at 按 SQLite 中存储的文本比较：
+# server_default 写入的 CURRENT_TIMESTAMP 不带微秒，直接绑定 datetime 参数会带上 ".000000" 导致比较错位
+CREATED_AT_TEXT = type_coerce(models.Task.created_at, String)
+
+
+def db_datetime(value: datetime) -> str:
+    """转换为与 tasks.created_at 存储格式一致的文本（CURRENT_TIMESTAMP 为 UTC）"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    fmt = "%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S"
+    return value.strftime(fmt)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order_by: str, row) -> str:
+    value = getattr(row, order_by)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([order_by, value, row.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        field, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursor("无效的分页游标")
+    if field != order_by:
+        raise InvalidCursor("分页游标与排序字段不一致")
+    if order_by == "created_at" and value is not None:
+        value = datetime.fromisoformat(value)
+    return value, last_id
+
+
+def archivable_tasks():
+    """活跃任务与归档任务的并集（多一列 archived），供 include_archived 查询使用"""
+    return union_all(
+        select(*models.TASK_COLUMNS, literal(False).label("archived")),
+        select(*models.ARCHIVED_TASK_COLUMNS, literal(True).label("archived")),
+    ).subquery("archivable_tasks")
+
+
+def build_task_query(
+    project_id: Optional[int] = None,
+    statuses: Optional[list] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    order_by: str = "id",
+    cursor: Optional[str] = None,
+    include_archived: bool = False,
+    until: Optional[str] = None,
+) -> Select:
+    """
+    按过滤条件和游标构造任务查询（按 (排序字段, id) 升序）
+    include_archived 时同时查询归档任务，结果多一列 archived
+    until 为游标时只查询到该游标所在的行（含）为止
+    """
+    if include_archived:
+        source = archivable_tasks()
+        stmt = select(source)
+        columns = source.c
+        created_at_text = type_coerce(columns.created_at, String)
+    else:
+        stmt = select(*models.TASK_COLUMNS)
+        columns = models.Task.__table__.c
+        created_at_text = CREATED_AT_TEXT
+    if project_id is not None:
+        stmt = stmt.where(columns.project_id == project_id)
+    if statuses:
+        stmt = stmt.where(columns.status.in_(statuses))
+    if created_after is not None:
+        stmt = stmt.where(created_at_text >= db_datetime(created_after))
+    if created_before is not None:
+        stmt = stmt.where(created_at_text < db_datetime(created_before))
+
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, order_by)
+        if order_by == "id":
+            stmt = stmt.where(columns.id > last_id)
+        else:
+            value = db_datetime(value)
+            stmt = stmt.where(or_(
+                created_at_text > value,
+                and_(created_at_text == value, columns.id > last_id)
+            ))
+    if until is not None:
+        value, last_id = decode_cursor(until, order_by)
+        if order_by == "id":
+            stmt = stmt.where(columns.id <= last_id)
+        else:
+            value = db_datetime(value)
+            stmt = stmt.where(or_(
+                created_at_text < value,
+                and_(created_at_text == value, columns.id <= last_id)
+            ))
+
+    if order_by == "id":
+        return stmt.order_by(columns.id)
+    return stmt.order_by(columns[ORDER_FIELDS[order_by].key], columns.id)
+
+
+def stream_ndjson(stmt: Select, limit: Optional[int] = None) -> Iterator[bytes]:
+    """
+    逐行输出 NDJSON
+    使用独立会话和服务端游标分批读取（yield_per），内存占用与结果行数无关
+    """
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    with SessionLocal() as db:
+        result = db.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for partition in result.partitions():
+            yield b"".join(dumps(row._asdict()) + b"\n" for row in partition)
@@ -0,0 +1,404 @@
+"""
+项目的分批后台作业：级联删除项目、批量移动任务、合并项目
+
+作业在后台线程中按批执行（每批 TASK_MANAGER_JOB_BATCH_SIZE 个任务），每批一个短事务
+（组提交开启时经写入线程执行），批与批之间暂停 TASK_MANAGER_JOB_BATCH_PAUSE_MS，
+其他写请求在批间取得写锁；进度由 GET /api/jobs/{id} 查询。
+
+- 级联删除：逐批删除项目的任务及其全部依赖关系（包括与其他项目任务之间的依赖），
+  再逐批删除项目的归档任务；项目内没有任何任务后在同一事务中删除项目
+- 移动任务：逐批修改任务的 project_id，依赖关系不变；变更日志对原项目和目标项目各记一行，
+  原项目的增量同步客户端移除这些任务，目标项目的客户端加入这些任务及其依赖
+- 合并项目：把项目的全部任务（包括归档任务）移动到目标项目，最后删除原项目
+
+作业运行期间仍可在项目中新建任务，级联删除和合并在项目变空后才结束；
+涉及同一项目的作业同一时刻只运行一个（多进程部署时也是如此）。作业在启动它的进程中执行，
+状态保存在数据库中（保留最近 JOB_HISTORY 个已结束的作业），任一进程都能查询。
+"""
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import models
+import project_stats
+import task_readiness
+import change_log
+import graph_index
+from archive import edges_with_projects
+from database import SessionLocal, after_commit
+from graph_layout import layout_cache
+from response_cache import response_cache
+from write_queue import run_write
+
+JOB_BATCH_SIZE = int(os.environ.get("TASK_MANAGER_JOB_BATCH_SIZE", "500"))
+# 批与批之间的暂停（毫秒），让其他写请求取得写锁
+JOB_BATCH_PAUSE = float(os.environ.get("TASK_MANAGER_JOB_BATCH_PAUSE_MS", "50")) / 1000
+# 保留状态的已结束作业数
+JOB_HISTORY = 50
+# 运行中的作业超过这么久（秒）没有完成一批，视为执行它的进程已退出，项目可被新作业领取
+JOB_STALE = float(os.environ.get("TASK_MANAGER_JOB_STALE_SECONDS", "300"))
+
+DELETE_PROJECT = "delete_project"
+MOVE_TASKS = "move_tasks"
+MERGE_PROJECT = "merge_project"
+
+
+class JobError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+# ==================== 分批操作（每次调用提交一批） ====================
+
+def _touches(task_ids: Sequence[int]):
+    return or_(models.Dependency.task_id.in_(task_ids), models.Dependency.depends_on_id.in_(task_ids))
+
+
+def _invalidate(db: Session, projects) -> None:
+    after_commit(db, response_cache.invalidate, *projects)
+    after_commit(db, layout_cache.invalidate, *projects)
+
+
+def _delete_project_row(db: Session, project_id: int) -> None:
+    """删除已没有任何任务的项目（不提交）"""
+    db.query(models.ProjectTaskCount).filter(models.ProjectTaskCount.project_id == project_id).delete()
+    db.query(models.Project).filter(models.Project.id == project_id).delete()
+    change_log.record(db, "project", "deleted", project_id, [project_id])
+    _invalidate(db, [project_id])
+
+
+def _project_task_ids(db: Session, model, project_id: int, limit: int) -> List[int]:
+    return db.execute(
+        select(model.id).where(model.project_id == project_id).order_by(model.id).limit(limit)
+    ).scalars().all()
+
+
+def delete_batch(db: Session, project_id: int, batch_size: int = JOB_BATCH_SIZE) -> Dict[str, int]:
+    """
+    删除项目的一批任务及其依赖关系并提交；活跃任务删完后删除归档任务，
+    全部删完后删除项目本身（返回的 done 为 True）
+    """
+    task_ids = _project_task_ids(db, models.Task, project_id, batch_size)
+    if task_ids:
+        tasks = db.query(models.Task.id, models.Task.status).filter(models.Task.id.in_(task_ids)).all()
+        edges = edges_with_projects(db, models.Dependency, _touches(task_ids))
+        deleted = set(task_ids)
+        # 依赖被删任务的其他项目任务：少了前置任务，需要重算
+        dependents = {edge.task_id for edge in edges if edge.task_id not in deleted}
+
+        db.execute(delete(models.Dependency).where(_touches(task_ids)))
+        db.execute(delete(models.Task).where(models.Task.id.in_(task_ids)))
+        for status, count in Counter(task.status for task in tasks).items():
+            project_stats.adjust(db, project_id, status, -count)
+        task_readiness.refresh(db, task_ids=deleted | dependents)
+
+        entries = [
+            {"entity": "task", "op": "deleted", "entity_id": task.id, "project_ids": [project_id]}
+            for task in tasks
+        ]
+        entries.extend(
+            {
+                "entity": "dependency", "op": "deleted", "entity_id": edge.id,
+                "project_ids": [edge.task_project_id, edge.prerequisite_project_id],
+                "task_id": edge.task_id, "depends_on_id": edge.depends_on_id,
+            }
+            for edge in edges
+        )
+        change_log.record_many(db, entries)
+
+        projects = {project_id}
+        for edge in edges:
+            projects.update((edge.task_project_id, edge.prerequisite_project_id))
+            graph_index.stage(db, "remove_edge", edge.task_id, edge.depends_on_id)
+        _invalidate(db, projects)
+        db.commit()
+        return {"tasks": len(tasks), "dependencies": len(edges), "archived_tasks": 0, "done": False}
+
+    archived_ids = _project_task_ids(db, models.ArchivedTask, project_id, batch_size)
+    if archived_ids:
+        db.execute(delete(models.ArchivedDependency).where(or_(
+            models.ArchivedDependency.task_id.in_(archived_ids),
+            models.ArchivedDependency.depends_on_id.in_(archived_ids),
+        )))
+        db.execute(delete(models.ArchivedTask).where(models.ArchivedTask.id.in_(archived_ids)))
+        db.commit()
+        return {"tasks": 0, "dependencies": 0, "archived_tasks": len(archived_ids), "done": False}
+
+    if db.get(models.Project, project_id) is not None:
+        _delete_project_row(db, project_id)
+        db.commit()
+    return {"tasks": 0, "dependencies": 0, "archived_tasks": 0, "done": True}
+
+
+def _move_tasks(db: Session, tasks: list, target_project_id: int) -> int:
+    """把 tasks（id, project_id, status）移动到目标项目（不提交），返回涉及的依赖数"""
+    task_ids = [task.id for task in tasks]
+    db.execute(update(models.Task).where(models.Task.id.in_(task_ids)).values(project_id=target_project_id))
+    for (project_id, status), count in Counter((task.project_id, task.status) for task in tasks).items():
+        project_stats.adjust(db, project_id, status, -count)
+        project_stats.adjust(db, target_project_id, status, count)
+    task_readiness.refresh(db, task_ids=task_ids)
+
+    # 移动后查询，edge 上是两端的新项目ID
+    edges = edges_with_projects(db, models.Dependency, _touches(task_ids))
+    old_projects = {task.id: task.project_id for task in tasks}
+    entries = [
+        {"entity": "task", "op": "updated", "entity_id": task.id,
+         "project_ids": [task.project_id, target_project_id]}
+        for task in tasks
+    ]
+    projects = set(old_projects.values()) | {target_project_id}
+    for edge in edges:
+        # 对两端的原项目和新项目各记一行，目标项目的客户端据此加入随任务移入的依赖
+        edge_projects = [
+            edge.task_project_id,
+            edge.prerequisite_project_id,
+            old_projects.get(edge.task_id, edge.task_project_id),
+            old_projects.get(edge.depends_on_id, edge.prerequisite_project_id),
+        ]
+        projects.update(edge_projects)
+        entries.append({
+            "entity": "dependency", "op": "updated", "entity_id": edge.id, "project_ids": edge_projects,
+            "task_id": edge.task_id, "depends_on_id": edge.depends_on_id,
+        })
+    change_log.record_many(db, entries)
+    _invalidate(db, projects)
+    return len(edges)
+
+
+def _require_target(db: Session, target_project_id: int) -> None:
+    if db.get(models.Project, target_project_id) is None:
+        raise JobError("目标项目不存在", status_code=404)
+
+
+def move_batch(db: Session, task_ids: Sequence[int], target_project_id: int) -> Dict[str, int]:
+    """把一批任务移动到目标项目并提交；不存在或已在目标项目中的任务计入 skipped"""
+    _require_target(db, target_project_id)
+    tasks = db.query(models.Task.id, models.Task.project_id, models.Task.status).filter(
+        models.Task.id.in_(task_ids),
+        models.Task.project_id != target_project_id,
+    ).all()
+    dependencies = _move_tasks(db, tasks, target_project_id) if tasks else 0
+    db.commit()
+    return {"tasks": len(tasks), "dependencies": dependencies, "skipped": len(task_ids) - len(tasks)}
+
+
+def merge_batch(
+    db: Session, project_id: int, target_project_id: int, batch_size: int = JOB_BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    把项目的一批任务移动到目标项目并提交；活跃任务移完后移动归档任务，
+    全部移完后删除原项目（返回的 done 为 True）
+    """
+    _require_target(db, target_project_id)
+    task_ids = _project_task_ids(db, models.Task, project_id, batch_size)
+    if task_ids:
+        tasks = db.query(models.Task.id, models.Task.project_id, models.Task.status).filter(
+            models.Task.id.in_(task_ids)
+        ).all()
+        dependencies = _move_tasks(db, tasks, target_project_id)
+        db.commit()
+        return {"tasks": len(tasks), "dependencies": dependencies, "archived_tasks": 0, "done": False}
+
+    archived_ids = _project_task_ids(db, models.ArchivedTask, project_id, batch_size)
+    if archived_ids:
+        # 归档任务不在活跃数据中，改项目ID即可，恢复时回到目标项目
+        db.execute(
+            update(models.ArchivedTask)
+            .where(models.ArchivedTask.id.in_(archived_ids))
+            .values(project_id=target_project_id)
+        )
+        db.commit()
+        return {"tasks": 0, "dependencies": 0, "archived_tasks": len(archived_ids), "done": False}
+
+    if db.get(models.Project, project_id) is not None:
+        _delete_project_row(db, project_id)
+        _invalidate(db, [target_project_id])
+        db.commit()
+    return {"tasks": 0, "dependencies": 0, "archived_tasks": 0, "done": True}
+
+
+def _project_total(db: Session, project_id: int) -> int:
+    """项目当前的活跃任务数与归档任务数之和"""
+    active = sum(project_stats.get_counts(db, [project_id]).get(project_id, {}).values())
+    archived = db.query(func.count(models.ArchivedTask.id)).filter(
+        models.ArchivedTask.project_id == project_id
+    ).scalar()
+    return active + archived
+
+
+# ==================== 作业 ====================
+# 作业状态保存在 background_jobs 表中，任一进程都能查询；作业对项目的占用记在 job_claims 表中，
+# 与定期归档领取周期一样用单条 UPSERT 原子领取，多个进程同时对同一项目启动作业时只有一个成功。
+# 执行作业的进程每批更新一次心跳，进程退出后占用在 JOB_STALE 秒后失效，可被新作业领取。
+
+JOB_FIELDS = [column.key for column in models.BackgroundJob.__table__.columns]
+PROGRESS_KEYS = ("tasks", "archived_tasks", "dependencies", "skipped")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _status(job: models.BackgroundJob) -> dict:
+    return {column: getattr(job, column) for column in JOB_FIELDS}
+
+
+def create_job(db: Session, kind: str, projects: Sequence[int], fields: dict) -> dict:
+    """
+    新建作业并领取涉及的项目（不提交），返回作业状态；
+    项目已被其他运行中的作业占用（心跳未超时）时回滚并抛出 JobError（409）
+    """
+    now = _now()
+    job = models.BackgroundJob(
+        kind=kind, running=True, started_at=now, batches=0, **{key: 0 for key in PROGRESS_KEYS}, **fields
+    )
+    db.add(job)
+    db.flush()
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE)).isoformat(timespec="seconds")
+    for project_id in sorted(projects):
+        stmt = sqlite_insert(models.JobClaim).values(project_id=project_id, job_id=job.id, heartbeat_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["project_id"],
+            set_={"job_id": stmt.excluded.job_id, "heartbeat_at": stmt.excluded.heartbeat_at},
+            where=models.JobClaim.heartbeat_at < stale,
+        )
+        if db.execute(stmt).rowcount != 1:
+            db.rollback()
+            raise JobError("项目有正在运行的后台作业", status_code=409)
+
+    # 心跳超时的作业（所在进程已退出）标为结束
+    db.execute(
+        update(models.BackgroundJob)
+        .where(models.BackgroundJob.running.is_(True), models.BackgroundJob.id != job.id)
+        .where(~models.BackgroundJob.id.in_(select(models.JobClaim.job_id)))
+        .values(running=False, finished_at=now, error="执行作业的进程已退出")
+        .execution_options(synchronize_session=False)
+    )
+    # 只保留最近 JOB_HISTORY 个已结束的作业
+    kept = select(models.BackgroundJob.id).where(models.BackgroundJob.running.is_(False)).order_by(
+        models.BackgroundJob.id.desc()
+    ).limit(JOB_HISTORY)
+    db.execute(
+        delete(models.BackgroundJob)
+        .where(models.BackgroundJob.running.is_(False), ~models.BackgroundJob.id.in_(kept))
+        .execution_options(synchronize_session=False)
+    )
+    return _status(job)
+
+
+def record_progress(db: Session, job_id: int, counts: Dict[str, int]) -> None:
+    """累加一批的计数并更新心跳"""
+    values = {key: getattr(models.BackgroundJob, key) + counts.get(key, 0) for key in PROGRESS_KEYS}
+    db.execute(
+        update(models.BackgroundJob).where(models.BackgroundJob.id == job_id)
+        .values(batches=models.BackgroundJob.batches + 1, **values)
+    )
+    db.execute(update(models.JobClaim).where(models.JobClaim.job_id == job_id).values(heartbeat_at=_now()))
+    db.commit()
+
+
+def set_total(db: Session, job_id: int, total_tasks: int) -> None:
+    db.execute(update(models.BackgroundJob).where(models.BackgroundJob.id == job_id).values(total_tasks=total_tasks))
+    db.commit()
+
+
+def finish_job(db: Session, job_id: int, error: Optional[str]) -> None:
+    """标记作业结束并释放对项目的占用"""
+    db.execute(
+        update(models.BackgroundJob).where(models.BackgroundJob.id == job_id)
+        .values(running=False, finished_at=_now(), error=error)
+    )
+    db.execute(delete(models.JobClaim).where(models.JobClaim.job_id == job_id))
+    db.commit()
+
+
+class ProjectJob:
+    """在本进程的后台线程中分批执行一个已登记的作业，进度写入 background_jobs"""
+
+    def __init__(self, status: dict, task_ids: Sequence[int] = ()):
+        self.job_id = status["id"]
+        self.kind = status["kind"]
+        self.project_id = status["project_id"]
+        self.target_project_id = status["target_project_id"]
+        self.batch_size = status["batch_size"]
+        self.task_ids = list(task_ids)
+
+    def _batches(self):
+        """依次执行每一批，产出每批的计数"""
+        if self.kind == MOVE_TASKS:
+            for start in range(0, len(self.task_ids), self.batch_size):
+                yield run_write(move_batch, self.task_ids[start:start + self.batch_size], self.target_project_id)
+            return
+        if self.kind == DELETE_PROJECT:
+            batch_fn, args = delete_batch, (self.project_id, self.batch_size)
+        else:
+            batch_fn, args = merge_batch, (self.project_id, self.target_project_id, self.batch_size)
+        while True:
+            counts = run_write(batch_fn, *args)
+            if counts["done"]:
+                return
+            yield counts
+
+    def run(self) -> None:
+        error = None
+        try:
+            if self.kind != MOVE_TASKS:
+                with SessionLocal() as db:
+                    total = _project_total(db, self.project_id)
+                run_write(set_total, self.job_id, total)
+            for counts in self._batches():
+                run_write(record_progress, self.job_id, counts)
+                time.sleep(JOB_BATCH_PAUSE)
+        except Exception as e:
+            error = e.message if isinstance(e, JobError) else f"{type(e).__name__}: {e}"
+        finally:
+            run_write(finish_job, self.job_id, error)
+
+
+class JobRegistry:
+    """作业的启动与查询：每个作业在启动它的进程中由一个后台线程执行，状态在数据库中"""
+
+    def start(self, db: Session, kind: str, project_id: Optional[int] = None, target_project_id: Optional[int] = None,
+              task_ids: Sequence[int] = (), batch_size: Optional[int] = None) -> dict:
+        """
+        在请求的会话中登记作业并提交，提交后在后台线程中开始执行，返回其初始状态；
+        项目已有运行中的作业时抛出 JobError（409）
+        """
+        projects = {project_id, target_project_id} - {None}
+        status = create_job(db, kind, projects, {
+            "project_id": project_id,
+            "target_project_id": target_project_id,
+            "batch_size": batch_size or JOB_BATCH_SIZE,
+            "total_tasks": len(task_ids) if kind == MOVE_TASKS else None,
+        })
+        job = ProjectJob(status, task_ids)
+        # 组提交时接口在写入线程中执行：作业的各批要排在本组提交之后
+        thread = threading.Thread(target=job.run, name=f"project-job-{job.job_id}", daemon=True)
+        after_commit(db, thread.start)
+        db.commit()
+        return status
+
+    def get(self, job_id: int) -> Optional[dict]:
+        with SessionLocal() as db:
+            job = db.get(models.BackgroundJob, job_id)
+            return _status(job) if job is not None else None
+
+    def list(self) -> List[dict]:
+        """运行中的和最近 JOB_HISTORY 个已结束的作业，最新的在前"""
+        with SessionLocal() as db:
+            rows = db.query(models.BackgroundJob).order_by(models.BackgroundJob.id.desc()).all()
+            return [_status(job) for job in rows]
+
+
+# 进程级共享实例
+jobs = JobRegistry()
@@ -0,0 +1,109 @@
+"""
+项目任务计数
+
+project_task_counts 表按 (project_id, status) 保存任务数量，
+创建、删除、更新状态以及移动任务时在同一事务内增量调整，
+读取项目统计只需扫描计数表，不再对 tasks 表逐项目 COUNT(*)。
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+import models
+
+DEFAULT_STATUS = "pending"
+
+
+def status_key(status: Optional[str]) -> str:
+    return status or DEFAULT_STATUS
+
+
+def adjust(db: Session, project_id: int, status: Optional[str], delta: int) -> None:
+    """调整某项目某状态的任务数（不提交，随调用方事务一起生效）"""
+    if delta == 0:
+        return
+    stmt = insert(models.ProjectTaskCount).values(
+        project_id=project_id, status=status_key(status), count=delta
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["project_id", "status"],
+        set_={"count": models.ProjectTaskCount.count + stmt.excluded.count},
+    )
+    db.execute(stmt)
+
+
+def task_created(db: Session, project_id: int, status: Optional[str]) -> None:
+    adjust(db, project_id, status, 1)
+
+
+def task_deleted(db: Session, project_id: int, status: Optional[str]) -> None:
+    adjust(db, project_id, status, -1)
+
+
+def task_changed(
+    db: Session,
+    old_project_id: int,
+    old_status: Optional[str],
+    new_project_id: int,
+    new_status: Optional[str],
+) -> None:
+    """任务状态变化或移动到其他项目"""
+    if old_project_id == new_project_id and status_key(old_status) == status_key(new_status):
+        return
+    adjust(db, old_project_id, old_status, -1)
+    adjust(db, new_project_id, new_status, 1)
+
+
+def get_counts(db: Session, project_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, int]]:
+    """读取计数：{project_id: {status: count}}"""
+    query = db.query(
+        models.ProjectTaskCount.project_id,
+        models.ProjectTaskCount.status,
+        models.ProjectTaskCount.count,
+    ).filter(models.ProjectTaskCount.count != 0)
+    if project_ids is not None:
+        query = query.filter(models.ProjectTaskCount.project_id.in_(list(project_ids)))
+
+    result: Dict[int, Dict[str, int]] = {}
+    for project_id, status, count in query:
+        result.setdefault(project_id, {})[status] = count
+    return result
+
+
+def _fresh_counts(db: Session) -> List:
+    """按 tasks 表分组聚合：[(project_id, status, count)]"""
+    status = func.coalesce(models.Task.status, DEFAULT_STATUS)
+    return (
+        db.query(models.Task.project_id, status, func.count(models.Task.id))
+        .group_by(models.Task.project_id, status)
+        .all()
+    )
+
+
+def rebuild(db: Session) -> None:
+    """从 tasks 表一次分组聚合重建全部计数（用于初始化已有数据库）"""
+    db.query(models.ProjectTaskCount).delete()
+    rows = _fresh_counts(db)
+    if rows:
+        db.execute(
+            insert(models.ProjectTaskCount),
+            [
+                {"project_id": project_id, "status": status_value, "count": count}
+                for project_id, status_value, count in rows
+            ],
+        )
+    db.commit()
+
+
+def check_consistency(db: Session) -> List[int]:
+    """将计数表与从 tasks 表聚合的结果比对，返回计数不一致的项目"""
+    fresh: Dict[int, Dict[str, int]] = {}
+    for project_id, status, count in _fresh_counts(db):
+        fresh.setdefault(project_id, {})[status] = count
+    stored = get_counts(db)
+    return sorted(
+        project_id for project_id in fresh.keys() | stored.keys()
+        if fresh.get(project_id) != stored.get(project_id)
+    )
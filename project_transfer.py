@@ -0,0 +1,482 @@
+"""
+项目导出与导入
+
+导出（GET /api/projects/{id}/export）：项目、任务和项目内的依赖边以 NDJSON 或 CSV 流式输出，
+使用独立会话在一个读事务内分批读取（yield_per），内存占用与任务数无关，导出内容是同一时刻的快照。
+
+- NDJSON：每行一条记录，type 为 project（首行）、task、dependency，末行 end 记录行数，
+  导入时据此发现被截断的文件
+- CSV：每行一个任务，depends_on 列为该任务依赖的任务ID（空格分隔），没有项目信息
+- 两端不在同一项目的依赖边不导出；只导出活跃任务（不含归档任务）
+
+导入（POST /api/projects/import）：新建项目，任务ID重新分配，依赖边按新ID写入：
+
+1. 请求体边接收边写入临时文件（SpooledTemporaryFile），网络传输期间不占用写锁
+2. 逐行解析，任务每 TASK_MANAGER_IMPORT_BATCH_SIZE 个一批插入（多行 VALUES），
+   新ID在自增序列和已用过的最大ID之后连续分配，记录旧ID到新ID的映射；依赖边先收集（只保存ID对）
+3. 全部任务写入后映射依赖边，在依赖索引上做一次环检测，再分批插入依赖边
+4. 项目计数、就绪状态、变更日志和索引随同一事务更新，任一步失败整体回滚；
+   变更记录多于变更日志的保留条数时只记项目一条并推进压缩水位（见 ProjectImporter._log）
+
+created_at / completed_at 按导出的值写入（存为与 CURRENT_TIMESTAMP 相同的文本格式）；
+缺少 created_at 时使用导入时间。
+"""
+import codecs
+import csv
+import io
+import os
+import tempfile
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import String, bindparam, func, insert, select, text, type_coerce
+from sqlalchemy.orm import Session, aliased
+
+import models
+import project_stats
+import task_readiness
+import change_log
+import graph_index
+from cache_sync import cache_sync
+from database import SessionLocal, after_commit
+from graph_index import GraphOverlay, dependency_graph
+from graph_layout import layout_cache
+from pagination import db_datetime
+from response_cache import response_cache
+from serialization import dumps, loads
+
+# 导入时每批插入的任务 / 依赖边数
+IMPORT_BATCH_SIZE = int(os.environ.get("TASK_MANAGER_IMPORT_BATCH_SIZE", "5000"))
+# 请求体在内存中暂存的上限（字节），超过后写入临时文件
+IMPORT_SPOOL_MEMORY = int(os.environ.get("TASK_MANAGER_IMPORT_SPOOL_MEMORY", str(8 * 1024 * 1024)))
+# 导出时每次从数据库游标读取的行数
+EXPORT_BATCH_SIZE = 1000
+
+FORMAT_VERSION = 1
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+CSV_COLUMNS = ("id", "title", "description", "status", "created_at", "completed_at", "depends_on")
+TASK_EXPORT_COLUMNS = (
+    models.Task.id,
+    models.Task.title,
+    models.Task.description,
+    models.Task.status,
+    models.Task.created_at,
+    models.Task.completed_at,
+)
+DEFAULT_STATUS = "pending"
+
+
+class TransferError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+# ==================== 导出 ====================
+
+def _edges_query(project_id: int):
+    """两端都在项目内的依赖边"""
+    dependent = aliased(models.Task)
+    prerequisite = aliased(models.Task)
+    return (
+        select(models.Dependency.task_id, models.Dependency.depends_on_id)
+        .join(dependent, dependent.id == models.Dependency.task_id)
+        .join(prerequisite, prerequisite.id == models.Dependency.depends_on_id)
+        .where(dependent.project_id == project_id, prerequisite.project_id == project_id)
+        .order_by(models.Dependency.id)
+    )
+
+
+def _tasks_query(project_id: int):
+    return select(*TASK_EXPORT_COLUMNS).where(models.Task.project_id == project_id).order_by(models.Task.id)
+
+
+def _partitions(db: Session, stmt):
+    return db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)).partitions()
+
+
+def export_ndjson(project_id: int) -> Iterator[bytes]:
+    """逐行输出项目、任务、依赖边和结束记录"""
+    with SessionLocal() as db:
+        project = db.get(models.Project, project_id)
+        if project is None:
+            return
+        yield dumps({
+            "type": "project",
+            "version": FORMAT_VERSION,
+            "id": project.id,
+            "name": project.name,
+            "description": project.description,
+            "color": project.color,
+        }) + b"\n"
+
+        tasks = 0
+        for partition in _partitions(db, _tasks_query(project_id)):
+            tasks += len(partition)
+            yield b"".join(dumps({"type": "task", **row._asdict()}) + b"\n" for row in partition)
+
+        dependencies = 0
+        for partition in _partitions(db, _edges_query(project_id)):
+            dependencies += len(partition)
+            yield b"".join(
+                dumps({"type": "dependency", "task_id": task_id, "depends_on_id": depends_on_id}) + b"\n"
+                for task_id, depends_on_id in partition
+            )
+        yield dumps({"type": "end", "tasks": tasks, "dependencies": dependencies}) + b"\n"
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def export_csv(project_id: int) -> Iterator[bytes]:
+    """
+    每行一个任务；依赖边按 task_id 分组拼入 depends_on 列
+    任务和依赖边都按 task_id 升序读取，两个游标归并，不需要把依赖边全部载入内存
+    """
+    dependency_order = _edges_query(project_id).order_by(None).order_by(
+        models.Dependency.task_id, models.Dependency.depends_on_id
+    )
+    with SessionLocal() as db:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(CSV_COLUMNS)
+        yield buffer.getvalue().encode()
+
+        edges = (edge for partition in _partitions(db, dependency_order) for edge in partition)
+        edge = next(edges, None)
+        for partition in _partitions(db, _tasks_query(project_id)):
+            buffer.seek(0)
+            buffer.truncate()
+            for row in partition:
+                while edge is not None and edge.task_id < row.id:
+                    edge = next(edges, None)
+                depends_on = []
+                while edge is not None and edge.task_id == row.id:
+                    depends_on.append(str(edge.depends_on_id))
+                    edge = next(edges, None)
+                writer.writerow([_csv_value(value) for value in row] + [" ".join(depends_on)])
+            yield buffer.getvalue().encode()
+
+
+# ==================== 导入：接收与解析 ====================
+
+async def spool_body(request) -> tempfile.SpooledTemporaryFile:
+    """把请求体边接收边写入临时文件，返回已回到开头的文件"""
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MEMORY)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _text(record: dict, key: str) -> Optional[str]:
+    value = record.get(key)
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def _timestamp(value, line: int, key: str) -> Optional[str]:
+    """ISO 8601 时间 -> 与 CURRENT_TIMESTAMP 一致的 UTC 文本"""
+    if value is None or value == "":
+        return None
+    try:
+        return db_datetime(datetime.fromisoformat(str(value)))
+    except ValueError:
+        raise TransferError(f"第 {line} 行：{key} 不是有效的时间：{value}")
+
+
+def _task_id(value, line: int, key: str) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise TransferError(f"第 {line} 行：{key} 不是整数：{value}")
+
+
+def read_ndjson(stream) -> Iterator[Tuple[int, dict]]:
+    """逐行解析 NDJSON，产出 (行号, 记录)"""
+    for line, raw in enumerate(stream, 1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            record = loads(raw)
+        except ValueError:
+            raise TransferError(f"第 {line} 行：不是有效的 JSON")
+        if not isinstance(record, dict) or record.get("type") not in ("project", "task", "dependency", "end"):
+            raise TransferError(f"第 {line} 行：未知的记录类型")
+        yield line, record
+
+
+def _decoded_lines(stream, encoding: str = "utf-8-sig") -> Iterator[str]:
+    """
+    逐行解码二进制文件（按 \\n 切分并保留行尾，相当于以 newline="" 打开的文本文件）
+    不用 io.TextIOWrapper 包装：Python 3.11 之前的 SpooledTemporaryFile 缺少它需要的方法
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for raw in stream:
+        yield decoder.decode(raw)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def read_csv(stream) -> Iterator[Tuple[int, dict]]:
+    """逐行解析 CSV（表头见 CSV_COLUMNS，至少需要 title 列），每行产出一条任务记录和它的依赖边"""
+    reader = csv.DictReader(_decoded_lines(stream))
+    if reader.fieldnames is None or "title" not in reader.fieldnames:
+        raise TransferError("CSV 缺少表头或 title 列")
+    for row in reader:
+        line = reader.line_num
+        yield line, {"type": "task", **row}
+        depends_on = (row.get("depends_on") or "").replace(",", " ").split()
+        if depends_on and not row.get("id"):
+            raise TransferError(f"第 {line} 行：有依赖的任务需要 id 列")
+        for depends_on_id in depends_on:
+            yield line, {"type": "dependency", "task_id": row["id"], "depends_on_id": depends_on_id}
+
+
+# ==================== 导入：写入 ====================
+
+def _insert_many(db: Session, stmt, rows: List[dict], *returning) -> list:
+    """
+    批量插入，返回 RETURNING 的行（顺序不定，调用方按返回的列与 rows 对应）
+    带 RETURNING 时 SQLAlchemy 按多行 VALUES 分批插入（不带时逐行执行，全文搜索触发器的开销大得多）；
+    不要求按参数顺序返回（要求时 SQLite 上逐行执行）
+    """
+    return db.execute(stmt.returning(*returning), rows).all()
+
+
+def _next_task_id(db: Session) -> int:
+    """
+    tasks 的自增序列、现有最大ID、归档任务最大ID中的最大者加一
+    导入的任务从这里起连续分配ID：不复用任何用过的ID，也不依赖 RETURNING 的返回顺序
+    """
+    sequence = db.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'")).scalar()
+    return max(
+        sequence or 0,
+        db.query(func.max(models.Task.id)).scalar() or 0,
+        db.query(func.max(models.ArchivedTask.id)).scalar() or 0,
+    ) + 1
+
+
+class ProjectImporter:
+    """按记录顺序写入一个新项目（不提交）"""
+
+    def __init__(self, db: Session, name: Optional[str] = None, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.name = name
+        self.batch_size = max(1, batch_size)
+        self.project: Optional[models.Project] = None
+        self.project_fields: dict = {}
+        self.id_map: Dict[int, int] = {}          # 导出文件中的任务ID -> 新ID
+        self.pending: List[Tuple[Optional[int], dict]] = []
+        self.edges: List[Tuple[int, int, int]] = []  # (task_id, depends_on_id, 行号)，均为旧ID
+        self.status_counts: Counter = Counter()
+        self.expected: Optional[dict] = None
+        # 逐条的变更记录，最后写入；超过变更日志的保留条数时为 None（见 _log）
+        self.changes: Optional[List[dict]] = []
+        self.revision = 0
+        self.task_count = 0
+        self.dependency_count = 0
+        self.imported_at = db_datetime(datetime.now(timezone.utc).replace(microsecond=0))
+        self.task_insert = insert(models.Task.__table__).values(
+            created_at=type_coerce(bindparam("created_text"), String),
+            completed_at=type_coerce(bindparam("completed_text"), String),
+        )
+
+    def add(self, line: int, record: dict) -> None:
+        kind = record["type"]
+        if self.expected is not None:
+            raise TransferError(f"第 {line} 行：end 记录之后还有内容")
+        if kind == "project":
+            if self.project is not None or self.task_count or self.pending:
+                raise TransferError(f"第 {line} 行：project 记录只能出现在首行")
+            self.project_fields = record
+        elif kind == "task":
+            self._add_task(line, record)
+        elif kind == "dependency":
+            task_id = _task_id(record.get("task_id"), line, "task_id")
+            depends_on_id = _task_id(record.get("depends_on_id"), line, "depends_on_id")
+            if task_id is None or depends_on_id is None:
+                raise TransferError(f"第 {line} 行：依赖缺少 task_id 或 depends_on_id")
+            self.edges.append((task_id, depends_on_id, line))
+        else:
+            self.expected = record
+
+    def _ensure_project(self) -> models.Project:
+        if self.project is not None:
+            return self.project
+        name = self.name or _text(self.project_fields, "name")
+        if not name:
+            raise TransferError("缺少项目名称（导入文件中没有 project 记录时需指定 name 参数）")
+        if self.db.query(models.Project.id).filter(models.Project.name == name).first() is not None:
+            raise TransferError("项目名已存在")
+        project = models.Project(name=name, description=_text(self.project_fields, "description"))
+        color = _text(self.project_fields, "color")
+        if color:
+            project.color = color
+        self.db.add(project)
+        self.db.flush()
+        self.project = project
+        return project
+
+    def _log(self, entries: List[dict]) -> None:
+        """
+        暂存逐条的变更记录
+        条数超过 CHANGE_LOG_RETAIN 时，写入后也会在同一事务内被压缩掉，此时不再逐条记录，
+        提交时只记项目一条并把压缩水位推进到该修订号：落后的客户端和其他工作进程全量重新加载
+        """
+        if self.changes is None:
+            return
+        self.changes.extend(entries)
+        if change_log.CHANGE_LOG_COMPACT_EVERY > 0 and len(self.changes) > change_log.CHANGE_LOG_RETAIN:
+            self.changes = None
+
+    def _add_task(self, line: int, record: dict) -> None:
+        title = _text(record, "title")
+        if not title:
+            raise TransferError(f"第 {line} 行：任务缺少 title")
+        old_id = _task_id(record.get("id"), line, "id")
+        status = _text(record, "status") or DEFAULT_STATUS
+        self.pending.append((old_id, {
+            "title": title,
+            "description": _text(record, "description"),
+            "status": status,
+            "created_text": _timestamp(record.get("created_at"), line, "created_at") or self.imported_at,
+            "completed_text": _timestamp(record.get("completed_at"), line, "completed_at"),
+            "line": line,
+        }))
+        if len(self.pending) >= self.batch_size:
+            self._flush_tasks()
+
+    def _flush_tasks(self) -> None:
+        if not self.pending:
+            return
+        project = self._ensure_project()
+        # 新建项目后本事务已持有写锁，分配的ID到提交前不会被其他写入占用
+        first_id = _next_task_id(self.db)
+        new_ids = list(range(first_id, first_id + len(self.pending)))
+        rows = []
+        for (_, fields), new_id in zip(self.pending, new_ids):
+            row = dict(fields)
+            row.pop("line")
+            row["id"] = new_id
+            row["project_id"] = project.id
+            rows.append(row)
+        _insert_many(self.db, self.task_insert, rows, models.Task.id)
+        for (old_id, fields), new_id in zip(self.pending, new_ids):
+            if old_id is not None:
+                if old_id in self.id_map:
+                    raise TransferError(f"第 {fields['line']} 行：任务ID {old_id} 重复")
+                self.id_map[old_id] = new_id
+            self.status_counts[fields["status"]] += 1
+        self._log([
+            {"entity": "task", "op": "created", "entity_id": new_id, "project_ids": [project.id]}
+            for new_id in new_ids
+        ])
+        self.task_count += len(rows)
+        self.pending = []
+
+    def finish(self) -> dict:
+        self._flush_tasks()
+        project = self._ensure_project()
+        if self.expected is not None and (
+            self.expected.get("tasks") != self.task_count or self.expected.get("dependencies") != len(self.edges)
+        ):
+            raise TransferError("导入文件不完整：行数与 end 记录不一致")
+
+        # 映射依赖边并去重
+        edges = {}
+        for task_id, depends_on_id, line in self.edges:
+            for old_id in (task_id, depends_on_id):
+                if old_id not in self.id_map:
+                    raise TransferError(f"第 {line} 行：依赖引用了不存在的任务 {old_id}")
+            if task_id == depends_on_id:
+                raise TransferError(f"第 {line} 行：任务不能依赖自己")
+            edges.setdefault((self.id_map[task_id], self.id_map[depends_on_id]), line)
+        self.edges = []
+
+        # 新任务与已有任务之间没有边，环只可能在导入的边之间；在依赖索引上一次检测
+        if edges:
+            dependency_graph.ensure_loaded(self.db)
+            # 读事务已开始：应用其他进程已提交的依赖修改，索引不早于本事务看到的数据
+            cache_sync.sync()
+            overlay = GraphOverlay(base=graph_index.group_overlay(self.db))
+            for task_id, depends_on_id in edges:
+                overlay.add_edge(task_id, depends_on_id)
+            cycle = dependency_graph.find_cycle(list(overlay.added), overlay)
+            if cycle is not None:
+                old_ids = {new_id: old_id for old_id, new_id in self.id_map.items()}
+                nodes = [task_id for task_id, _ in cycle] + [cycle[-1][1]]
+                path = " -> ".join(str(old_ids.get(task_id, task_id)) for task_id in nodes)
+                raise TransferError(f"无法导入：依赖关系存在循环（{path}）")
+
+        edge_list = list(edges)
+        for start in range(0, len(edge_list), self.batch_size):
+            chunk = edge_list[start:start + self.batch_size]
+            rows = [{"task_id": task_id, "depends_on_id": depends_on_id} for task_id, depends_on_id in chunk]
+            if self.changes is None:
+                self.db.execute(insert(models.Dependency.__table__), rows)
+            else:
+                # 边已去重，(task_id, depends_on_id) 唯一确定一行
+                inserted = _insert_many(
+                    self.db, insert(models.Dependency.__table__), rows,
+                    models.Dependency.id, models.Dependency.task_id, models.Dependency.depends_on_id,
+                )
+                self._log([
+                    {
+                        "entity": "dependency", "op": "created", "entity_id": dep_id,
+                        "project_ids": [project.id], "task_id": task_id, "depends_on_id": depends_on_id,
+                    }
+                    for dep_id, task_id, depends_on_id in sorted(inserted)
+                ])
+            for task_id, depends_on_id in chunk:
+                graph_index.stage(self.db, "add_edge", task_id, depends_on_id)
+        self.dependency_count = len(edge_list)
+
+        for status, count in self.status_counts.items():
+            project_stats.adjust(self.db, project.id, status, count)
+        task_readiness.refresh_project(self.db, project.id)
+
+        self.revision = change_log.record(self.db, "project", "created", project.id, [project.id])
+        if self.changes is None:
+            change_log.compact(self.db, self.revision)
+        else:
+            for start in range(0, len(self.changes), self.batch_size):
+                self.revision = change_log.record_many(self.db, self.changes[start:start + self.batch_size])
+        after_commit(self.db, response_cache.invalidate, project.id)
+        after_commit(self.db, layout_cache.invalidate, project.id)
+        return {
+            "project_id": project.id,
+            "tasks": self.task_count,
+            "dependencies": self.dependency_count,
+            "revision": self.revision,
+        }
+
+
+def import_project(db: Session, stream, format: str = "ndjson", name: Optional[str] = None) -> dict:
+    """从 stream（二进制文件对象）导入一个新项目并提交，返回新项目ID、任务数、依赖数和修订号"""
+    records = read_csv(stream) if format == "csv" else read_ndjson(stream)
+    importer = ProjectImporter(db, name)
+    try:
+        for line, record in records:
+            importer.add(line, record)
+        result = importer.finish()
+    except (TransferError, UnicodeDecodeError, csv.Error) as e:
+        db.rollback()
+        if isinstance(e, TransferError):
+            raise
+        raise TransferError(f"无法解析导入文件：{e}")
+    db.commit()
+    return result
@@ -0,0 +1,168 @@
+"""
+读接口的响应缓存与条件请求
+
+缓存编码好的响应体，按 LRU 淘汰，条目数和总字节数都有上限。
+每个条目归属一个项目（project_id）或全局（None，如项目列表、全部任务快照）：
+写接口提交后按涉及的项目失效，任何失效同时清除全局条目。
+
+每个响应带强 ETag（响应体摘要）。请求的 If-None-Match 与缓存条目一致时，
+直接返回 304，不访问数据库。
+
+- TASK_MANAGER_RESPONSE_CACHE_ENTRIES 最多缓存的条目数（默认 256，0 表示关闭缓存）
+- TASK_MANAGER_RESPONSE_CACHE_BYTES 缓存响应体的总字节数上限（默认 64 MB）
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from serialization import dumps
+
+MAX_ENTRIES = int(os.environ.get("TASK_MANAGER_RESPONSE_CACHE_ENTRIES", "256"))
+MAX_BYTES = int(os.environ.get("TASK_MANAGER_RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "headers", "project_id")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], project_id: Optional[int]):
+        self.body = body
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.headers = headers
+        self.project_id = project_id
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比较（RFC 9110）；压缩响应的编码后缀已由压缩中间件去掉"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """
+    按项目失效的 LRU 响应缓存
+
+    每个项目和全局各维护一个版本号，失效时递增；计算期间若发生失效，
+    结果不写入缓存（与布局缓存相同的做法）。
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._versions: Dict[Optional[int], int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _version(self, project_id: Optional[int]) -> Tuple[int, int]:
+        return self._versions[None], self._versions[project_id] if project_id is not None else 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CachedResponse, version: Tuple[int, int]) -> None:
+        size = len(entry.body)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if self._version(entry.project_id) != version:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.body)
+            self._entries[key] = entry
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+                self.evictions += 1
+
+    def invalidate(self, *project_ids: Optional[int]) -> None:
+        """使指定项目的条目以及全部全局条目失效"""
+        with self._lock:
+            self._versions[None] += 1
+            for project_id in project_ids:
+                if project_id is not None:
+                    self._versions[project_id] += 1
+            stale = {project_id for project_id in project_ids if project_id is not None}
+            for key in [
+                key for key, entry in self._entries.items()
+                if entry.project_id is None or entry.project_id in stale
+            ]:
+                self._size -= len(self._entries.pop(key).body)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions[None] += 1
+            for project_id in list(self._versions):
+                if project_id is not None:
+                    self._versions[project_id] += 1
+            self._entries.clear()
+            self._size = 0
+            self.invalidations += 1
+
+    def serve(
+        self,
+        request: Request,
+        key: Hashable,
+        project_id: Optional[int],
+        compute: Callable[[], Tuple[object, Dict[str, str]]],
+    ) -> Response:
+        """
+        返回缓存的响应；未命中时调用 compute() 得到 (内容, 响应头) 并编码、缓存
+        If-None-Match 与 ETag 一致时返回 304
+        """
+        entry = self.get(key)
+        if entry is None:
+            with self._lock:
+                version = self._version(project_id)
+            content, headers = compute()
+            entry = CachedResponse(dumps(content), headers, project_id)
+            self.put(key, entry, version)
+
+        # no-cache：浏览器可以保存响应，但每次使用前都要带 If-None-Match 重新验证
+        headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, headers=headers, media_type="application/json")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# 进程级共享实例
+response_cache = ResponseCache()
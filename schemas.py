@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Optional, List, Dict, Literal, Union
 from datetime import datetime
 
 
@@ -25,6 +25,7 @@ class ProjectResponse(ProjectBase):
     id: int
     created_at: datetime
     task_count: int = 0
+    status_counts: Dict[str, int] = {}  # 按状态统计：pending / in_progress / completed
 
     class Config:
         from_attributes = True
@@ -65,7 +66,197 @@ class TaskWithDependencies(TaskResponse):
         from_attributes = True
 
 
+class TaskListItem(TaskResponse):
+    archived: Optional[bool] = None  # 仅 include_archived=true 时返回
+
+
+class ArchivedTaskWithDependencies(TaskWithDependencies):
+    """归档任务详情（include_archived=true）；依赖关系为随任务归档的边"""
+    archived: bool = True
+    archived_at: Optional[datetime] = None
+
+
 # ==================== Dependency Schemas ====================
 
+class CompactEdges(BaseModel):
+    task_id: List[int] = []
+    depends_on_id: List[int] = []
+
+
+class CompactTaskSnapshot(BaseModel):
+    """任务快照的紧凑格式：columns 为字段 -> 值数组，edges 为扁平的依赖边列表"""
+    format: Literal["compact"] = "compact"
+    count: int
+    columns: Dict[str, List[Any]]
+    edges: CompactEdges
+
+
 class DependencyCreate(BaseModel):
     depends_on_id: int
+
+
+# ==================== Layout Schemas ====================
+
+class LayoutPosition(BaseModel):
+    column: int  # 依赖深度（最长路径）
+    row: int     # 同列内的序号
+
+
+class ProjectLayout(BaseModel):
+    project_id: int
+    column_count: int
+    row_count: int = 0   # 最多任务的一列的任务数
+    positions: Dict[int, LayoutPosition] = {}
+
+
+class LayoutRegion(BaseModel):
+    project_id: int
+    column_count: int
+    row_count: int
+    tasks: List[Dict[str, Any]] = []                 # 区域内的任务（fields 指定的字段）
+    positions: Dict[int, LayoutPosition] = {}        # 区域内任务及相交的边两端任务的位置
+    edges: CompactEdges                              # 包围盒与区域相交的依赖边
+
+
+# ==================== Change Feed Schemas ====================
+
+class DependencyEdge(BaseModel):
+    task_id: int
+    depends_on_id: int
+
+
+class TaskChanges(BaseModel):
+    upserted: List[TaskResponse] = []
+    deleted: List[int] = []
+
+
+class ProjectChanges(BaseModel):
+    upserted: List[ProjectResponse] = []
+    deleted: List[int] = []
+
+
+class DependencyChanges(BaseModel):
+    added: List[DependencyEdge] = []
+    removed: List[DependencyEdge] = []
+
+
+class ChangeFeed(BaseModel):
+    revision: int
+    full_reload: bool = False  # since 早于压缩水位，客户端需要全量重新加载
+    tasks: TaskChanges
+    projects: ProjectChanges
+    dependencies: DependencyChanges
+
+
+# ==================== Graph Query Schemas ====================
+
+class SubgraphTask(TaskResponse):
+    depth: int  # 距起点任务的最少跳数
+
+
+class TaskSearchResult(TaskResponse):
+    title_highlight: str            # 标题，命中部分以 <mark> 标出（已做 HTML 转义）
+    snippet: Optional[str] = None   # 描述中命中的片段，描述未命中时为空
+    rank: float                     # 相关度，越小越相关
+
+
+class TaskSubgraph(BaseModel):
+    root_id: int
+    max_depth: Optional[int] = None
+    tasks: List[SubgraphTask] = []
+    edges: List[DependencyEdge] = []
+
+
+class CriticalPath(BaseModel):
+    project_id: int
+    length: int  # 链上的任务数
+    tasks: List[TaskResponse] = []  # 从最早的前置任务到最终任务
+    edges: List[DependencyEdge] = []
+
+
+# ==================== Batch Schemas ====================
+
+class BatchOperation(BaseModel):
+    """
+    批量操作中的单个操作
+    task_id / depends_on_id 为整数时表示已有任务，为字符串时引用本批 create_task 的 ref
+    """
+    op: Literal["create_task", "update_task", "delete_task", "add_dependency", "remove_dependency"]
+    ref: Optional[str] = None            # create_task：客户端临时ID
+    task_id: Optional[Union[int, str]] = None
+    depends_on_id: Optional[Union[int, str]] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    project_id: Optional[int] = None     # create_task：未指定时使用默认项目
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+class BatchOperationResult(BaseModel):
+    index: int
+    op: str
+    task_id: Optional[int] = None
+    depends_on_id: Optional[int] = None
+    ref: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    revision: int
+    results: List[BatchOperationResult]
+    refs: Dict[str, int] = {}  # ref -> 新建任务的真实ID
+
+
+# ==================== Archive Schemas ====================
+
+class ArchiveStatus(BaseModel):
+    running: bool
+    older_than_days: Optional[float] = None
+    cutoff: Optional[str] = None            # 完成时间早于该时刻（UTC）的任务被归档
+    batch_size: Optional[int] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    batches: int = 0
+    archived_tasks: int = 0
+    archived_dependencies: int = 0
+    error: Optional[str] = None
+
+
+# ==================== Import Schemas ====================
+
+class ProjectImportResult(BaseModel):
+    project: ProjectResponse
+    tasks: int           # 导入的任务数
+    dependencies: int    # 导入的依赖关系数（去重后）
+    revision: int
+
+
+# ==================== Job Schemas ====================
+
+class TaskMoveRequest(BaseModel):
+    task_ids: List[int]
+    target_project_id: int
+
+
+class ProjectMergeRequest(BaseModel):
+    target_project_id: int
+
+
+class JobStatus(BaseModel):
+    id: int
+    kind: str                                # delete_project / move_tasks / merge_project
+    running: bool
+    project_id: Optional[int] = None
+    target_project_id: Optional[int] = None
+    batch_size: int
+    total_tasks: Optional[int] = None        # 开始时待处理的任务数（含归档任务），作业期间新建的任务不计入
+    started_at: str
+    finished_at: Optional[str] = None
+    batches: int = 0
+    tasks: int = 0                           # 已删除 / 已移动的活跃任务数
+    archived_tasks: int = 0
+    dependencies: int = 0
+    skipped: int = 0                         # 移动时不存在或已在目标项目中的任务
+    error: Optional[str] = None
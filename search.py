@@ -0,0 +1,229 @@
+"""
+任务全文搜索
+
+tasks_fts 是以 tasks 表为外部内容的 FTS5 虚拟表（title、description 两列），
+由 tasks 表上的触发器同步：接口、批量操作以及直接执行的 SQL 写入都会自动更新索引。
+
+使用 trigram 分词：按连续三个字符建索引，中文无需分词即可做子串匹配，
+输入词的前几个字符就能命中（适合输入即搜索）。不足三个字符的词无法使用索引，
+与索引词同时出现时作为附加的子串过滤；查询只包含短词时退回为 LIKE 扫描（可按项目缩小范围）。
+
+排序使用 bm25，标题命中的权重高于描述。结果带标题高亮和描述片段：
+命中部分以 <mark></mark> 标出，其余文本已做 HTML 转义，可直接插入页面。
+"""
+import html
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import models
+import serialization
+
+FTS_TABLE = "tasks_fts"
+# trigram 分词的最短可索引长度
+MIN_TERM_LENGTH = 3
+MAX_TERMS = 8
+# bm25 的列权重：标题、描述
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+# 描述片段的词元数（trigram 下约等于字符数）
+SNIPPET_TOKENS = 24
+SNIPPET_CHARS = 48
+
+# 文本查询结果按 ORM 列类型转换（created_at 为 datetime），与其他任务接口的输出格式一致
+COLUMN_TYPES = {column.key: column.type for column in models.TASK_COLUMNS}
+
+# highlight / snippet 先用控制字符标记命中位置，转义后再替换为 HTML 标签
+_OPEN, _CLOSE = "\x02", "\x03"
+ELLIPSIS = "…"
+
+CREATE_STATEMENTS = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, content='tasks', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+)
+
+# SQLite 未编译 FTS5 时为 False，搜索接口返回 503
+available = True
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+# ==================== 索引维护 ====================
+
+def _index_exists(conn: Connection) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+    ).first() is not None
+
+
+def rebuild(conn: Connection) -> None:
+    """按 tasks 表的当前内容重建全文索引"""
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def ensure_index(engine: Engine) -> bool:
+    """
+    创建全文索引表和同步触发器（幂等）；新建时根据已有任务填充索引
+    返回索引是否可用
+    """
+    global available
+    try:
+        with engine.begin() as conn:
+            created = not _index_exists(conn)
+            for statement in CREATE_STATEMENTS:
+                conn.execute(text(statement))
+            if created:
+                rebuild(conn)
+    except OperationalError:
+        # 当前 SQLite 不支持 FTS5 或 trigram 分词（需要 3.34+）
+        available = False
+    return available
+
+
+def check_integrity(conn: Connection) -> bool:
+    """索引内容与 tasks 表一致时返回 True"""
+    try:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)"))
+    except OperationalError:
+        return False
+    return True
+
+
+# ==================== 查询 ====================
+
+def parse_query(query: str) -> Tuple[List[str], List[str]]:
+    """按空白拆分搜索词，返回 (可用索引的词, 不足三个字符的短词)"""
+    terms = [term for term in query.split() if term][:MAX_TERMS]
+    if not terms:
+        raise InvalidQuery("搜索词不能为空")
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    return indexed, short
+
+
+def match_expression(terms: List[str]) -> str:
+    """每个词作为一个短语（双引号转义），多个词同时匹配"""
+    return " ".join('"%s"' % term.replace('"', '""') for term in terms)
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _render(marked: Optional[str]) -> Optional[str]:
+    """转义 HTML 后把控制字符标记换成 <mark>"""
+    if marked is None:
+        return None
+    return html.escape(marked).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _mark_terms(value: Optional[str], terms: List[str]) -> Optional[str]:
+    """在 Python 中标记短词（LIKE 路径没有 FTS 的 highlight）"""
+    if not value:
+        return value
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    return pattern.sub(lambda match: _OPEN + match.group(0) + _CLOSE, value)
+
+
+def _snippet(value: Optional[str], terms: List[str]) -> Optional[str]:
+    """截取描述中首个命中词附近的片段并标记"""
+    if not value:
+        return None
+    lowered = value.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [position for position in positions if position >= 0]
+    if not positions:
+        return None
+    start = max(0, min(positions) - SNIPPET_CHARS // 4)
+    end = start + SNIPPET_CHARS
+    fragment = value[start:end]
+    return (ELLIPSIS if start > 0 else "") + _mark_terms(fragment, terms) + (ELLIPSIS if end < len(value) else "")
+
+
+def search(db: Session, query: str, project_id: Optional[int] = None, limit: int = 20) -> List[dict]:
+    """
+    搜索任务标题和描述，按相关度排序
+    每个结果为任务字段加 title_highlight、snippet（描述中命中的片段，未命中描述时为 None）和 rank（越小越相关）
+    """
+    indexed, short = parse_query(query)
+    params = {"limit": limit}
+    filters = []
+    if project_id is not None:
+        filters.append("t.project_id = :project_id")
+        params["project_id"] = project_id
+    for index, term in enumerate(short):
+        params[f"short_{index}"] = _like_pattern(term)
+        filters.append(
+            f"(t.title LIKE :short_{index} ESCAPE '\\' OR t.description LIKE :short_{index} ESCAPE '\\')"
+        )
+    columns = ", ".join(f"t.{column.key}" for column in models.TASK_COLUMNS)
+
+    if indexed:
+        params.update(match=match_expression(indexed), open=_OPEN, close=_CLOSE, ellipsis=ELLIPSIS)
+        rows = db.execute(text(f"""
+            SELECT {columns},
+                   highlight({FTS_TABLE}, 0, :open, :close) AS title_marked,
+                   snippet({FTS_TABLE}, 1, :open, :close, :ellipsis, {SNIPPET_TOKENS}) AS snippet_marked,
+                   bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) AS rank
+            FROM {FTS_TABLE}
+            JOIN tasks t ON t.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :match {''.join(' AND ' + condition for condition in filters)}
+            ORDER BY rank, t.id
+            LIMIT :limit
+        """).columns(**COLUMN_TYPES), params).all()
+    else:
+        # 只有短词：子串扫描，标题命中的排在前面
+        params["title_pattern"] = _like_pattern(short[0])
+        rows = db.execute(text(f"""
+            SELECT {columns}, NULL AS title_marked, NULL AS snippet_marked,
+                   CASE WHEN t.title LIKE :title_pattern ESCAPE '\\' THEN 0 ELSE 1 END AS rank
+            FROM tasks t
+            WHERE {' AND '.join(filters)}
+            ORDER BY rank, t.id DESC
+            LIMIT :limit
+        """).columns(**COLUMN_TYPES), params).all()
+
+    results = []
+    for row in rows:
+        result = serialization.task_dict(row)
+        title_marked, snippet_marked = row.title_marked, row.snippet_marked
+        if short:
+            title_marked = _mark_terms(title_marked if title_marked is not None else row.title, short)
+            if snippet_marked is not None:
+                snippet_marked = _mark_terms(snippet_marked, short)
+            elif not indexed:
+                snippet_marked = _snippet(row.description, short)
+        result["title_highlight"] = _render(title_marked if title_marked is not None else row.title)
+        # 描述没有命中时 FTS 的 snippet 不含标记，不返回片段
+        result["snippet"] = _render(snippet_marked) if snippet_marked and _OPEN in snippet_marked else None
+        result["rank"] = row.rank
+        results.append(result)
+    return results
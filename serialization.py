@@ -0,0 +1,106 @@
+"""
+JSON 响应的快速序列化
+
+列表类接口返回的行直接来自数据库，不需要再经过 Pydantic 校验：
+按列组装成 dict 后一次编码为 JSON 字节，以 Response 返回，
+FastAPI 不再对返回值执行 response_model 校验和序列化（response_model 仍用于接口文档）。
+
+安装了 orjson 时用 orjson 编码（原生支持 datetime 和整数键），否则退回标准库 json。
+TASK_MANAGER_FAST_JSON=0 时关闭快速路径，接口返回值重新交给 response_model 处理，便于对比排查。
+"""
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import Response
+
+import models
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+FAST_JSON = os.environ.get("TASK_MANAGER_FAST_JSON", "1").lower() not in ("0", "false", "no", "off")
+
+TASK_FIELDS = tuple(column.key for column in models.TASK_COLUMNS)
+# 包含归档任务的列表多一列 archived
+ARCHIVABLE_TASK_FIELDS = TASK_FIELDS + ("archived",)
+# 紧凑格式默认返回的字段（依赖图视图不显示 description）
+COMPACT_FIELDS = ("id", "title", "status", "project_id", "created_at")
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+# 解析 JSON（导入使用）；格式错误时抛出 ValueError
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def task_dict(task) -> dict:
+    """ORM 任务对象或 TASK_COLUMNS 查询行 -> dict"""
+    return {field: getattr(task, field) for field in TASK_FIELDS}
+
+
+def task_dicts(rows: Iterable, fields: Tuple[str, ...] = TASK_FIELDS) -> List[dict]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    解析 ?fields=a,b,c 字段投影，返回按 TASK_FIELDS 顺序排列的字段（id 始终包含）
+    未指定时返回 None；含未知字段时抛出 ValueError
+    """
+    if not value:
+        return None
+    requested = {field.strip() for field in value.split(",") if field.strip()}
+    unknown = requested - set(TASK_FIELDS)
+    if unknown:
+        raise ValueError(f"未知字段：{', '.join(sorted(unknown))}（可选：{', '.join(TASK_FIELDS)}）")
+    requested.add("id")
+    return tuple(field for field in TASK_FIELDS if field in requested)
+
+
+def compact_tasks(fields: Sequence[str], rows: Sequence, edges: Sequence) -> dict:
+    """
+    任务快照的紧凑（列式）表示：
+    每个字段一个数组，依赖关系为一份扁平的边列表，不再逐任务重复字段名和 dependencies / dependents
+    """
+    columns = [[] for _ in fields]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    return {
+        "format": "compact",
+        "count": len(rows),
+        "columns": dict(zip(fields, columns)),
+        "edges": {
+            "task_id": [task_id for task_id, _ in edges],
+            "depends_on_id": [depends_on_id for _, depends_on_id in edges],
+        },
+    }
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200):
+    """
+    把可信的返回值直接编码为 JSON 响应
+    response 为接口注入的 Response，其上设置的响应头（如 X-Revision）会一并带上
+    关闭快速路径时原样返回 content
+    """
+    if not FAST_JSON:
+        return content
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(dumps(content), status_code=status_code, headers=headers, media_type="application/json")
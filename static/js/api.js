@@ -74,6 +74,19 @@ const API = {
         }
     },
 
+    /**
+     * 获取项目布局（服务端计算的列、行分配）
+     * @param {number} projectId - 项目ID
+     * @returns {Promise<Object>} { project_id, column_count, positions: { taskId: { column, row } } }
+     */
+    async fetchProjectLayout(projectId) {
+        const response = await fetch(`${this.BASE_URL}/projects/${projectId}/layout`);
+        if (!response.ok) {
+            throw new Error('获取布局失败');
+        }
+        return response.json();
+    },
+
     // ==================== Task API ====================
 
     /**
@@ -93,6 +106,106 @@ const API = {
         return response.json();
     },
 
+    /**
+     * 全文搜索任务标题和描述（按相关度排序）
+     * @param {string} query - 搜索词，空格分隔的多个词需同时命中
+     * @param {number|null} projectId - 项目ID，null 表示搜索所有项目
+     * @param {number} limit - 最多返回条数
+     * @returns {Promise<Array>} 任务列表，带 title_highlight、snippet（命中部分以 <mark> 标出，已转义）
+     */
+    async searchTasks(query, projectId = null, limit = 20) {
+        const params = new URLSearchParams({ q: query, limit });
+        if (projectId !== null) {
+            params.set('project_id', projectId);
+        }
+        const response = await fetch(`${this.BASE_URL}/tasks/search?${params}`);
+        if (!response.ok) {
+            throw new Error('搜索任务失败');
+        }
+        return response.json();
+    },
+
+    /**
+     * 获取任务快照（含依赖关系）及读取时的修订号
+     * @param {number|null} projectId - 项目ID，null 表示获取所有项目
+     * @param {Object} options - 可选项
+     * @param {boolean} options.compact - 请求列式紧凑格式（解码后与普通格式相同）
+     * @param {Array<string>} options.fields - 只返回指定的任务字段（id 始终返回）
+     * @returns {Promise<Object>} { tasks, revision }
+     */
+    async fetchTasksSnapshot(projectId = null, { compact = false, fields = null } = {}) {
+        const params = new URLSearchParams();
+        if (projectId !== null) {
+            params.set('project_id', projectId);
+        }
+        if (compact) {
+            params.set('format', 'compact');
+        }
+        if (fields) {
+            params.set('fields', fields.join(','));
+        }
+        const query = params.toString();
+        const response = await fetch(`${this.BASE_URL}/tasks/with-dependencies${query ? `?${query}` : ''}`);
+        if (!response.ok) {
+            throw new Error('获取任务失败');
+        }
+        const revision = response.headers.get('X-Revision');
+        const data = await response.json();
+        return {
+            tasks: compact ? this.decodeCompactTasks(data) : data,
+            revision: revision !== null ? parseInt(revision) : null
+        };
+    },
+
+    /**
+     * 把紧凑格式（字段列数组 + 扁平边列表）还原为任务对象数组
+     * @param {Object} data - { count, columns, edges: { task_id, depends_on_id } }
+     * @returns {Array} 任务列表，每个任务带 dependencies / dependents
+     */
+    decodeCompactTasks(data) {
+        const ids = data.columns.id;
+        const tasks = new Array(data.count);
+        const taskMap = new Map();
+        for (let i = 0; i < data.count; i++) {
+            const task = { id: ids[i], dependencies: [], dependents: [] };
+            tasks[i] = task;
+            taskMap.set(task.id, task);
+        }
+        // 按列填充字段
+        for (const [name, values] of Object.entries(data.columns)) {
+            if (name === 'id') continue;
+            for (let i = 0; i < data.count; i++) {
+                tasks[i][name] = values[i];
+            }
+        }
+        const { task_id: taskIds, depends_on_id: prerequisiteIds } = data.edges;
+        for (let i = 0; i < taskIds.length; i++) {
+            const task = taskMap.get(taskIds[i]);
+            const prerequisite = taskMap.get(prerequisiteIds[i]);
+            if (task) task.dependencies.push(prerequisiteIds[i]);
+            if (prerequisite) prerequisite.dependents.push(taskIds[i]);
+        }
+        return tasks;
+    },
+
+    /**
+     * 获取指定修订号之后的增量变更
+     * @param {number} since - 上次同步的修订号
+     * @param {number|null} projectId - 项目ID，null 表示所有项目
+     * @returns {Promise<Object>} { revision, full_reload, tasks, projects, dependencies }
+     */
+    async fetchChanges(since, projectId = null) {
+        let url = `${this.BASE_URL}/changes?since=${since}`;
+        if (projectId !== null) {
+            url += `&project_id=${projectId}`;
+        }
+        const response = await fetch(url);
+        if (!response.ok) {
+            throw new Error('获取变更失败');
+        }
+        return response.json();
+    },
+
     /**
      * 获取单个任务
      * @param {number} id - 任务ID
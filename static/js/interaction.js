@@ -354,9 +354,7 @@ const Interaction = {
      */
     async refreshData() {
         try {
-            this.tasks = await API.fetchAllTasks(app.currentProjectId);
-            this.layout = Layout.computeLayout(this.tasks);
-            Renderer.render(this.tasks, this.layout);
+            await app.requestSync();
         } catch (error) {
             this.showToast(error.message, 'error');
         }
@@ -614,7 +612,7 @@ const Interaction = {
                     <span class="project-color" style="background-color: ${p.color}"></span>
                     <div class="project-details">
                         <div class="project-name">${p.name}</div>
-                        <div class="project-meta">${p.task_count} 个任务</div>
+                        <div class="project-meta">${p.task_count} 个任务${this.formatStatusCounts(p.status_counts)}</div>
                     </div>
                 </div>
                 <div class="project-actions">
@@ -637,6 +635,20 @@ const Interaction = {
         document.getElementById('project-dialog').classList.remove('hidden');
     },
 
+    /**
+     * 格式化项目的按状态任务统计
+     * @param {Object} statusCounts - { pending, in_progress, completed }
+     * @returns {string} 统计文本
+     */
+    formatStatusCounts(statusCounts) {
+        if (!statusCounts) return '';
+        const labels = { pending: '待处理', in_progress: '进行中', completed: '已完成' };
+        const parts = Object.entries(labels)
+            .filter(([key]) => statusCounts[key])
+            .map(([key, label]) => `${label} ${statusCounts[key]}`);
+        return parts.length > 0 ? ` · ${parts.join(' / ')}` : '';
+    },
+
     /**
      * 显示创建项目对话框
      */
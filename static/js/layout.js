@@ -18,6 +18,12 @@ const Layout = {
         connectionOffsetUnit: 3     // 每个打点的偏移量（px）
     },
 
+    // 任务快照使用紧凑格式；任务详情和编辑对话框需要 description
+    SNAPSHOT_OPTIONS: {
+        compact: true,
+        fields: ['id', 'title', 'description', 'status', 'project_id', 'created_at']
+    },
+
     /**
      * 计算每个任务的依赖深度
      * 深度定义：从无依赖任务开始的最长路径长度
@@ -26,28 +32,32 @@ const Layout = {
      */
     calculateTaskDepth(tasks) {
         const depthMap = {};
+        const taskMap = new Map(tasks.map(t => [t.id, t]));
+        const visiting = new Set();
 
         /**
-         * 递归计算任务深度
+         * 记忆化计算任务深度（每个任务只计算一次）
          * @param {number} taskId - 任务ID
-         * @param {Set} visited - 已访问的任务（防止循环依赖）
          * @returns {number} 深度值
          */
-        const getDepth = (taskId, visited = new Set()) => {
+        const getDepth = (taskId) => {
+            if (taskId in depthMap) return depthMap[taskId];
             // 防止循环依赖
-            if (visited.has(taskId)) return 0;
+            if (visiting.has(taskId)) return 0;
 
-            const task = tasks.find(t => t.id === taskId);
+            const task = taskMap.get(taskId);
             if (!task || task.dependencies.length === 0) return 0;
 
-            // 递归计算所有依赖的深度
-            visited.add(taskId);
-            const depDepths = task.dependencies.map(depId =>
-                getDepth(depId, new Set(visited))
-            );
+            visiting.add(taskId);
+            let maxDepth = 0;
+            task.dependencies.forEach(depId => {
+                maxDepth = Math.max(maxDepth, getDepth(depId));
+            });
+            visiting.delete(taskId);
 
             // 深度 = 1 + max(所有依赖的深度)
-            return 1 + Math.max(...depDepths);
+            depthMap[taskId] = 1 + maxDepth;
+            return depthMap[taskId];
         };
 
         // 计算每个任务的深度
@@ -125,17 +135,42 @@ const Layout = {
         };
     },
 
+    /**
+     * 使用服务端返回的列、行分配计算坐标
+     * @param {Object} serverPositions - { taskId: { column, row } }
+     * @returns {Object} 位置映射表 { taskId: { x, y, column, row } }
+     */
+    positionsFromServer(serverPositions) {
+        const positions = {};
+        Object.entries(serverPositions).forEach(([taskId, { column, row }]) => {
+            positions[taskId] = {
+                column,
+                row,
+                x: this.CONFIG.marginLeft + column * this.CONFIG.columnWidth,
+                y: this.CONFIG.marginTop + row * this.CONFIG.rowHeight
+            };
+        });
+        return positions;
+    },
+
     /**
      * 完整的布局计算
      * @param {Array} tasks - 所有任务列表
+     * @param {Object|null} serverLayout - 服务端布局（可选），提供时跳过深度计算
      * @returns {Object} 完整布局信息 { taskId: { x, y, column, row, grid } }
      */
-    computeLayout(tasks) {
-        // 1. 计算深度
-        const depthMap = this.calculateTaskDepth(tasks);
-
-        // 2. 分配位置
-        const positions = this.assignPositions(tasks, depthMap);
+    computeLayout(tasks, serverLayout = null) {
+        let positions;
+        if (serverLayout) {
+            // 1-2. 直接使用服务端计算的列、行
+            positions = this.positionsFromServer(serverLayout.positions);
+        } else {
+            // 1. 计算深度
+            const depthMap = this.calculateTaskDepth(tasks);
+
+            // 2. 分配位置
+            positions = this.assignPositions(tasks, depthMap);
+        }
 
         // 3. 计算九宫格边界
         const layout = {};
@@ -148,5 +183,36 @@ const Layout = {
         });
 
         return layout;
+    },
+
+    /**
+     * 获取布局：指定项目时使用服务端布局，否则在本地计算
+     * @param {Array} tasks - 所有任务列表
+     * @param {number|null} projectId - 项目ID
+     * @returns {Promise<Object>} 完整布局信息
+     */
+    async fetchLayout(tasks, projectId) {
+        if (projectId === null) {
+            return this.computeLayout(tasks);
+        }
+        const serverLayout = await API.fetchProjectLayout(projectId);
+        return this.computeLayout(tasks, serverLayout);
+    },
+
+    /**
+     * 加载任务快照和布局
+     * @param {number|null} projectId - 项目ID
+     * @returns {Promise<Object>} { tasks, layout, revision }
+     */
+    async load(projectId) {
+        if (projectId === null) {
+            const { tasks, revision } = await API.fetchTasksSnapshot(null, this.SNAPSHOT_OPTIONS);
+            return { tasks, revision, layout: this.computeLayout(tasks) };
+        }
+        const [{ tasks, revision }, serverLayout] = await Promise.all([
+            API.fetchTasksSnapshot(projectId, this.SNAPSHOT_OPTIONS),
+            API.fetchProjectLayout(projectId)
+        ]);
+        return { tasks, revision, layout: this.computeLayout(tasks, serverLayout) };
     }
 };
@@ -8,6 +8,12 @@ class App {
         this.layout = {};
         this.projects = [];
         this.currentProjectId = null;
+        // 最近一次同步的修订号
+        this.revision = null;
+        // 服务端推送连接及同步状态
+        this.eventSource = null;
+        this.syncing = false;
+        this.syncPending = false;
     }
 
     /**
@@ -26,6 +32,9 @@ class App {
 
             // 加载当前项目的任务
             await this.loadData();
+
+            // 订阅其他用户的变更推送
+            this.subscribeEvents();
         } catch (error) {
             this.showError('应用初始化失败：' + error.message);
         }
@@ -74,6 +83,50 @@ class App {
         localStorage.setItem('currentProjectId', projectId);
         await this.loadData();
         Interaction.updateProjectSelector(this.projects, this.currentProjectId);
+        this.subscribeEvents();
+    }
+
+    /**
+     * 订阅当前项目的服务端推送（SSE），收到事件后增量同步
+     */
+    subscribeEvents() {
+        if (typeof EventSource === 'undefined') return;
+        if (this.eventSource) {
+            this.eventSource.close();
+        }
+
+        let url = `${API.BASE_URL}/events`;
+        if (this.currentProjectId !== null) {
+            url += `?project_id=${this.currentProjectId}`;
+        }
+        this.eventSource = new EventSource(url);
+        this.eventSource.onmessage = (e) => {
+            const message = JSON.parse(e.data);
+            if (message.type === 'resync' || this.revision === null || message.revision > this.revision) {
+                this.requestSync();
+            }
+        };
+    }
+
+    /**
+     * 合并并发的同步请求：同步进行中再收到事件时，结束后补一次
+     */
+    async requestSync() {
+        if (this.syncing) {
+            this.syncPending = true;
+            return;
+        }
+        this.syncing = true;
+        try {
+            do {
+                this.syncPending = false;
+                await this.syncChanges();
+            } while (this.syncPending);
+        } catch (error) {
+            this.showError('同步失败：' + error.message);
+        } finally {
+            this.syncing = false;
+        }
     }
 
     /**
@@ -84,11 +137,11 @@ class App {
         loading.classList.remove('hidden');
 
         try {
-            // 获取当前项目的任务
-            this.tasks = await API.fetchAllTasks(this.currentProjectId);
-
-            // 计算布局
-            this.layout = Layout.computeLayout(this.tasks);
+            // 获取当前项目的任务及服务端布局
+            const { tasks, layout, revision } = await Layout.load(this.currentProjectId);
+            this.tasks = tasks;
+            this.layout = layout;
+            this.revision = revision;
 
             // 渲染图形
             Renderer.render(this.tasks, this.layout);
@@ -102,6 +155,89 @@ class App {
         }
     }
 
+    /**
+     * 增量同步：只拉取上次同步之后的变更并应用到本地任务列表
+     */
+    async syncChanges() {
+        if (this.revision === null) {
+            await this.loadData();
+            return;
+        }
+
+        const changes = await API.fetchChanges(this.revision, this.currentProjectId);
+        if (changes.full_reload) {
+            await this.loadData();
+            return;
+        }
+        if (changes.revision === this.revision) return;
+
+        this.tasks = this.applyChanges(this.tasks, changes);
+        this.revision = changes.revision;
+        this.applyProjectChanges(changes.projects);
+
+        this.layout = await Layout.fetchLayout(this.tasks, this.currentProjectId);
+        Renderer.render(this.tasks, this.layout);
+        Interaction.setData(this.tasks, this.layout);
+    }
+
+    /**
+     * 将增量变更应用到任务列表
+     * @param {Array} tasks - 当前任务列表
+     * @param {Object} changes - /api/changes 返回的变更
+     * @returns {Array} 更新后的任务列表
+     */
+    applyChanges(tasks, changes) {
+        const taskMap = new Map(tasks.map(t => [t.id, t]));
+
+        changes.tasks.deleted.forEach(id => taskMap.delete(id));
+        changes.tasks.upserted.forEach(row => {
+            if (this.currentProjectId !== null && row.project_id !== this.currentProjectId) {
+                taskMap.delete(row.id);
+                return;
+            }
+            const existing = taskMap.get(row.id);
+            taskMap.set(row.id, {
+                ...row,
+                dependencies: existing ? existing.dependencies : [],
+                dependents: existing ? existing.dependents : []
+            });
+        });
+
+        const removeId = (list, id) => list.filter(x => x !== id);
+        changes.dependencies.removed.forEach(({ task_id, depends_on_id }) => {
+            const task = taskMap.get(task_id);
+            if (task) task.dependencies = removeId(task.dependencies, depends_on_id);
+            const prerequisite = taskMap.get(depends_on_id);
+            if (prerequisite) prerequisite.dependents = removeId(prerequisite.dependents, task_id);
+        });
+        changes.dependencies.added.forEach(({ task_id, depends_on_id }) => {
+            const task = taskMap.get(task_id);
+            if (task && !task.dependencies.includes(depends_on_id)) {
+                task.dependencies = [...task.dependencies, depends_on_id];
+            }
+            const prerequisite = taskMap.get(depends_on_id);
+            if (prerequisite && !prerequisite.dependents.includes(task_id)) {
+                prerequisite.dependents = [...prerequisite.dependents, task_id];
+            }
+        });
+
+        return Array.from(taskMap.values()).sort((a, b) => a.id - b.id);
+    }
+
+    /**
+     * 将项目变更应用到项目列表
+     * @param {Object} projectChanges - { upserted, deleted }
+     */
+    applyProjectChanges(projectChanges) {
+        if (projectChanges.upserted.length === 0 && projectChanges.deleted.length === 0) return;
+
+        const projectMap = new Map(this.projects.map(p => [p.id, p]));
+        projectChanges.deleted.forEach(id => projectMap.delete(id));
+        projectChanges.upserted.forEach(p => projectMap.set(p.id, p));
+        this.projects = Array.from(projectMap.values()).sort((a, b) => a.id - b.id);
+        Interaction.updateProjectSelector(this.projects, this.currentProjectId);
+    }
+
     /**
      * 显示错误信息
      * @param {string} message - 错误消息
@@ -1,25 +1,61 @@
 /**
  * SVG 渲染模块
  * 负责渲染九宫格、任务方块和连接线
+ *
+ * 视口裁剪：只为滚动区域可见范围（外加 VIEWPORT_MARGIN）内的任务和连接线创建 SVG 元素，
+ * 滚动时按帧增删进出视口的元素；重新渲染时按签名比较，只替换内容变化的元素
  */
 const Renderer = {
     svg: null,
+    container: null,
     layers: {},
     cornerDots: {},  // 角打点数组 { "taskId_cornerName": [false, false, ...] }
 
     // 连接线调色板（循环使用）
     connectionColors: ['#e74c3c', '#3498db', '#2ecc71', '#9b59b6', '#f39c12', '#1abc9c', '#e91e63', '#00bcd4'],
 
+    // 视口四周预先渲染的范围（px），小幅滚动时不需要新建元素
+    VIEWPORT_MARGIN: 400,
+
+    // 当前渲染的数据：节点 { task, x0, y0, x1, y1 }、连接线 { key, sourceId, targetId, offset, colorIndex, x0, y0, x1, y1 }
+    tasks: [],
+    taskMap: new Map(),
+    layout: {},
+    nodes: [],
+    paths: [],
+    highlightedEdges: new Set(),
+
+    // 已创建的元素：taskId -> { signature, grid, task }、边 key -> { signature, path }
+    nodeElements: new Map(),
+    edgeElements: new Map(),
+    frameRequested: false,
+
     /**
      * 初始化渲染器
      */
     init() {
         this.svg = document.getElementById('dependency-graph');
+        this.container = document.getElementById('graph-container');
         this.layers = {
             grids: document.getElementById('grids-layer'),
             connections: document.getElementById('connections-layer'),
             tasks: document.getElementById('tasks-layer')
         };
+
+        this.container.addEventListener('scroll', () => this.scheduleViewportUpdate(), { passive: true });
+        window.addEventListener('resize', () => this.scheduleViewportUpdate());
+
+        // 连线悬浮事件委托给图层，元素随视口增删时无需逐个绑定
+        this.layers.connections.addEventListener('mouseover', (e) => {
+            const sourceTitle = e.target.getAttribute('data-source-title');
+            const targetTitle = e.target.getAttribute('data-target-title');
+            if (sourceTitle && targetTitle) {
+                Interaction.showConnectionTooltip(e.clientX, e.clientY, sourceTitle, targetTitle);
+            }
+        });
+        this.layers.connections.addEventListener('mouseout', () => {
+            Interaction.hideConnectionTooltip();
+        });
     },
 
     /**
@@ -242,10 +278,8 @@ const Renderer = {
         const { points } = this.calculateBasePath(sourceLayout, targetLayout);
 
         // 获取任务标题用于悬浮显示
-        const sourceTask = this.tasks?.find(t => t.id === sourceId);
-        const targetTask = this.tasks?.find(t => t.id === targetId);
-        const sourceTitle = sourceTask?.title || `任务 ${sourceId}`;
-        const targetTitle = targetTask?.title || `任务 ${targetId}`;
+        const sourceTitle = this.taskMap.get(sourceId)?.title || `任务 ${sourceId}`;
+        const targetTitle = this.taskMap.get(targetId)?.title || `任务 ${targetId}`;
 
         const path = document.createElementNS('http://www.w3.org/2000/svg', 'path');
         const offsetPath = this.applyOffset(points, 0, offsetY);
@@ -253,6 +287,7 @@ const Renderer = {
             return i === 0 ? `M ${p.x} ${p.y}` : `L ${p.x} ${p.y}`;
         }).join('\n'));
         path.setAttribute('class', highlighted ? 'connection-highlight' : 'connection');
+        path.style.pointerEvents = 'stroke';
         path.setAttribute('data-source', sourceId);
         path.setAttribute('data-target', targetId);
         path.setAttribute('data-offset', offsetY);
@@ -265,90 +300,160 @@ const Renderer = {
     },
 
     /**
-     * 渲染完整图形
+     * 渲染图形：计算全部节点和连接线的位置（不创建元素），再同步视口内的元素
      */
     render(tasks, layout, highlightedEdges = new Set()) {
-        this.clear();
-        this.tasks = tasks;  // 保存 tasks 供 createConnectionElement 使用
+        this.tasks = tasks;
+        this.taskMap = new Map(tasks.map(task => [task.id, task]));
+        this.layout = layout;
+        this.highlightedEdges = highlightedEdges;
         this.initCornerDots();  // 初始化角打点数组
 
-        // 渲染九宫格
+        const { gridWidth, gridHeight } = Layout.CONFIG;
+        this.nodes = [];
         tasks.forEach(task => {
-            const grid = this.createGridElement(task, layout[task.id]);
-            this.layers.grids.appendChild(grid);
+            const { topLeft } = layout[task.id].grid;
+            this.nodes.push({
+                task,
+                x0: topLeft.x, y0: topLeft.y,
+                x1: topLeft.x + gridWidth, y1: topLeft.y + gridHeight
+            });
         });
 
-        // 第一遍：计算所有路径需要的 offset（不渲染）
-        const pathInfos = [];
+        // 计算所有路径的 offset：打点分配取决于全部连线的顺序，与视口无关，滚动时保持不变
+        const maxOffset = (Layout.CONFIG.connectionDotCount || 10) * (Layout.CONFIG.connectionOffsetUnit || 3);
+        this.paths = [];
+        const seen = new Set();
         tasks.forEach(task => {
             task.dependencies.forEach(depId => {
+                const key = `${depId}-${task.id}`;
                 const sourceLayout = layout[depId];
                 const targetLayout = layout[task.id];
+                if (seen.has(key) || !sourceLayout) return;
+                seen.add(key);
                 const { corners } = this.calculateBasePath(sourceLayout, targetLayout);
                 const offset = this.getOffsetForPath(corners);
 
-                pathInfos.push({
+                // 连线经过两端九宫格的角，包围盒为两个九宫格的并集（加上偏移量）
+                const source = sourceLayout.grid;
+                const target = targetLayout.grid;
+                this.paths.push({
+                    key,
                     sourceId: depId,
                     targetId: task.id,
-                    layoutMap: layout,
-                    corners,
                     offset,
-                    key: `${depId}-${task.id}`
+                    colorIndex: this.paths.length,
+                    x0: Math.min(source.topLeft.x, target.topLeft.x),
+                    x1: Math.max(source.bottomRight.x, target.bottomRight.x),
+                    y0: Math.min(source.topLeft.y, target.topLeft.y) - maxOffset,
+                    y1: Math.max(source.bottomRight.y, target.bottomRight.y) + maxOffset
                 });
             });
         });
 
-        // 第二遍：渲染所有连接线
-        const renderedConnections = new Set();
-        pathInfos.forEach(info => {
-            if (!renderedConnections.has(info.key)) {
-                const highlighted = highlightedEdges.has(info.key);
-                const connection = this.createConnectionElement(
-                    info.sourceId, info.targetId,
-                    info.layoutMap, highlighted, info.offset
-                );
-                this.layers.connections.appendChild(connection);
-                renderedConnections.add(info.key);
-            }
-        });
-
-        // 高亮处理
-        if (highlightedEdges.size > 0) {
-            const allConnections = this.layers.connections.querySelectorAll('.connection');
-            allConnections.forEach(conn => {
-                conn.style.opacity = '0.1';
-            });
-        }
-
-        // 整体调整连接线样式
-        this.adjustConnectionStyles(highlightedEdges);
+        // 更新 SVG 尺寸以支持滚动，再按新的可视范围同步元素
+        this.updateSvgSize(tasks, layout);
+        this.updateViewport();
+    },
 
-        // 添加连线悬浮事件
-        const connections = this.layers.connections.querySelectorAll('.connection, .connection-highlight');
-        connections.forEach(conn => {
-            conn.style.pointerEvents = 'stroke';
+    /**
+     * 滚动、窗口尺寸变化时合并到下一帧更新
+     */
+    scheduleViewportUpdate() {
+        if (this.frameRequested) return;
+        this.frameRequested = true;
+        requestAnimationFrame(() => {
+            this.frameRequested = false;
+            this.updateViewport();
+        });
+    },
 
-            conn.addEventListener('mouseenter', (e) => {
-                const sourceTitle = e.target.getAttribute('data-source-title');
-                const targetTitle = e.target.getAttribute('data-target-title');
-                if (sourceTitle && targetTitle) {
-                    Interaction.showConnectionTooltip(e.clientX, e.clientY, sourceTitle, targetTitle);
-                }
-            });
+    /**
+     * 当前可视范围（SVG 坐标，含预渲染边距）
+     */
+    getViewport() {
+        const svgRect = this.svg.getBoundingClientRect();
+        const containerRect = this.container.getBoundingClientRect();
+        const margin = this.VIEWPORT_MARGIN;
+        const x0 = containerRect.left - svgRect.left - margin;
+        const y0 = containerRect.top - svgRect.top - margin;
+        return {
+            x0,
+            y0,
+            x1: x0 + this.container.clientWidth + margin * 2,
+            y1: y0 + this.container.clientHeight + margin * 2
+        };
+    },
 
-            conn.addEventListener('mouseleave', () => {
-                Interaction.hideConnectionTooltip();
-            });
+    /**
+     * 同步视口内的元素：移除离开视口的，创建进入视口的，替换内容变化的
+     */
+    updateViewport() {
+        if (!this.svg) return;
+        const view = this.getViewport();
+        const inView = (item) => item.x1 >= view.x0 && item.x0 <= view.x1 && item.y1 >= view.y0 && item.y0 <= view.y1;
+
+        // 任务方块与九宫格
+        const visibleNodes = new Set();
+        this.nodes.forEach(node => {
+            if (!inView(node)) return;
+            const task = node.task;
+            visibleNodes.add(task.id);
+            const signature = `${node.x0},${node.y0}|${task.status}|${task.title}`;
+            const existing = this.nodeElements.get(task.id);
+            if (existing && existing.signature === signature) return;
+
+            const layout = this.layout[task.id];
+            const grid = this.createGridElement(task, layout);
+            const taskEl = this.createTaskElement(task, layout);
+            if (existing) {
+                existing.grid.replaceWith(grid);
+                existing.task.replaceWith(taskEl);
+            } else {
+                this.layers.grids.appendChild(grid);
+                this.layers.tasks.appendChild(taskEl);
+            }
+            this.nodeElements.set(task.id, { signature, grid, task: taskEl });
         });
-
-        // 渲染任务方块
-        tasks.forEach(task => {
-            const taskEl = this.createTaskElement(task, layout[task.id]);
-            this.layers.tasks.appendChild(taskEl);
+        this.nodeElements.forEach((elements, taskId) => {
+            if (!visibleNodes.has(taskId)) {
+                elements.grid.remove();
+                elements.task.remove();
+                this.nodeElements.delete(taskId);
+            }
         });
 
-        // 更新 SVG 尺寸以支持滚动
-        this.updateSvgSize(tasks, layout);
+        // 连接线：有高亮时其余连线变淡
+        const dimmed = this.highlightedEdges.size > 0;
+        const visibleEdges = new Set();
+        this.paths.forEach(info => {
+            if (!inView(info)) return;
+            visibleEdges.add(info.key);
+            const highlighted = this.highlightedEdges.has(info.key);
+            const source = this.layout[info.sourceId];
+            const target = this.layout[info.targetId];
+            const signature = [
+                source.x, source.y, target.x, target.y, info.offset, info.colorIndex, highlighted, dimmed,
+                this.taskMap.get(info.sourceId)?.title, this.taskMap.get(info.targetId)?.title
+            ].join('|');
+            const existing = this.edgeElements.get(info.key);
+            if (existing && existing.signature === signature) return;
+
+            const path = this.createConnectionElement(info.sourceId, info.targetId, this.layout, highlighted, info.offset);
+            this.styleConnection(path, info.colorIndex, highlighted, dimmed);
+            if (existing) {
+                existing.path.replaceWith(path);
+            } else {
+                this.layers.connections.appendChild(path);
+            }
+            this.edgeElements.set(info.key, { signature, path });
+        });
+        this.edgeElements.forEach((elements, key) => {
+            if (!visibleEdges.has(key)) {
+                elements.path.remove();
+                this.edgeElements.delete(key);
+            }
+        });
     },
 
     /**
@@ -360,18 +465,19 @@ const Renderer = {
                 layer.removeChild(layer.firstChild);
             }
         });
+        this.nodeElements.clear();
+        this.edgeElements.clear();
     },
 
     /**
-     * 整体调整连接线样式（在渲染最后调用）
-     * @param {Set} highlightedEdges - 高亮的边集合
+     * 连接线样式：按连线在全部连线中的序号取调色板颜色（与视口无关，滚动时颜色不变），
+     * 有高亮路径时其余连线变淡
      */
-    adjustConnectionStyles(highlightedEdges = new Set()) {
-        const allConnections = this.layers.connections.querySelectorAll('.connection, .connection-highlight');
-        allConnections.forEach((conn, index) => {
-            const color = this.connectionColors[index % this.connectionColors.length];
-            conn.style.stroke = color;
-        });
+    styleConnection(path, colorIndex, highlighted, dimmed) {
+        path.style.stroke = this.connectionColors[colorIndex % this.connectionColors.length];
+        if (dimmed && !highlighted) {
+            path.style.opacity = '0.1';
+        }
     },
 
     /**
@@ -406,27 +512,39 @@ const Renderer = {
      */
     highlightPaths(taskId, tasks, layout) {
         const highlightedEdges = new Set();
+        const taskMap = new Map(tasks.map(task => [task.id, task]));
+        const dependents = new Map();
+        tasks.forEach(t => {
+            t.dependencies.forEach(depId => {
+                if (!dependents.has(depId)) dependents.set(depId, []);
+                dependents.get(depId).push(t.id);
+            });
+        });
 
-        const findUpstream = (id) => {
-            const t = tasks.find(task => task.id === id);
-            if (t) {
-                t.dependencies.forEach(depId => {
-                    highlightedEdges.add(`${depId}-${id}`);
-                    findUpstream(depId);
-                });
-            }
-        };
-        findUpstream(taskId);
-
-        const findDownstream = (id) => {
-            tasks.forEach(t => {
-                if (t.dependencies.includes(id)) {
-                    highlightedEdges.add(`${id}-${t.id}`);
-                    findDownstream(t.id);
-                }
+        // 用显式栈遍历（长依赖链不会栈溢出），已加入的边不再展开
+        const upstream = [taskId];
+        while (upstream.length > 0) {
+            const id = upstream.pop();
+            const t = taskMap.get(id);
+            if (!t) continue;
+            t.dependencies.forEach(depId => {
+                const key = `${depId}-${id}`;
+                if (highlightedEdges.has(key)) return;
+                highlightedEdges.add(key);
+                upstream.push(depId);
             });
-        };
-        findDownstream(taskId);
+        }
+
+        const downstream = [taskId];
+        while (downstream.length > 0) {
+            const id = downstream.pop();
+            (dependents.get(id) || []).forEach(dependentId => {
+                const key = `${id}-${dependentId}`;
+                if (highlightedEdges.has(key)) return;
+                highlightedEdges.add(key);
+                downstream.push(dependentId);
+            });
+        }
 
         this.render(tasks, layout, highlightedEdges);
     }
@@ -0,0 +1,199 @@
+"""
+任务就绪状态
+
+task_readiness 表为每个任务保存是否已完成以及未完成的前置任务数：
+- 就绪（可以开始）：未完成，且所有前置任务都已完成
+- 阻塞：未完成，且至少一个前置任务未完成
+
+任务完成 / 重新打开时只调整直接后续任务的计数，添加、删除依赖只调整依赖方一行，
+查询就绪任务只需一次 (project_id, completed, unfinished_prerequisites) 索引查找。
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, delete, func, select, true, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+COMPLETED_STATUS = "completed"
+
+# 按任务ID重算时每条语句的ID数量上限（SQLite 绑定参数数量有限）
+REFRESH_CHUNK_SIZE = 500
+
+
+def is_completed(status: Optional[str]) -> bool:
+    return status == COMPLETED_STATUS
+
+
+def _adjust(db: Session, task_ids, delta: int) -> None:
+    db.execute(
+        update(models.TaskReadiness)
+        .where(models.TaskReadiness.task_id.in_(task_ids))
+        .values(unfinished_prerequisites=models.TaskReadiness.unfinished_prerequisites + delta)
+    )
+
+
+def _adjust_dependents(db: Session, task_id: int, delta: int) -> None:
+    """调整直接依赖 task_id 的任务的计数"""
+    dependents = select(models.Dependency.task_id).where(models.Dependency.depends_on_id == task_id)
+    _adjust(db, dependents, delta)
+
+
+# ==================== 增量维护（不提交，随调用方事务一起生效） ====================
+
+def task_created(db: Session, task_id: int, project_id: int, status: Optional[str]) -> None:
+    db.execute(insert(models.TaskReadiness).values(
+        task_id=task_id,
+        project_id=project_id,
+        completed=is_completed(status),
+        unfinished_prerequisites=0,
+    ))
+
+
+def task_deleted(db: Session, task_id: int, status: Optional[str]) -> None:
+    """需在删除任务的依赖边之前调用"""
+    if not is_completed(status):
+        _adjust_dependents(db, task_id, -1)
+    db.execute(delete(models.TaskReadiness).where(models.TaskReadiness.task_id == task_id))
+
+
+def task_changed(
+    db: Session,
+    task_id: int,
+    old_status: Optional[str],
+    new_status: Optional[str],
+    project_id: int,
+) -> None:
+    """任务状态变化或移动到其他项目"""
+    db.execute(
+        update(models.TaskReadiness)
+        .where(models.TaskReadiness.task_id == task_id)
+        .values(completed=is_completed(new_status), project_id=project_id)
+    )
+    if is_completed(old_status) != is_completed(new_status):
+        _adjust_dependents(db, task_id, -1 if is_completed(new_status) else 1)
+
+
+def dependency_added(db: Session, task_id: int, prerequisite_status: Optional[str]) -> None:
+    if not is_completed(prerequisite_status):
+        _adjust(db, [task_id], 1)
+
+
+def dependency_removed(db: Session, task_id: int, prerequisite_status: Optional[str]) -> None:
+    if not is_completed(prerequisite_status):
+        _adjust(db, [task_id], -1)
+
+
+# ==================== 按任务重算 ====================
+
+def _fresh_state_query():
+    """由 tasks / dependencies 直接计算的就绪状态"""
+    prerequisite = aliased(models.Task)
+    unfinished = (
+        select(func.count())
+        .select_from(models.Dependency)
+        .join(prerequisite, prerequisite.id == models.Dependency.depends_on_id)
+        .where(
+            models.Dependency.task_id == models.Task.id,
+            prerequisite.status.is_distinct_from(COMPLETED_STATUS)
+        )
+        .scalar_subquery()
+    )
+    return select(
+        models.Task.id,
+        models.Task.project_id,
+        case((models.Task.status == COMPLETED_STATUS, True), else_=False),
+        unfinished,
+    )
+
+
+def _upsert(db: Session, source) -> None:
+    # INSERT ... SELECT 后接 ON CONFLICT 时 SQLite 要求 SELECT 带 WHERE 子句以消除语法歧义
+    stmt = insert(models.TaskReadiness).from_select(
+        ["task_id", "project_id", "completed", "unfinished_prerequisites"], source.where(true())
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["task_id"],
+        set_={
+            "project_id": stmt.excluded.project_id,
+            "completed": stmt.excluded.completed,
+            "unfinished_prerequisites": stmt.excluded.unfinished_prerequisites,
+        },
+    )
+    db.execute(stmt)
+
+
+def refresh(db: Session, task_ids: Iterable[int] = (), prerequisite_ids: Iterable[int] = ()) -> None:
+    """
+    按 tasks / dependencies 的当前内容重算指定任务，以及 prerequisite_ids 的直接后续任务
+    批量写入在全部修改完成后调用一次（不提交）
+    """
+    task_ids = set(task_ids)
+    prerequisite_ids = list(prerequisite_ids)
+    for start in range(0, len(prerequisite_ids), REFRESH_CHUNK_SIZE):
+        chunk = prerequisite_ids[start:start + REFRESH_CHUNK_SIZE]
+        task_ids.update(db.execute(
+            select(models.Dependency.task_id).where(models.Dependency.depends_on_id.in_(chunk))
+        ).scalars())
+
+    task_ids = sorted(task_ids)
+    for start in range(0, len(task_ids), REFRESH_CHUNK_SIZE):
+        chunk = task_ids[start:start + REFRESH_CHUNK_SIZE]
+        # 已删除的任务不会出现在查询结果中，其旧行一并清除
+        db.execute(delete(models.TaskReadiness).where(
+            models.TaskReadiness.task_id.in_(chunk),
+            models.TaskReadiness.task_id.not_in(select(models.Task.id).where(models.Task.id.in_(chunk)))
+        ))
+        _upsert(db, _fresh_state_query().where(models.Task.id.in_(chunk)))
+
+
+def refresh_project(db: Session, project_id: int) -> None:
+    """重算一个项目全部任务的就绪状态（整项目导入后调用一次，不提交）"""
+    _upsert(db, _fresh_state_query().where(models.Task.project_id == project_id))
+
+
+def rebuild(db: Session) -> None:
+    """从 tasks / dependencies 重建全部就绪状态（用于初始化已有数据库）"""
+    db.query(models.TaskReadiness).delete()
+    _upsert(db, _fresh_state_query())
+    db.commit()
+
+
+# ==================== 查询 ====================
+
+def ready_tasks(db: Session, project_id: Optional[int] = None) -> List:
+    """未完成且所有前置任务都已完成的任务"""
+    query = db.query(*models.TASK_COLUMNS).join(
+        models.TaskReadiness, models.TaskReadiness.task_id == models.Task.id
+    ).filter(
+        models.TaskReadiness.completed.is_(False),
+        models.TaskReadiness.unfinished_prerequisites == 0
+    )
+    if project_id is not None:
+        query = query.filter(models.TaskReadiness.project_id == project_id)
+    return query.order_by(models.Task.id).all()
+
+
+def check_consistency(db: Session) -> Dict[str, List[int]]:
+    """
+    将维护的状态与从头计算的结果比对
+    返回 {"mismatched": 状态不一致的任务, "missing": 缺少状态行的任务, "extra": 多余的状态行}
+    """
+    fresh = {row[0]: tuple(row[1:]) for row in db.execute(_fresh_state_query())}
+    stored = {
+        row[0]: tuple(row[1:]) for row in db.query(
+            models.TaskReadiness.task_id,
+            models.TaskReadiness.project_id,
+            models.TaskReadiness.completed,
+            models.TaskReadiness.unfinished_prerequisites,
+        )
+    }
+    return {
+        "mismatched": sorted(
+            task_id for task_id in fresh.keys() & stored.keys()
+            if tuple(map(int, fresh[task_id])) != tuple(map(int, stored[task_id]))
+        ),
+        "missing": sorted(fresh.keys() - stored.keys()),
+        "extra": sorted(stored.keys() - fresh.keys()),
+    }
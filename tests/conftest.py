@@ -0,0 +1,65 @@
+"""
+测试公共设置
+
+应用在导入时按 TASK_MANAGER_* 环境变量初始化，因此先把数据库指向临时目录再导入 main。
+各测试共用一个数据库，每个测试新建自己的项目，只检查自己创建的数据。
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="task-manager-tests-")
+
+os.environ["TASK_MANAGER_DB_PATH"] = os.path.join(TEST_DIR, "tasks.db")
+for key in ("TASK_MANAGER_INITIALIZED", "TASK_MANAGER_CACHE_SYNC", "TASK_MANAGER_WORKERS", "TASK_MANAGER_DB_MODE",
+            "TASK_MANAGER_GROUP_COMMIT", "TASK_MANAGER_ARCHIVE_INTERVAL_HOURS"):
+    os.environ.pop(key, None)
+sys.path.insert(0, ROOT)
+# 静态文件目录按相对路径挂载
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def api(client):
+    return Api(client)
+
+
+class Api:
+    """常用写操作的简写，失败时直接断言"""
+
+    # 项目名全局唯一：各测试的 Api 实例共用一个计数器
+    _names = itertools.count(1)
+
+    def __init__(self, client):
+        self.client = client
+
+    def project(self, name: str = "test") -> int:
+        response = self.client.post("/api/projects", json={"name": f"{name}-{next(self._names)}"})
+        assert response.status_code == 201, response.text
+        return response.json()["id"]
+
+    def task(self, project_id: int, title: str = "task", status: str = None) -> int:
+        body = {"title": title, "project_id": project_id}
+        if status is not None:
+            body["status"] = status
+        response = self.client.post("/api/tasks", json=body)
+        assert response.status_code == 201, response.text
+        return response.json()["id"]
+
+    def depend(self, task_id: int, depends_on_id: int) -> None:
+        response = self.client.post(f"/api/tasks/{task_id}/dependencies", json={"depends_on_id": depends_on_id})
+        assert response.status_code < 300, response.text
@@ -0,0 +1,36 @@
+"""
+压缩响应的条件请求：每种编码一个强 ETag，带 Vary: Accept-Encoding，用它验证仍返回 304
+"""
+import pytest
+
+
+@pytest.fixture
+def snapshot_url(client, api):
+    project_id = api.project("compression")
+    for i in range(30):
+        api.task(project_id, f"压缩响应中的任务 {i}")
+    return f"/api/tasks/with-dependencies?project_id={project_id}"
+
+
+def test_compressed_response_has_strong_etag_per_encoding(client, snapshot_url):
+    plain = client.get(snapshot_url, headers={"Accept-Encoding": "identity"})
+    first = client.get(snapshot_url, headers={"Accept-Encoding": "gzip"})
+    second = client.get(snapshot_url, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in first.headers["vary"]
+    assert "Accept-Encoding" in plain.headers["vary"]
+    assert first.content == plain.content
+
+    etag = first.headers["etag"]
+    assert not etag.startswith("W/")
+    assert etag == second.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    response = client.get(snapshot_url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    # 未压缩响应的 ETag 照常验证
+    response = client.get(snapshot_url, headers={"Accept-Encoding": "identity", "If-None-Match": plain.headers["etag"]})
+    assert response.status_code == 304
+    assert response.headers["etag"] == plain.headers["etag"]
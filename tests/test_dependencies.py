@@ -0,0 +1,79 @@
+"""
+循环依赖检测：其他连接已提交、尚未更新到内存索引的依赖也参与检测
+
+模拟另一个进程（或本进程尚未执行提交后回调的请求）：直接写入依赖和变更记录，不更新索引。
+"""
+import pytest
+
+import change_log
+import models
+import task_readiness
+from database import SessionLocal
+from graph_index import dependency_graph
+
+
+@pytest.fixture
+def commit_elsewhere():
+    """返回写入依赖而不更新索引的函数；测试结束时（包括断言失败）让索引追上数据库"""
+    def commit(project_id: int, task_id: int, depends_on_id: int) -> None:
+        with SessionLocal() as db:
+            dependency_graph.ensure_loaded(db)
+            dependency = models.Dependency(task_id=task_id, depends_on_id=depends_on_id)
+            db.add(dependency)
+            db.flush()
+            task_readiness.dependency_added(db, task_id, "pending")
+            change_log.record(
+                db, "dependency", "created", dependency.id, [project_id],
+                task_id=task_id, depends_on_id=depends_on_id
+            )
+            db.commit()
+        assert not dependency_graph.has_edge(task_id, depends_on_id)
+
+    try:
+        yield commit
+    finally:
+        dependency_graph.catch_up()
+
+
+def assert_consistent(client) -> None:
+    report = client.get("/api/dependencies/consistency").json()
+    assert report["consistent"], report
+
+
+def test_cycle_rejected_when_index_lags_committed_edges(client, api, commit_elsewhere):
+    """c 依赖 a，a 依赖 b 已提交但不在索引中：添加 b 依赖 c 成环"""
+    project_id = api.project("cycle")
+    a, b, c = (api.task(project_id, name) for name in "abc")
+    api.depend(c, a)
+    commit_elsewhere(project_id, a, b)
+
+    response = client.post(f"/api/tasks/{b}/dependencies", json={"depends_on_id": c})
+    assert response.status_code == 400, response.text
+    assert client.get(f"/api/tasks/{b}").json()["dependencies"] == []
+
+    # 不成环的依赖照常添加
+    response = client.post(f"/api/tasks/{c}/dependencies", json={"depends_on_id": b})
+    assert response.status_code == 200, response.text
+    assert_consistent(client)
+
+
+def test_batch_cycle_rejected_when_index_lags_committed_edges(client, api, commit_elsewhere):
+    """批量操作同样按已提交的依赖检测，整批回滚"""
+    project_id = api.project("batch-cycle")
+    a, b, c = (api.task(project_id, name) for name in "abc")
+    api.depend(c, a)
+    commit_elsewhere(project_id, a, b)
+
+    response = client.post("/api/batch", json={"operations": [
+        {"op": "create_task", "ref": "d", "title": "d", "project_id": project_id},
+        {"op": "add_dependency", "task_id": b, "depends_on_id": c},
+    ]})
+    assert response.status_code == 400, response.text
+    assert client.get(f"/api/tasks/{b}").json()["dependencies"] == []
+    assert_consistent(client)
+
+    response = client.post("/api/batch", json={"operations": [
+        {"op": "add_dependency", "task_id": c, "depends_on_id": b},
+    ]})
+    assert response.status_code == 200, response.text
+    assert_consistent(client)
@@ -0,0 +1,88 @@
+"""
+后台作业：状态与项目占用保存在数据库中
+
+多进程部署时其他进程启动的作业以数据库中的记录出现：这里直接写入作业和占用行来模拟。
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import models
+import project_jobs
+from database import SessionLocal
+
+
+def wait(client, job: dict) -> dict:
+    deadline = time.monotonic() + 30
+    while job["running"]:
+        assert time.monotonic() < deadline, job
+        time.sleep(0.05)
+        response = client.get(f"/api/jobs/{job['id']}")
+        assert response.status_code == 200, response.text
+        job = response.json()
+    return job
+
+
+def other_worker_job(project_id: int, heartbeat_age: float = 0) -> int:
+    """模拟另一个进程正在运行的作业，返回作业ID"""
+    heartbeat = datetime.now(timezone.utc) - timedelta(seconds=heartbeat_age)
+    with SessionLocal() as db:
+        job = models.BackgroundJob(
+            kind=project_jobs.DELETE_PROJECT, running=True, project_id=project_id, batch_size=10,
+            started_at=heartbeat.isoformat(timespec="seconds"),
+        )
+        db.add(job)
+        db.flush()
+        db.add(models.JobClaim(
+            project_id=project_id, job_id=job.id, heartbeat_at=heartbeat.isoformat(timespec="seconds")
+        ))
+        db.commit()
+        return job.id
+
+
+def test_merge_job_progress_is_stored(client, api):
+    source, target = api.project("jobs-source"), api.project("jobs-target")
+    ids = [api.task(source, f"task {i}") for i in range(7)]
+    api.depend(ids[1], ids[0])
+
+    response = client.post(f"/api/projects/{source}/merge?batch_size=3", json={"target_project_id": target})
+    assert response.status_code == 202, response.text
+    job = wait(client, response.json())
+    assert job["error"] is None
+    assert (job["tasks"], job["dependencies"], job["batches"], job["total_tasks"]) == (7, 1, 3, 7)
+    assert job["finished_at"] is not None
+    assert job["id"] in [other["id"] for other in client.get("/api/jobs").json()]
+    assert client.get(f"/api/projects/{source}").status_code == 404
+    with SessionLocal() as db:
+        assert db.query(models.JobClaim).filter(models.JobClaim.job_id == job["id"]).count() == 0
+
+
+def test_project_claimed_by_other_worker_is_rejected(client, api):
+    project_id, target = api.project("jobs-busy"), api.project("jobs-busy-target")
+    api.task(project_id)
+    job_id = other_worker_job(project_id)
+
+    assert client.get(f"/api/jobs/{job_id}").json()["running"] is True
+    response = client.delete(f"/api/projects/{project_id}?cascade=true")
+    assert response.status_code == 409, response.text
+    response = client.post(f"/api/projects/{target}/merge", json={"target_project_id": project_id})
+    assert response.status_code == 409, response.text
+
+    # 另一个进程的作业结束后可以启动
+    with SessionLocal() as db:
+        project_jobs.finish_job(db, job_id, None)
+    response = client.delete(f"/api/projects/{project_id}?cascade=true")
+    assert response.status_code == 202, response.text
+    assert wait(client, response.json())["error"] is None
+
+
+def test_stale_claim_is_taken_over(client, api):
+    project_id = api.project("jobs-stale")
+    api.task(project_id)
+    job_id = other_worker_job(project_id, heartbeat_age=project_jobs.JOB_STALE + 60)
+
+    response = client.delete(f"/api/projects/{project_id}?cascade=true")
+    assert response.status_code == 202, response.text
+    assert wait(client, response.json())["error"] is None
+    abandoned = client.get(f"/api/jobs/{job_id}").json()
+    assert abandoned["running"] is False
+    assert abandoned["error"]
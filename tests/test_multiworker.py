@@ -0,0 +1,99 @@
+"""
+多进程部署：两个应用进程共用一个数据库文件（TASK_MANAGER_CACHE_SYNC=1）
+
+- 一个进程写入后，另一个进程已缓存的 /api/tasks/with-dependencies 立即反映这次写入
+- 一个进程添加 A 依赖 B 后，另一个进程添加 B 依赖 A 被判定为循环依赖
+- 一个进程启动的后台作业可以在另一个进程查询进度
+
+进程的启动与停止沿用 benchmarks/multiworker.py；那里的压测（多进程、多轮、SSE 延迟）单独运行。
+"""
+import time
+
+import pytest
+
+from benchmarks.multiworker import start_workers, stop_workers, wait_ready
+
+httpx = pytest.importorskip("httpx")
+
+
+@pytest.fixture(scope="module")
+def workers(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("multiworker")
+    started = start_workers(2, str(workdir / "multiworker.db"), interval_ms=50, log_dir=str(workdir))
+    try:
+        with httpx.Client(timeout=30) as http:
+            wait_ready(http, started)
+            yield http, [worker["url"] for worker in started]
+    finally:
+        stop_workers(started)
+
+
+def post(http, url: str, body: dict) -> dict:
+    response = http.post(url, json=body)
+    assert response.status_code in (200, 201), response.text
+    return response.json()
+
+
+def snapshot(http, url: str, project_id: int) -> dict:
+    response = http.get(url + "/api/tasks/with-dependencies", params={"project_id": project_id})
+    assert response.status_code == 200, response.text
+    return {task["id"]: sorted(task["dependencies"]) for task in response.json()}
+
+
+def test_cached_snapshot_reflects_other_worker_writes(workers):
+    http, (first, second) = workers
+    project_id = post(http, first + "/api/projects", {"name": "multiworker-snapshot"})["id"]
+    previous = None
+    for i in range(10):
+        writer, reader = (first, second) if i % 2 == 0 else (second, first)
+        # 预热读取进程的缓存，之后另一个进程的写入必须使其失效
+        before = snapshot(http, reader, project_id)
+        snapshot(http, reader, project_id)
+
+        task_id = post(http, writer + "/api/tasks", {"title": f"task {i}", "project_id": project_id})["id"]
+        if previous is not None:
+            post(http, writer + f"/api/tasks/{task_id}/dependencies", {"depends_on_id": previous})
+        after = snapshot(http, reader, project_id)
+        assert set(after) == set(before) | {task_id}
+        assert after[task_id] == ([] if previous is None else [previous])
+        previous = task_id
+
+
+def test_cycle_across_workers_is_rejected(workers):
+    http, (first, second) = workers
+    project_id = post(http, first + "/api/projects", {"name": "multiworker-cycle"})["id"]
+    for i in range(5):
+        a, b, c = (
+            post(http, first + "/api/tasks", {"title": f"cycle {i} {name}", "project_id": project_id})["id"]
+            for name in "abc"
+        )
+        # 两个进程的依赖索引都已加载，否则首次使用时从数据库读取，检查不出索引过期
+        post(http, second + f"/api/tasks/{c}/dependencies", {"depends_on_id": a})
+        post(http, first + f"/api/tasks/{c}/dependencies", {"depends_on_id": b})
+
+        post(http, first + f"/api/tasks/{a}/dependencies", {"depends_on_id": b})
+        response = http.post(second + f"/api/tasks/{b}/dependencies", json={"depends_on_id": a})
+        assert response.status_code == 400, response.text
+
+        # 另一个进程删除这条依赖后，反方向的依赖可以添加
+        assert http.delete(first + f"/api/tasks/{a}/dependencies/{b}").status_code < 300
+        post(http, second + f"/api/tasks/{b}/dependencies", {"depends_on_id": a})
+
+
+def test_job_status_visible_from_other_worker(workers):
+    http, (first, second) = workers
+    project_id = post(http, first + "/api/projects", {"name": "multiworker-job"})["id"]
+    for i in range(3):
+        post(http, first + "/api/tasks", {"title": f"job {i}", "project_id": project_id})
+    response = http.delete(first + f"/api/projects/{project_id}?cascade=true")
+    assert response.status_code == 202, response.text
+    job_id = response.json()["id"]
+
+    for _ in range(200):
+        response = http.get(second + f"/api/jobs/{job_id}")
+        assert response.status_code == 200, response.text
+        if not response.json()["running"]:
+            break
+        time.sleep(0.05)
+    assert response.json()["tasks"] == 3
+    assert job_id in [job["id"] for job in http.get(second + "/api/jobs").json()]
@@ -0,0 +1,52 @@
+"""
+GET /api/tasks 的键集分页：JSON 与 NDJSON 输出都能按 X-Next-Cursor 翻完全部任务
+"""
+import json
+
+import pytest
+
+
+def pages(client, project_id: int, limit: int, order_by: str, ndjson: bool):
+    params = {"project_id": project_id, "limit": limit, "order_by": order_by}
+    if ndjson:
+        params["format"] = "ndjson"
+    result = []
+    while True:
+        response = client.get("/api/tasks", params=params)
+        assert response.status_code == 200, response.text
+        if ndjson:
+            rows = [json.loads(line) for line in response.text.splitlines()]
+        else:
+            rows = response.json()
+        assert len(rows) <= limit
+        result.append([row["id"] for row in rows])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return result
+        params["cursor"] = cursor
+
+
+@pytest.mark.parametrize("order_by", ["id", "created_at"])
+@pytest.mark.parametrize("limit", [1, 3, 7, 10])
+def test_ndjson_pages_match_json_pages(client, api, order_by, limit):
+    project_id = api.project("pagination")
+    task_ids = [api.task(project_id, f"task {i}") for i in range(7)]
+
+    json_pages = pages(client, project_id, limit, order_by, ndjson=False)
+    ndjson_pages = pages(client, project_id, limit, order_by, ndjson=True)
+    assert ndjson_pages == json_pages
+    assert sorted(sum(ndjson_pages, [])) == task_ids
+
+
+def test_ndjson_cursor_continues_after_later_writes(client, api):
+    project_id = api.project("pagination")
+    first = [api.task(project_id) for _ in range(3)]
+    response = client.get("/api/tasks", params={"project_id": project_id, "limit": 2, "format": "ndjson"})
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == first[:2]
+
+    later = api.task(project_id)
+    response = client.get("/api/tasks", params={
+        "project_id": project_id, "limit": 2, "format": "ndjson", "cursor": response.headers["X-Next-Cursor"]
+    })
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [first[2], later]
+    assert "X-Next-Cursor" not in response.headers
@@ -0,0 +1,106 @@
+"""
+任务及依赖的读取接口：SQL 语句数不随任务数、依赖数增长（无 N+1 查询）
+"""
+import time
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from database import engine
+from response_cache import response_cache
+
+# 小项目与大项目的任务数：逐行查询时大项目会多出上万条语句
+SMALL, LARGE = 10, 10000
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def build_project(client, api, size: int):
+    """size 个任务：每个任务依赖前一个任务和第一个任务（第一个任务有 size - 1 个后续任务）"""
+    project_id = api.project(f"queries-{size}")
+    operations = [
+        {"op": "create_task", "ref": f"t{i}", "title": f"task {i}", "project_id": project_id}
+        for i in range(size)
+    ]
+    for i in range(1, size):
+        operations.append({"op": "add_dependency", "task_id": f"t{i}", "depends_on_id": f"t{i - 1}"})
+        if i > 1:
+            operations.append({"op": "add_dependency", "task_id": f"t{i}", "depends_on_id": "t0"})
+    response = client.post("/api/batch", json={"operations": operations})
+    assert response.status_code == 200, response.text
+    refs = response.json()["refs"]
+    ids = [refs[f"t{i}"] for i in range(size)]
+    return project_id, ids
+
+
+def statements_for(client, url: str) -> int:
+    # 每次都走冷路径，响应缓存命中时不会执行查询
+    response_cache.clear()
+    with count_statements() as statements:
+        response = client.get(url)
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+@pytest.fixture(scope="module")
+def projects(client):
+    from conftest import Api
+
+    api = Api(client)
+    built = {size: build_project(client, api, size) for size in (SMALL, LARGE)}
+    yield built
+    # 其他测试共用数据库：删除大项目，避免拖慢之后按全表重建比对的测试
+    for project_id, _ in built.values():
+        response = client.delete(f"/api/projects/{project_id}?cascade=true&batch_size=10000")
+        assert response.status_code == 202, response.text
+        job = response.json()
+        deadline = time.monotonic() + 60
+        while job["running"]:
+            assert time.monotonic() < deadline, job
+            time.sleep(0.05)
+            job = client.get(f"/api/jobs/{job['id']}").json()
+
+
+@pytest.mark.parametrize("format", ["json", "compact"])
+def test_with_dependencies_query_count_is_constant(client, projects, format):
+    counts = {}
+    for size, (project_id, _) in projects.items():
+        url = f"/api/tasks/with-dependencies?project_id={project_id}&format={format}"
+        statements_for(client, url)
+        counts[size] = statements_for(client, url)
+    assert counts[SMALL] > 0
+    assert counts[SMALL] == counts[LARGE], counts
+
+
+def test_with_dependencies_returns_all_edges(client, projects):
+    project_id, ids = projects[LARGE]
+    response_cache.clear()
+    tasks = {task["id"]: task for task in client.get(f"/api/tasks/with-dependencies?project_id={project_id}").json()}
+    assert len(tasks) == LARGE
+    assert sorted(tasks[ids[0]]["dependents"]) == sorted(ids[1:])
+    assert sorted(tasks[ids[-1]]["dependencies"]) == sorted([ids[0], ids[-2]])
+
+
+def test_task_detail_query_count_is_constant(client, projects):
+    counts = {}
+    for size, (_, ids) in projects.items():
+        # 第一个任务的后续任务数随项目规模增长
+        url = f"/api/tasks/{ids[0]}"
+        statements_for(client, url)
+        counts[size] = statements_for(client, url)
+        assert len(client.get(url).json()["dependents"]) == size - 1
+    assert counts[SMALL] > 0
+    assert counts[SMALL] == counts[LARGE], counts
@@ -0,0 +1,20 @@
+"""
+全文搜索结果的字段与其他任务接口一致
+"""
+import pytest
+
+import search
+
+
+@pytest.mark.skipif(not search.available, reason="当前 SQLite 不支持 FTS5")
+@pytest.mark.parametrize("query", ["quarterly", "qu"])
+def test_search_results_match_task_detail(client, api, query):
+    project_id = api.project("search")
+    task_id = api.task(project_id, "quarterly report")
+
+    results = client.get("/api/tasks/search", params={"q": query, "project_id": project_id}).json()
+    detail = client.get(f"/api/tasks/{task_id}").json()
+    assert [result["id"] for result in results] == [task_id]
+    for field in ("id", "title", "description", "status", "project_id", "created_at"):
+        assert results[0][field] == detail[field], field
+    assert "T" in results[0]["created_at"]
@@ -0,0 +1,182 @@
+"""
+增量维护的旁路状态与从头重建的结果一致
+
+按固定种子随机执行创建任务、增删依赖、修改状态、删除任务、批量操作（含失败回滚的批次）和移动任务，
+每一步之后比对：
+- task_readiness、project_task_counts 与各自 rebuild() 的结果（在回滚的事务中重建，不改动数据）
+- 依赖关系内存索引与 dependencies 表
+
+计数表被改坏时一致性接口指出出错的项目，rebuild_side_tables() 恢复（启动时不再重建）。
+"""
+import random
+
+import pytest
+from sqlalchemy.orm import Session
+
+import migrations
+import models
+import project_jobs
+import project_stats
+import task_readiness
+from database import SessionLocal, engine
+from graph_index import dependency_graph
+from write_queue import run_write
+
+STATUSES = ["pending", "in_progress", "completed"]
+STEPS = 120
+
+
+def stored_state(db: Session):
+    readiness = {
+        row.task_id: (row.project_id, bool(row.completed), row.unfinished_prerequisites)
+        for row in db.query(models.TaskReadiness)
+    }
+    return readiness, project_stats.get_counts(db)
+
+
+def rebuilt_state():
+    """在外层事务中调用 rebuild()（其提交只释放保存点），读取结果后整体回滚"""
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            with Session(bind=connection, join_transaction_mode="create_savepoint") as db:
+                task_readiness.rebuild(db)
+                project_stats.rebuild(db)
+                return stored_state(db)
+        finally:
+            transaction.rollback()
+
+
+def assert_consistent(step: str) -> None:
+    with SessionLocal() as db:
+        stored = stored_state(db)
+        graph = dependency_graph.check_consistency(db)
+    assert dependency_graph.loaded, step
+    assert graph == {"missing": [], "extra": []}, step
+    expected = rebuilt_state()
+    assert stored[0] == expected[0], f"task_readiness 与重建结果不一致：{step}"
+    assert stored[1] == expected[1], f"project_task_counts 与重建结果不一致：{step}"
+
+
+class RandomWorkload:
+    def __init__(self, client, api, seed: int):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.projects = [api.project(f"side-tables-{seed}") for _ in range(2)]
+        self.tasks = []
+
+    def existing_edges(self):
+        edges = []
+        for task_id in self.tasks:
+            for depends_on_id in self.client.get(f"/api/tasks/{task_id}").json()["dependencies"]:
+                edges.append((task_id, depends_on_id))
+        return edges
+
+    def pair(self):
+        return self.rng.sample(self.tasks, 2)
+
+    def create(self):
+        body = {"title": "t", "project_id": self.rng.choice(self.projects), "status": self.rng.choice(STATUSES)}
+        response = self.client.post("/api/tasks", json=body)
+        assert response.status_code == 201
+        self.tasks.append(response.json()["id"])
+        return f"create {self.tasks[-1]}"
+
+    def add_edge(self):
+        task_id, depends_on_id = self.pair()
+        response = self.client.post(f"/api/tasks/{task_id}/dependencies", json={"depends_on_id": depends_on_id})
+        # 循环依赖或重复的边被拒绝
+        assert response.status_code in (200, 400), response.text
+        return f"add {task_id}->{depends_on_id} ({response.status_code})"
+
+    def remove_edge(self):
+        edges = self.existing_edges()
+        if not edges:
+            return self.add_edge()
+        task_id, depends_on_id = self.rng.choice(edges)
+        response = self.client.delete(f"/api/tasks/{task_id}/dependencies/{depends_on_id}")
+        assert response.status_code < 300, response.text
+        return f"remove {task_id}->{depends_on_id}"
+
+    def set_status(self):
+        task_id = self.rng.choice(self.tasks)
+        status = self.rng.choice(STATUSES)
+        response = self.client.put(f"/api/tasks/{task_id}", json={"status": status})
+        assert response.status_code == 200, response.text
+        return f"status {task_id}={status}"
+
+    def delete(self):
+        task_id = self.rng.choice(self.tasks)
+        response = self.client.delete(f"/api/tasks/{task_id}")
+        assert response.status_code == 204, response.text
+        self.tasks.remove(task_id)
+        return f"delete {task_id}"
+
+    def batch(self):
+        operations = [{"op": "create_task", "ref": "new", "title": "b", "project_id": self.rng.choice(self.projects)}]
+        for _ in range(self.rng.randint(1, 5)):
+            task_id, depends_on_id = self.pair()
+            kind = self.rng.choice(["add_dependency", "remove_dependency", "update_task", "link_new"])
+            if kind == "update_task":
+                operations.append({"op": "update_task", "task_id": task_id, "status": self.rng.choice(STATUSES)})
+            elif kind == "link_new":
+                operations.append({"op": "add_dependency", "task_id": "new", "depends_on_id": depends_on_id})
+            else:
+                operations.append({"op": kind, "task_id": task_id, "depends_on_id": depends_on_id})
+        if self.rng.random() < 0.3:
+            victim = self.rng.choice(self.tasks)
+            operations.append({"op": "delete_task", "task_id": victim})
+        response = self.client.post("/api/batch", json={"operations": operations})
+        # 任一操作失败（循环、依赖不存在等）时整批回滚
+        assert response.status_code in (200, 400, 404, 409), response.text
+        if response.status_code == 200:
+            self.tasks.append(response.json()["refs"]["new"])
+            for operation in operations:
+                if operation["op"] == "delete_task":
+                    self.tasks.remove(operation["task_id"])
+        return f"batch {operations} ({response.status_code})"
+
+    def move(self):
+        task_ids = self.rng.sample(self.tasks, min(len(self.tasks), self.rng.randint(1, 4)))
+        target = self.rng.choice(self.projects)
+        run_write(project_jobs.move_batch, task_ids, target)
+        return f"move {task_ids} -> {target}"
+
+    def step(self):
+        if len(self.tasks) < 4:
+            return self.create()
+        action = self.rng.choices(
+            [self.create, self.add_edge, self.remove_edge, self.set_status, self.delete, self.batch, self.move],
+            weights=[3, 5, 2, 4, 1, 2, 1],
+        )[0]
+        return action()
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_incremental_state_matches_rebuild(client, api, seed):
+    with SessionLocal() as db:
+        dependency_graph.ensure_loaded(db)
+    workload = RandomWorkload(client, api, seed)
+    assert_consistent("初始")
+    history = []
+    for _ in range(STEPS):
+        history.append(workload.step())
+        assert_consistent(" / ".join(history[-5:]))
+
+
+def test_consistency_reports_and_rebuild_repairs_counts(client, api):
+    project_id = api.project("counts")
+    api.task(project_id, "a")
+    with SessionLocal() as db:
+        db.query(models.ProjectTaskCount).filter(models.ProjectTaskCount.project_id == project_id).update(
+            {models.ProjectTaskCount.count: 5}
+        )
+        db.commit()
+    report = client.get("/api/dependencies/consistency").json()
+    assert not report["consistent"]
+    assert report["project_counts"] == [project_id]
+
+    migrations.rebuild_side_tables(engine)
+    report = client.get("/api/dependencies/consistency").json()
+    assert report["consistent"], report
+    assert report["project_counts"] == []
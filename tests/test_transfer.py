@@ -0,0 +1,72 @@
+"""
+项目导出与导入
+"""
+import tempfile
+
+from sqlalchemy import text
+
+import project_transfer
+from database import SessionLocal
+
+
+def snapshot(client, project_id: int):
+    """按标题表示的任务状态和依赖边（与ID无关）"""
+    tasks = client.get(f"/api/tasks/with-dependencies?project_id={project_id}").json()
+    titles = {task["id"]: task["title"] for task in tasks}
+    return (
+        sorted((task["title"], task["status"]) for task in tasks),
+        sorted((titles[task["id"]], titles[dep]) for task in tasks for dep in task["dependencies"]),
+    )
+
+
+def build(client, api):
+    project_id = api.project("transfer")
+    ids = [api.task(project_id, f"task {i}", status="completed" if i % 3 == 0 else None) for i in range(12)]
+    for i in range(1, 12):
+        api.depend(ids[i], ids[i - 1])
+        if i > 2:
+            api.depend(ids[i], ids[i // 2])
+    return project_id
+
+
+def test_ndjson_and_csv_round_trip(client, api):
+    project_id = build(client, api)
+    expected = snapshot(client, project_id)
+    for format in ("ndjson", "csv"):
+        body = client.get(f"/api/projects/{project_id}/export?format={format}").content
+        response = client.post(
+            f"/api/projects/import?format={format}&name=copy-{format}-{project_id}", content=body
+        )
+        assert response.status_code == 201, response.text
+        assert snapshot(client, response.json()["project"]["id"]) == expected
+
+
+def test_import_maps_ids_when_sequence_lags(client, api):
+    """自增序列落后于已用过的ID（旧库重建 tasks 表后）时，导入仍按正确的新ID写入依赖"""
+    project_id = build(client, api)
+    expected = snapshot(client, project_id)
+    body = client.get(f"/api/projects/{project_id}/export").content
+    # 删除最大ID的任务，再把序列退回到更小的值：下一个自动分配的ID会与被删除的ID重复
+    doomed = api.task(project_id, "doomed")
+    client.delete(f"/api/tasks/{doomed}")
+    with SessionLocal() as db:
+        db.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'tasks'"), {"seq": doomed - 20})
+        db.commit()
+
+    response = client.post(f"/api/projects/import?name=lagging-{project_id}", content=body)
+    assert response.status_code == 201, response.text
+    imported = response.json()["project"]["id"]
+    assert snapshot(client, imported) == expected
+    ids = [task["id"] for task in client.get(f"/api/tasks?project_id={imported}").json()]
+    assert sorted(ids) == list(range(min(ids), min(ids) + len(ids)))
+    assert client.get("/api/dependencies/consistency").json()["consistent"]
+
+
+def test_read_csv_from_spooled_file():
+    spool = tempfile.SpooledTemporaryFile(max_size=1024)
+    spool.write('﻿id,title,description,depends_on\r\n1,"多行\n描述",x\r\n2,b,"a,""q""\r\nz",1\r\n'.encode("utf-8"))
+    spool.seek(0)
+    records = [record for _, record in project_transfer.read_csv(spool)]
+    assert records[0]["title"] == "多行\n描述"
+    assert records[1]["description"] == 'a,"q"\r\nz'
+    assert records[2] == {"type": "dependency", "task_id": "2", "depends_on_id": "1"}
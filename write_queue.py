@@ -0,0 +1,266 @@
+"""
+写入组提交（TASK_MANAGER_GROUP_COMMIT=1）
+
+SQLite 同一时刻只允许一个写事务，每次提交都要写 WAL 并同步磁盘。并发写入时，
+各线程的写事务在写锁上排队，每个请求单独付出一次提交（fsync）的开销。
+
+开启组提交后，写接口不再在线程池中直接执行，而是提交到单个写入线程的队列：
+
+1. 写入线程取出队列中已积压的操作（至多 MAX_BATCH 个，可等待 WINDOW_MS 凑批），
+   在一个写事务（BEGIN IMMEDIATE）中按到达顺序逐个执行
+2. 每个操作在自己的保存点内执行：接口代码中的 db.commit() 只 flush 到保存点，
+   操作失败（校验错误、循环依赖等）时只回滚该保存点，结果立即返回给该请求，不影响同组其他操作
+3. 整组执行完后统一提交一次，再依次返回各请求的结果；提交失败时组内已成功的操作都返回该错误
+
+同组操作按顺序看到前面操作未提交的修改：数据库查询在同一事务内进行，
+循环依赖检测在依赖索引叠加本组已执行修改的图（graph_index.GROUP_OVERLAY_KEY）上进行。
+内存索引更新、缓存失效和 SSE 事件都登记为提交后回调，整组提交后才生效，失败操作登记的部分被丢弃。
+
+组提交只作用于写接口；读接口仍按 TASK_MANAGER_DB_MODE 执行。
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from async_db import db_handler
+from metrics import PROFILING_ENABLED, profiled
+from database import SQLALCHEMY_DATABASE_URL, SessionLocal, apply_sqlite_pragmas
+from graph_index import GROUP_OVERLAY_KEY, GraphOverlay, dependency_graph
+
+GROUP_COMMIT_ENABLED = os.environ.get("TASK_MANAGER_GROUP_COMMIT", "0").lower() in ("1", "true", "yes", "on")
+# 取到第一个操作后最多再等待多久凑批（毫秒）；0 表示只合并执行上一组期间积压的操作
+GROUP_COMMIT_WINDOW = float(os.environ.get("TASK_MANAGER_GROUP_COMMIT_WINDOW_MS", "0")) / 1000
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("TASK_MANAGER_GROUP_COMMIT_MAX_BATCH", "64"))
+
+# 操作失败时需截断到操作开始前长度的会话级待办列表：提交后回调、待发布的事件
+PENDING_KEYS = ("after_commit", "pending_events")
+SAVEPOINT_KEY = "op_savepoint"
+
+
+class GroupSession(Session):
+    """
+    写入线程的会话：操作在保存点内执行时，
+    commit() 只 flush 到保存点，rollback() 只回滚当前操作的保存点
+    """
+
+    def commit(self) -> None:
+        if self.info.get(SAVEPOINT_KEY) is not None:
+            self.flush()
+        else:
+            super().commit()
+
+    def rollback(self) -> None:
+        savepoint = self.info.get(SAVEPOINT_KEY)
+        if savepoint is None:
+            super().rollback()
+        elif savepoint.is_active:
+            savepoint.rollback()
+
+
+def create_writer_engine():
+    """
+    写入线程专用的单连接引擎
+    pysqlite 默认在第一条 DML 前才隐式 BEGIN，SAVEPOINT 会自行开启事务、RELEASE 时直接提交，
+    因此关闭驱动的事务管理，由 SQLAlchemy 显式发出 BEGIN IMMEDIATE（开始时即取得写锁）
+    """
+    writer_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0,
+    )
+
+    @event.listens_for(writer_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, connection_record)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer_engine
+
+
+Operation = Tuple[Callable[[Session], object], contextvars.Context, Future]
+
+
+class GroupCommitWriter:
+    """单写入线程：按到达顺序分组执行写操作，每组提交一次"""
+
+    def __init__(self, window: float = GROUP_COMMIT_WINDOW, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Operation]" = queue.Queue()
+        self._session_factory = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.groups = 0
+        self.operations = 0
+        self.failed_operations = 0
+        self.failed_commits = 0
+        self.largest_group = 0
+
+    def submit(self, func: Callable[[Session], object]) -> Future:
+        """提交一个写操作 func(db)，返回其结果的 Future；func 在提交方的 contextvars 上下文中执行"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((func, contextvars.copy_context(), future))
+        return future
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "groups": self.groups,
+                "operations": self.operations,
+                "failed_operations": self.failed_operations,
+                "failed_commits": self.failed_commits,
+                "largest_group": self.largest_group,
+                "average_group_size": round(self.operations / self.groups, 2) if self.groups else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._session_factory = sessionmaker(
+                        bind=create_writer_engine(),
+                        class_=GroupSession,
+                        autoflush=False,
+                        # 结果在事件循环线程中序列化，提交后不能再触发懒加载
+                        expire_on_commit=False,
+                    )
+                    thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                    thread.start()
+                    self._thread = thread
+
+    def _collect(self) -> List[Operation]:
+        operations = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(operations) < self.max_batch:
+            try:
+                operations.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                operations.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return operations
+
+    def _run(self) -> None:
+        while True:
+            operations = self._collect()
+            try:
+                self._execute(operations)
+            except Exception as e:
+                # 写入线程不能退出：未返回结果的请求都以该错误结束
+                for _, _, future in operations:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _execute(self, operations: List[Operation]) -> None:
+        db = self._session_factory()
+        overlay = GraphOverlay()
+        db.info[GROUP_OVERLAY_KEY] = overlay
+        succeeded = []
+        failed = 0
+        try:
+            for func, context, future in operations:
+                # 请求已取消（客户端断开）时跳过
+                if not future.set_running_or_notify_cancel():
+                    continue
+                marks = {key: len(db.info.get(key, ())) for key in PENDING_KEYS}
+                snapshot = overlay.copy()
+                savepoint = db.begin_nested()
+                db.info[SAVEPOINT_KEY] = savepoint
+                try:
+                    result = context.run(func, db)
+                    if savepoint.is_active:
+                        db.flush()
+                        savepoint.commit()
+                except Exception as e:
+                    if savepoint.is_active:
+                        savepoint.rollback()
+                    for key, length in marks.items():
+                        if key in db.info:
+                            del db.info[key][length:]
+                    overlay = db.info[GROUP_OVERLAY_KEY] = snapshot
+                    failed += 1
+                    future.set_exception(e)
+                else:
+                    succeeded.append((future, result))
+                finally:
+                    db.info[SAVEPOINT_KEY] = None
+
+            try:
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                # 索引可能在本组事务内首次加载，包含了未提交的边
+                dependency_graph.invalidate()
+                with self._stats_lock:
+                    self.failed_commits += 1
+                for future, _ in succeeded:
+                    future.set_exception(e)
+                return
+            db.expunge_all()
+        finally:
+            db.close()
+
+        with self._stats_lock:
+            self.groups += 1
+            self.operations += len(succeeded) + failed
+            self.failed_operations += failed
+            self.largest_group = max(self.largest_group, len(succeeded) + failed)
+        for future, result in succeeded:
+            future.set_result(result)
+
+
+# 进程级共享实例
+writer = GroupCommitWriter()
+
+
+def run_write(func, *args):
+    """在后台线程中执行一个写操作 func(db, *args)：组提交开启时经写入线程执行，否则使用独立会话"""
+    if GROUP_COMMIT_ENABLED:
+        return writer.submit(lambda db: func(db, *args)).result()
+    with SessionLocal() as db:
+        return func(db, *args)
+
+
+def write_handler(func):
+    """
+    注册写接口：
+    - 未开启组提交：等同 db_handler
+    - 开启组提交：返回协程包装，去掉注入的 db 参数，把接口提交到写入线程执行并等待结果
+    """
+    if not GROUP_COMMIT_ENABLED:
+        return db_handler(func)
+
+    signature = inspect.signature(func)
+    parameters = [param for param in signature.parameters.values() if param.name != "db"]
+    target = profiled(func) if PROFILING_ENABLED else func
+
+    @functools.wraps(func)
+    async def wrapper(**kwargs):
+        return await asyncio.wrap_future(writer.submit(lambda db: target(db=db, **kwargs)))
+
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper